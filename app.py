@@ -1,47 +1,283 @@
-from flask import Flask, render_template, request, redirect, url_for # Removed jsonify
+from flask import Flask, render_template as flask_render_template, request, redirect, url_for, jsonify, Response
 import os
-from datetime import datetime, timedelta # Added for rate limiting
-from config import MAX_PAGES # Assuming MAX_PAGES is defined in config.py
-
-# Import refactored functions
-# It's good practice to alias them if they have the same name
-from raid import get_raid_targets as find_raid_targets
-from beige import get_raid_targets as find_beige_targets
+import json
+import gzip
+import hashlib
+import math
+import uuid
+from config import (MAX_PAGES, SCAN_RESULT_TTL, SCAN_RESULT_CACHE_SIZE, LOOT_INDEX_ENABLED, PREWARM_ENABLED,
+                    RATE_LIMIT_BACKEND, API_GZIP_LEVEL, BATCH_SCAN_MAX_NATIONS) # Assuming MAX_PAGES is defined in config.py
+from cache import TTLCache
+from pnw_api import get_nation_by_id
+from filters import nation_fingerprint
+from scan import iter_scan, scan_targets_batch, SCAN_MODES
+from turns import turn_ttl
+from loot_index import loot_index
+from prewarm import prewarmer
+from jobs import scan_jobs
+from targets import TargetRecord
+from snapshot import nation_snapshot
+from metrics import registry, RENDER_SECONDS
+from rate_limit import SlidingWindowLimiter, RateLimitExceeded, get_rate_limit_backend
 
 app = Flask(__name__)
 
 DEFAULT_TARGET_LIMIT = 10 # Or get from config if defined there
 
-# Rate Limiting Configuration
-MAX_REQUESTS_PER_DAY = 10
-RATE_LIMIT_WINDOW = timedelta(days=1) # 24 hours
-nation_request_logs = {} # Initialize the log
-
-# PROGRESS_TRACKER removed
-
-def check_rate_limit(nation_id):
-    current_time = datetime.now()
-    if nation_id not in nation_request_logs:
-        nation_request_logs[nation_id] = []
-
-    # Filter out old timestamps
-    valid_requests = [
-        timestamp for timestamp in nation_request_logs[nation_id]
-        if current_time - timestamp < RATE_LIMIT_WINDOW
-    ]
-    nation_request_logs[nation_id] = valid_requests
-
-    if len(valid_requests) >= MAX_REQUESTS_PER_DAY:
-        return False # Rate limit exceeded
-    return True # Allowed
-
-def record_request(nation_id):
-    # This function is called only if the request is allowed by check_rate_limit 
-    # and after the main processing (like fetching targets) is done.
-    current_time = datetime.now()
-    if nation_id not in nation_request_logs: # Should not happen if check_rate_limit was called first
-        nation_request_logs[nation_id] = []
-    nation_request_logs[nation_id].append(current_time)
+# Rate Limiting: scans per nation in the last 24 hours, counted in a backend shared by every worker
+rate_limiter = SlidingWindowLimiter(get_rate_limit_backend(RATE_LIMIT_BACKEND))
+MAX_REQUESTS_PER_DAY = rate_limiter.limit
+
+# Scans run as background jobs (see jobs.py); results pages poll their status with short requests,
+# so no worker is held while a scan waits on the API
+MODE_TITLES = {'raid': 'Raid Targets', 'beige': 'Beige Targets'}
+JOB_POLL_SECONDS = 2  # Between a results page's status polls
+
+# (version, results per mode) of the last scan per (nation ID, attacker fingerprint), kept until the next
+# turn change; the version is new for every result set cached, so /api ETags are derived from it, not the body
+scan_results = TTLCache(maxsize=SCAN_RESULT_CACHE_SIZE, ttl=SCAN_RESULT_TTL)
+
+# Fingerprints of attacking nations the snapshot doesn't hold, kept until the next turn change
+attacker_fingerprints = TTLCache(maxsize=SCAN_RESULT_CACHE_SIZE, ttl=SCAN_RESULT_TTL)
+
+# Encoded /api bodies per (mode, nation ID), reused while the result set version they were built from is cached
+api_bodies = TTLCache(maxsize=SCAN_RESULT_CACHE_SIZE, ttl=SCAN_RESULT_TTL)
+
+# Sizes of the in-process caches, read when /metrics is scraped
+registry.gauge("app_cache_entries", "Entries held per in-process cache", lambda: {
+    'scan_results': len(scan_results),
+    'api_bodies': len(api_bodies),
+    'snapshot_nations': nation_snapshot.stats()['nations'],
+    'snapshot_details': nation_snapshot.stats()['detail_entries'],
+    'loot_index_wars': loot_index.stats()['wars'],
+}, ["cache"])
+registry.gauge("app_scan_jobs", "Scan jobs kept in this process, and how many are unfinished",
+               lambda: scan_jobs.stats(), ["state"])
+
+def render_template(template_name, **context):
+    """Render a template, recording how long it took."""
+    with RENDER_SECONDS.time(view=template_name):
+        return flask_render_template(template_name, **context)
+
+def start_background_tasks(api_key):
+    """Start this worker's background threads on first use; later calls do nothing."""
+    if LOOT_INDEX_ENABLED:
+        # Poll wars and attacks in the background; scans use the loot sums once warm
+        loot_index.start(api_key)
+    if PREWARM_ENABLED:
+        # Refresh nation data just after every turn change, before the traffic spike
+        prewarmer.start(api_key)
+
+def attacker_fingerprint(api_key, nation_id, nation=None):
+    """
+    Return the fingerprint of the attacking nation that its cached results are keyed by.
+
+    Read from the shared snapshot when it holds the nation, so looking up
+    cached results costs no API request. Other nations are looked up at most
+    once per turn and their fingerprint kept until the next turn change.
+
+    Args:
+        api_key: The Politics & War API key.
+        nation_id: ID of the attacking nation.
+        nation: Optional attacker data just fetched (e.g. by a scan); used
+            instead of a lookup, and replaces the kept fingerprint.
+
+    Raises:
+        ValueError: If the attacking nation has to be fetched and can't be.
+    """
+    snapshot_nation = nation_snapshot.peek_nation(api_key, nation_id)
+    if snapshot_nation is not None:
+        return nation_fingerprint(snapshot_nation)
+    fingerprint = attacker_fingerprints.get(nation_id) if nation is None else None
+    if fingerprint is None:
+        if nation is None:
+            nation = get_nation_by_id(api_key, nation_id)
+        fingerprint = nation_fingerprint(nation)
+        attacker_fingerprints.set(nation_id, fingerprint, ttl=turn_ttl(SCAN_RESULT_TTL))
+    return fingerprint
+
+def cached_results(api_key, nation_id):
+    """
+    Look up the cached results of every mode for a nation, without scanning.
+
+    Returns:
+        Tuple of (version, results per mode), or None if not cached
+
+    Raises:
+        ValueError: If the attacking nation can't be fetched.
+    """
+    start_background_tasks(api_key)
+    return scan_results.get((nation_id, attacker_fingerprint(api_key, nation_id)))
+
+def cache_results(api_key, nation_id, nation, results):
+    """Cache a scan's results per mode for a nation until the next turn change, under a new version."""
+    fingerprint = attacker_fingerprint(api_key, nation_id, nation)
+    scan_results.set((nation_id, fingerprint), (uuid.uuid4().hex, results), ttl=turn_ttl(SCAN_RESULT_TTL))
+
+def scan_events(api_key, nation_id):
+    """
+    Scan for every mode in one pass, streaming the scan's events.
+
+    Answered from the last results while they're cached: results are kept
+    until the next turn change (at most SCAN_RESULT_TTL seconds) for as long
+    as the attacking nation's score, military and alliance stay the same,
+    so repeat searches and switching tabs don't rescan.
+
+    Args:
+        api_key: The Politics & War API key.
+        nation_id: ID of the attacking nation.
+
+    Yields:
+        scan.iter_scan events; only the 'done' event on a cache hit, without the attacking nation
+
+    Raises:
+        ValueError: If the scan fails.
+    """
+    cached = cached_results(api_key, nation_id)
+    if cached is not None:
+        yield {'event': 'done', 'nation': None, 'results': cached[1]}
+        return
+    for event in iter_scan(api_key, nation_id, list(SCAN_MODES), limit=DEFAULT_TARGET_LIMIT, max_pages=MAX_PAGES):
+        if event['event'] == 'done':
+            cache_results(api_key, nation_id, event['nation'], event['results'])
+        yield event
+
+def find_targets(api_key, nation_id, mode):
+    """
+    Return targets for one mode, scanning for every mode in the same pass on a miss.
+
+    Args:
+        api_key: The Politics & War API key.
+        nation_id: ID of the attacking nation.
+        mode: Scan mode name, a key of scan.SCAN_MODES.
+
+    Returns:
+        List of TargetRecords
+
+    Raises:
+        ValueError: If the scan fails.
+    """
+    for event in scan_events(api_key, nation_id):
+        if event['event'] == 'done':
+            return event['results'][mode]
+
+def acquire_rate_limit(nation_id):
+    """
+    Count a request against a nation's rate limit.
+
+    Counting and checking is one backend update, so workers racing for a
+    nation's last request can't both get it.
+
+    Returns:
+        The window index to pass to rate_limiter.release() if the request is taken back
+
+    Raises:
+        RateLimitExceeded: If the nation has used up its requests.
+    """
+    window = rate_limiter.acquire(nation_id)
+    if window is None:
+        raise RateLimitExceeded(f"Rate limit exceeded for Nation ID {nation_id}. "
+                                f"Only {MAX_REQUESTS_PER_DAY} requests allowed per 24 hours.",
+                                rate_limiter.retry_after(nation_id))
+    return window
+
+def retry_after_header(error):
+    """Retry-After header for a RateLimitExceeded, in whole seconds."""
+    return {'Retry-After': str(max(1, math.ceil(error.retry_after)))}
+
+def _submit_counted(key, events_factory, acquired):
+    """
+    Submit a scan job whose requests were already counted in `acquired`, a list of (nation ID, window).
+
+    The requests are taken back if the job is refused, joins a scan already
+    running, or its scan fails.
+    """
+    def release():
+        for nation_id, window in acquired:
+            rate_limiter.release(nation_id, window)
+
+    def events():
+        try:
+            yield from events_factory()
+        except Exception:
+            release()  # Failed scans don't count against the limit
+            raise
+    try:
+        job, new = scan_jobs.submit(key, events)
+    except ValueError:
+        release()
+        raise
+    if not new:
+        release()  # Joining a running scan costs nothing
+    return job
+
+def start_scan_job(api_key, nation_id):
+    """
+    Start a background scan for a nation, or join the one already running for it.
+
+    The request is counted against the nation's rate limit here, before the
+    job is submitted, so an exceeded limit is answered by the request itself.
+    Requests answered from cached results are not counted.
+
+    Returns:
+        The ScanJob
+
+    Raises:
+        RateLimitExceeded: If the nation has used up its requests.
+        ValueError: If too many scans are already queued or running.
+    """
+    try:
+        cached = cached_results(api_key, nation_id)
+    except ValueError:
+        cached = None  # The scan reports why the nation can't be fetched
+    # Cached results cost no scan, so they cost no request either
+    acquired = [] if cached is not None else [(nation_id, acquire_rate_limit(nation_id))]
+    return _submit_counted(nation_id, lambda: scan_events(api_key, nation_id), acquired)
+
+def batch_scan_events(api_key, nation_ids):
+    """
+    Scan for every mode for many attacking nations in one pass (see scan.scan_targets_batch).
+
+    Each nation's results are cached as if it had been scanned on its own,
+    so its later searches and /api requests are answered from the cache.
+
+    Yields:
+        One 'done' event, with results per attacking nation ID and mode
+
+    Raises:
+        ValueError: If the scan fails.
+    """
+    start_background_tasks(api_key)
+    members, results = scan_targets_batch(api_key, nation_ids, list(SCAN_MODES), limit=DEFAULT_TARGET_LIMIT,
+                                          max_pages=MAX_PAGES)
+    for nation_id, member_results in results.items():
+        cache_results(api_key, nation_id, members[nation_id], member_results)
+    yield {'event': 'done', 'nation': None, 'results': results}
+
+def start_batch_job(api_key, nation_ids):
+    """
+    Start a background scan for many nations, or join the one already running for the same nations.
+
+    Every nation counts one request against its rate limit, before the job
+    is submitted; if any nation has used up its requests, none are counted.
+
+    Returns:
+        The ScanJob
+
+    Raises:
+        RateLimitExceeded: If a nation has used up its requests.
+        ValueError: If too many scans are already queued or running.
+    """
+    acquired = []
+    try:
+        for nation_id in nation_ids:
+            acquired.append((nation_id, acquire_rate_limit(nation_id)))
+    except RateLimitExceeded:
+        for nation_id, window in acquired:
+            rate_limiter.release(nation_id, window)
+        raise
+    return _submit_counted(('batch',) + tuple(sorted(nation_ids)), lambda: batch_scan_events(api_key, nation_ids),
+                           acquired)
 
 @app.route('/')
 def index():
@@ -74,34 +310,22 @@ def raid_results():
                                search_title="Server Configuration Error",
                                targets=None), 500
 
-    if not check_rate_limit(nation_id): # nation_id is now guaranteed to be an int
+    try:
+        # Raid and beige targets come from one shared scan, run in the background
+        job = start_scan_job(api_key, nation_id)
+    except RateLimitExceeded as e:
         app.logger.warning(f"Rate limit exceeded for Nation ID {nation_id}")
-        return render_template('results.html', 
-                               error_message=f"Rate limit exceeded for Nation ID {nation_id}. Only {MAX_REQUESTS_PER_DAY} requests allowed per 24 hours.",
+        return render_template('results.html',
+                               error_message=str(e),
                                search_title=f"Rate Limit Exceeded for Nation ID {nation_id}",
-                               targets=None), 429 # 429 Too Many Requests
-    
-    # PROGRESS_TRACKER related lines removed
-    try:
-        # Call the refactored function from raid.py
-        _, targets = find_raid_targets(api_key, nation_id, limit=DEFAULT_TARGET_LIMIT, max_pages=MAX_PAGES) # Removed progress_tracker and request_id
-        record_request(nation_id) # Record the request *after* successful processing
-        # PROGRESS_TRACKER update removed
-        return render_template('results.html', targets=targets, search_title=f"Raid Targets for Nation ID {nation_id}")
+                               targets=None), 429, retry_after_header(e) # 429 Too Many Requests
     except ValueError as e:
-        app.logger.error(f"ValueError in /raid for Nation ID {nation_id}: {e}")
-        # PROGRESS_TRACKER update removed
-        return render_template('results.html',
-                               error_message=str(e), # Pass the error message from the exception
-                               search_title=f"Error for Nation ID {nation_id}",
-                               targets=None), 400 # Or another appropriate status code like 404 if "not found"
-    except Exception as e:
-        app.logger.error(f"Unexpected error in /raid for Nation ID {nation_id_str if 'nation_id_str' in locals() else 'unknown'}: {e}", exc_info=True)
-        # PROGRESS_TRACKER update removed
+        app.logger.warning(f"Scan job refused in /raid for Nation ID {nation_id}: {e}")
         return render_template('results.html',
-                               error_message="An unexpected server error occurred. Please try again later or contact support.",
-                               search_title="Unexpected Server Error",
-                               targets=None), 500
+                               error_message=str(e),
+                               search_title="Server Busy",
+                               targets=None), 503
+    return redirect(url_for('job_results', job_id=job.id, mode='raid'), code=303)
 
 
 @app.route('/beige', methods=['POST'])
@@ -131,36 +355,196 @@ def beige_results():
                                search_title="Server Configuration Error",
                                targets=None), 500
     
-    if not check_rate_limit(nation_id): # nation_id is now guaranteed to be an int
+    try:
+        # Raid and beige targets come from one shared scan, run in the background
+        job = start_scan_job(api_key, nation_id)
+    except RateLimitExceeded as e:
         app.logger.warning(f"Rate limit exceeded for Nation ID {nation_id}")
-        return render_template('results.html', 
-                               error_message=f"Rate limit exceeded for Nation ID {nation_id}. Only {MAX_REQUESTS_PER_DAY} requests allowed per 24 hours.",
+        return render_template('results.html',
+                               error_message=str(e),
                                search_title=f"Rate Limit Exceeded for Nation ID {nation_id}",
-                               targets=None), 429 # 429 Too Many Requests
-    
-    # PROGRESS_TRACKER related lines removed
-    try:
-        # Call the refactored function from beige.py
-        _, targets = find_beige_targets(api_key, nation_id, limit=DEFAULT_TARGET_LIMIT, max_pages=MAX_PAGES) # Removed progress_tracker and request_id
-        record_request(nation_id) # Record the request *after* successful processing
-        # PROGRESS_TRACKER update removed
-        return render_template('results.html', targets=targets, search_title=f"Beige Targets for Nation ID {nation_id}")
+                               targets=None), 429, retry_after_header(e) # 429 Too Many Requests
     except ValueError as e:
-        app.logger.error(f"ValueError in /beige for Nation ID {nation_id}: {e}")
-        # PROGRESS_TRACKER update removed
+        app.logger.warning(f"Scan job refused in /beige for Nation ID {nation_id}: {e}")
         return render_template('results.html',
                                error_message=str(e),
-                               search_title=f"Error for Nation ID {nation_id}",
-                               targets=None), 400 # Or another appropriate status code
-    except Exception as e:
-        app.logger.error(f"Unexpected error in /beige for Nation ID {nation_id_str if 'nation_id_str' in locals() else 'unknown'}: {e}", exc_info=True)
-        # PROGRESS_TRACKER update removed
+                               search_title="Server Busy",
+                               targets=None), 503
+    return redirect(url_for('job_results', job_id=job.id, mode='beige'), code=303)
+
+@app.route('/jobs/<job_id>/results/<mode>')
+def job_results(job_id, mode):
+    """Results page of a scan job; shows its progress until the scan is done."""
+    job = scan_jobs.get(job_id)
+    if mode not in SCAN_MODES or job is None:
         return render_template('results.html',
-                               error_message="An unexpected server error occurred. Please try again later or contact support.",
-                               search_title="Unexpected Server Error",
-                               targets=None), 500
+                               error_message="This scan was not found or has expired. Please search again.",
+                               search_title="Scan Not Found",
+                               targets=None), 404
+    search_title = f"{MODE_TITLES.get(mode, mode.title())} for Nation ID {job.key}"
+    if job.status == 'error':
+        return render_template('results.html', error_message=job.error,
+                               search_title=f"Error for Nation ID {job.key}", targets=None), 400
+    if job.status == 'done':
+        return render_template('results.html', targets=job.results[mode], search_title=search_title)
+    return render_template('results.html', job=job.to_dict(include_results=False), targets=None,
+                           search_title=search_title, poll_seconds=JOB_POLL_SECONDS)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Start a scan job for the `nation_id` form or JSON field; returns its ID and where to follow it."""
+    payload = request.get_json(silent=True) or request.form
+    try:
+        nation_id = int(payload.get('nation_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': "nation_id is required and must be a number"}), 400
+
+    api_key = os.environ.get("PNW_API_KEY")
+    if not api_key:
+        app.logger.error("PNW_API_KEY not configured on server.")
+        return jsonify({'error': "API key not configured on the server"}), 500
+    try:
+        job = start_scan_job(api_key, nation_id)
+    except RateLimitExceeded as e:
+        return jsonify({'error': str(e)}), 429, retry_after_header(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 503
+    state = job.to_dict()
+    state['status_url'] = url_for('job_status', job_id=job.id)
+    return jsonify(state), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Current state of a scan job, with its results once done."""
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': "Job not found or expired"}), 404
+    return jsonify(job.to_dict())
+
+def _api_etag(mode, nation_id, version):
+    """Strong ETag of a mode's results, derived from the cached result set's version without building the body."""
+    return hashlib.sha1(f"{mode}:{nation_id}:{version}".encode('utf-8')).hexdigest()
+
+def _api_body(mode, nation_id, version, targets):
+    """
+    Return the compact JSON body of a result list and its gzip encoding.
+
+    Bodies are encoded once per result set version and reused for as long as
+    it is cached, so repeat downloads don't re-serialize.
+    """
+    entry = api_bodies.get((mode, nation_id))
+    if entry is not None and entry[0] == version:
+        return entry[1:]
+    body = json.dumps({'nation_id': nation_id, 'mode': mode, 'targets': targets},
+                      default=TargetRecord.to_dict, separators=(',', ':')).encode('utf-8')
+    entry = (version, body, gzip.compress(body, compresslevel=API_GZIP_LEVEL))
+    api_bodies.set((mode, nation_id), entry)
+    return entry[1:]
+
+def _api_response(mode, nation_id, version, targets):
+    """Serve a result list as JSON: 304 if the client's copy is current, gzip if it accepts it."""
+    etag = _api_etag(mode, nation_id, version)
+    if request.if_none_match.contains(etag):
+        # Revalidation needs only the cached version: no body is built
+        response = Response(status=304)
+    else:
+        body, gzipped = _api_body(mode, nation_id, version, targets)
+        if 'gzip' in request.accept_encodings:
+            response = Response(gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Cacheable, but revalidated every time: results change when the attacker or the turn does
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/<any(raid, beige):mode>/<int:nation_id>')
+def api_targets(mode, nation_id):
+    """
+    Targets of one mode for a nation as compact JSON, with an ETag for revalidation.
+
+    Cached results are served without counting against the rate limit, and
+    revalidated with If-None-Match without any API request for attackers the
+    snapshot holds. On a miss, a scan job is started (or joined) and the
+    response is 202 at once, with the job's status URL to poll; once it is
+    done, the same GET answers from the cache.
+    """
+    api_key = os.environ.get("PNW_API_KEY")
+    if not api_key:
+        app.logger.error("PNW_API_KEY not configured on server.")
+        return jsonify({'error': "API key not configured on the server"}), 500
+
+    try:
+        cached = cached_results(api_key, nation_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if cached is not None:
+        version, results = cached
+        return _api_response(mode, nation_id, version, results[mode])
+
+    try:
+        job = start_scan_job(api_key, nation_id)
+    except RateLimitExceeded as e:
+        return jsonify({'error': str(e)}), 429, retry_after_header(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 503
+    state = job.to_dict(include_results=False)
+    state['status_url'] = url_for('job_status', job_id=job.id)
+    return jsonify(state), 202, {'Retry-After': '5', 'Location': state['status_url']}
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    """
+    Start one scan for many attacking nations, e.g. every member of an alliance.
+
+    Takes `nation_ids` as a JSON list or a comma or whitespace separated form
+    field. The candidate nations are crawled once for all of them. Answers
+    202 with the job; once done, its results map each nation ID to its
+    targets per mode.
+    """
+    payload = request.get_json(silent=True) or request.form
+    nation_ids = payload.get('nation_ids')
+    if isinstance(nation_ids, str):
+        nation_ids = nation_ids.replace(',', ' ').split()
+    try:
+        nation_ids = list(dict.fromkeys(int(nation_id) for nation_id in nation_ids))
+    except (TypeError, ValueError):
+        nation_ids = None
+    if not nation_ids:
+        return jsonify({'error': "nation_ids is required and must be a list of numbers"}), 400
+    if len(nation_ids) > BATCH_SCAN_MAX_NATIONS:
+        return jsonify({'error': f"At most {BATCH_SCAN_MAX_NATIONS} nations can be scanned at once"}), 400
+
+    api_key = os.environ.get("PNW_API_KEY")
+    if not api_key:
+        app.logger.error("PNW_API_KEY not configured on server.")
+        return jsonify({'error': "API key not configured on the server"}), 500
+    # Name every nation over its limit at once; start_batch_job counts the requests
+    limited = [nation_id for nation_id in nation_ids if not rate_limiter.check(nation_id)]
+    if limited:
+        error = RateLimitExceeded(f"Rate limit exceeded for Nation ID(s) {', '.join(map(str, limited))}. "
+                                  f"Only {MAX_REQUESTS_PER_DAY} requests allowed per 24 hours.",
+                                  max(rate_limiter.retry_after(nation_id) for nation_id in limited))
+        return jsonify({'error': str(error)}), 429, retry_after_header(error)
+
+    try:
+        job = start_batch_job(api_key, nation_ids)
+    except RateLimitExceeded as e:
+        return jsonify({'error': str(e)}), 429, retry_after_header(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 503
+    state = job.to_dict()
+    state['status_url'] = url_for('job_status', job_id=job.id)
+    return jsonify(state), 202
 
-# Removed /progress/<request_id> route
+@app.route('/metrics')
+def metrics():
+    """Metrics of this process in the Prometheus text format."""
+    if not registry.enabled:
+        return "Metrics are disabled. Set METRICS_ENABLED=True to enable them.", 404
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     # Make sure to load .env variables if you are using python-dotenv and running directly
@@ -1,8 +1,12 @@
-from pnw_api import get_nations, has_treaty, run_query, get_nation_by_id
-from tqdm import tqdm
+from pnw_api import get_alliance_names
+from scan import scan_targets, iter_scan
+from targets import TargetRecord
+from sources import default_cli_source
+from metrics import registry, RENDER_SECONDS
 import traceback
 import argparse
 import os
+import sys
 import time
 from datetime import datetime
 from config import MAX_PAGES, MIN_SCORE_RATIO, MAX_SCORE_RATIO
@@ -19,10 +23,14 @@ def get_last_updated():
 def parse_args():
     parser = argparse.ArgumentParser(description='PnW Beige Recon - Find beige nations')
     parser.add_argument('--json', action='store_true', help='Output results in JSON format')
+    parser.add_argument('--stream', action='store_true', help='Print targets as they are found, before the ranked list')
+    parser.add_argument('--metrics', action='store_true', help='Print metrics in Prometheus text format to stderr when done')
     parser.add_argument('--limit', type=int, default=10, help='Limit number of results (default: 10)')
     parser.add_argument('--max-pages', type=int, default=MAX_PAGES,
                       help=f'Maximum number of pages to fetch (default: {MAX_PAGES}, use smaller number for testing)')
     parser.add_argument('--nationid', type=int, help='Specify the Nation ID to use for the script', required=True)
+    parser.add_argument('--source', choices=['store', 'api', 'snapshot'], default=default_cli_source(),
+                      help='Where to read nations from (default: the persistent store if enabled, otherwise the API)')
     return parser.parse_args()
 
 def format_param_info(name, value, description=None):
@@ -49,241 +57,18 @@ def format_loot(loot, loot_value=None):
         return f"Lost ${loot['money']:,.0f}"
     return "No losses"
 
-def get_raid_targets(api_key: str, nation_id: int, limit: int, max_pages: int): # Removed progress_tracker and request_id
-    # Get my nation's info first
-    try:
-        my_nation = get_nation_by_id(api_key, nation_id)
-        # CLI-specific print: print(f"Fetching data for Nation ID: {nation_id}")
-    except ValueError as e:
-        # CLI-specific print: print(f"Error: Could not fetch data for Nation ID {nation_id}. {e}")
-        raise  # Re-raise for the caller to handle
-
-    # The "Current Parameters" and "Target" info will be printed by the CLI caller (main function)
-    # This function will now focus on fetching and filtering data.
-    # min_score and max_score are calculated here as they are used in filtering logic below.
-    min_score = my_nation['score'] * MIN_SCORE_RATIO
-    max_score = my_nation['score'] * MAX_SCORE_RATIO
-
-    page = 1
-    all_nations = []
-    filtered = []
-
-    pbar = tqdm(desc="Fetching nations", unit="page", total=max_pages)
-
-    while True:
-        try:
-            # CLI-specific print: tqdm progress bar handles page fetching status for CLI.
-            # If not using tqdm, a print like: print(f"Fetching page {page}...") might be used for CLI.
-            nations_data = get_nations(api_key, page)
-
-            if not nations_data["data"]:  # No more nations to fetch
-                break
-
-            # Process nations and filter in a single pass
-            current_page_nations = nations_data["data"]
-            pbar.update(1)
-            # Removed progress_tracker update block
-            
-            for nation in current_page_nations:
-                # Skip processing if we already have enough targets
-                if len(filtered) >= limit: # Use limit parameter
-                    break
-
-                # Implement the new filtering logic
-                include_nation = True # Assume nation is included unless filtered out
-
-                # 1. Initial State Filter (War Range, Vacation, Beige, Inactive)
-                nation_score = nation.get('score', 0)
-                min_score = my_nation['score'] * MIN_SCORE_RATIO
-                max_score = my_nation['score'] * MAX_SCORE_RATIO
-
-                if not (min_score <= nation_score <= max_score):
-                    include_nation = False
-
-                if include_nation and nation.get('vacation_mode_turns', 0) > 0:
-                    include_nation = False
-                    
-                # Exclude nations with more cities than us
-                if include_nation and nation.get('num_cities', 0) > my_nation.get('num_cities', 0):
-                    include_nation = False
-
-                # Only include beige nations with less than 12 turns remaining
-                if include_nation and nation.get('color', '').lower() != 'beige':
-                    include_nation = False
-                    
-                if include_nation and (nation.get('beige_turns', 0) < 1 or nation.get('beige_turns', 0) > 12):
-                    include_nation = False
-
-                # 2. Always respect treaties
-                if include_nation:
-                    if (nation.get('alliance_id') is not None and
-                        my_nation.get('alliance') is not None and
-                        nation.get('alliance') is not None and # Ensure target nation has alliance data
-                        has_treaty(my_nation['alliance'], nation['alliance'])):
-                        include_nation = False
+def get_raid_targets(api_key: str, nation_id: int, limit: int, max_pages: int, source: str = 'snapshot'): # Removed progress_tracker and request_id
+    # The fetch loop, filters and result builder are shared with the other modes in scan.py
+    my_nation, results = scan_targets(api_key, nation_id, ['beige'], limit, max_pages, source=source)
+    return my_nation, results['beige']
 
-                # 3. Filter out nations with stronger military
-                if include_nation:
-                    if (nation.get('ships', 0) > my_nation.get('ships', 0) or
-                        nation.get('missiles', 0) > my_nation.get('missiles', 0) or
-                        nation.get('nukes', 0) > my_nation.get('nukes', 0) or
-                        nation.get('spies', 0) > my_nation.get('spies', 0)):
-                        include_nation = False
-
-                # Calculate 7-day stolen money and filter out nations with zero
-                seven_days_stolen = 0
-                if include_nation and nation.get('wars') and isinstance(nation['wars'], list):
-                    for war in nation['wars']:
-                        if war.get('def_id') == nation['id']:  # Only defensive wars
-                            war_date = datetime.strptime(war['date'], '%Y-%m-%dT%H:%M:%S%z')
-                            if (datetime.now(war_date.tzinfo) - war_date).days <= 7:
-                                if war.get('attacks'):
-                                    for attack in war['attacks']:
-                                        if attack.get('def_id') == nation['id']:
-                                            seven_days_stolen += attack.get('money_stolen', 0)
-                # Skip nations with zero stolen money or 3+ defensive wars
-                if seven_days_stolen == 0:
-                    continue
-
-                # Use defensive_wars_count from API response
-                defensive_war_count = nation.get('defensive_wars_count', 0)
-                
-                if defensive_war_count >= 3:
-                    continue
-
-                # Calculate stolen money from defensive wars
-                total_money_stolen_recent_def_war = 0
-                most_recent_def_war_date_obj = None # Store as datetime object first
-                most_recent_def_war_date_str = 'N/A'
-                last_stolen_time_ago_str = "N/A"
-
-                if nation.get('wars') and isinstance(nation['wars'], list):
-                    defensive_wars = [w for w in nation['wars'] if w.get('def_id') == nation['id']]
-                    if defensive_wars:
-                        most_recent_def_war = sorted(defensive_wars, 
-                                                   key=lambda x: datetime.strptime(x['date'], '%Y-%m-%dT%H:%M:%S%z'),
-                                                   reverse=True)[0]
-                        most_recent_def_war_date_obj = datetime.strptime(most_recent_def_war['date'], '%Y-%m-%dT%H:%M:%S%z')
-                        most_recent_def_war_date_str = most_recent_def_war_date_obj.strftime('%Y-%m-%d %H:%M:%S%z')
-
-                        if most_recent_def_war.get('attacks'):
-                            for attack in most_recent_def_war['attacks']:
-                                if attack.get('def_id') == nation['id']:
-                                    total_money_stolen_recent_def_war += attack.get('money_stolen', 0)
-                        
-                        # Calculate time ago string
-                        if most_recent_def_war_date_obj:
-                            try:
-                                hours_ago = int((datetime.now(most_recent_def_war_date_obj.tzinfo) - most_recent_def_war_date_obj).total_seconds() / 3600)
-                                days = hours_ago // 24
-                                hours = hours_ago % 24
-                                if days > 0:
-                                    last_stolen_time_ago_str = f"{days}d {hours}h ago"
-                                else:
-                                    last_stolen_time_ago_str = f"{hours_ago}h ago"
-                            except Exception:
-                                last_stolen_time_ago_str = "timestamp unavailable"
-                
-                # Add relevant data to the filtered nation dictionary
-                # Get detailed nation data including infrastructure and commerce buildings
-                # REVIEW: The following detailed_nation call is highly inefficient and likely incorrect.
-                # The data should ideally come from the initial paginated get_nations call.
-                # For now, proceeding with the structure but this needs a separate fix.
-                # If nation['id'] is an int, then get_nations(api_key, nation['id']) is wrong.
-                # It should be get_nation_by_id(api_key, nation['id']) if a specific fetch is needed.
-                # Assuming the fields are already in 'nation' from the paginated call for now for commerce.
-                
-                # Calculate commerce buildings totals (assuming fields are in 'nation' object from paginated call)
-                    supermarket = 0
-                    bank = 0
-                    shopping_mall = 0
-                    stadium = 0
-                    subway = 0
-                    if nation.get('cities'):
-                        for city in nation['cities']:
-                            supermarket += city.get('supermarket', 0)
-                            bank += city.get('bank', 0)
-                            shopping_mall += city.get('shopping_mall', 0)
-                            stadium += city.get('stadium', 0)
-                            subway += city.get('subway', 0)
-                
-                filtered_nation_data = {
-                    'id': nation.get('id'),
-                    'name': nation.get('nation_name'),
-                    'score': nation.get('score'),
-                    'beige_turns': nation.get('beige_turns', 0),
-                    'alliance': nation.get('alliance').get('name', 'No Alliance') if nation.get('alliance') else 'No Alliance',
-                    'money_stolen_recent_def_war': total_money_stolen_recent_def_war,
-                    'seven_days_stolen': seven_days_stolen,
-                    'most_recent_def_war_date': most_recent_def_war_date_str,
-                    'last_stolen_time_ago_str': last_stolen_time_ago_str, # Added
-                    'gni': nation.get('gross_national_income', 0),
-                    'daily_income': nation.get('gross_national_income', 0) / 365.0 if nation.get('gross_national_income') else 0,
-                    'raw_gni': nation.get('gross_national_income'),  # For debugging
-                    'nation_url': f"https://politicsandwar.com/nation/id={nation.get('id')}", # Added
-                    'num_cities': nation.get('num_cities', '?'),
-                    'soldiers': nation.get('soldiers', 0),
-                    'tanks': nation.get('tanks', 0),
-                    'aircraft': nation.get('aircraft', 0),
-                    'ships': nation.get('ships', 0),
-                    'missiles': nation.get('missiles', 0),
-                    'nukes': nation.get('nukes', 0),
-                    'spies': nation.get('spies', 0),
-                    'infrastructure': sum(city.get('infrastructure', 0) for city in nation.get('cities', [])),
-                    'supermarket': supermarket,
-                    'bank': bank,
-                    'shopping_mall': shopping_mall,
-                    'stadium': stadium,
-                    'subway': subway,
-                    'defensive_wars_count': defensive_war_count # Added
-                }
-                filtered.append(filtered_nation_data)
-
-            # Early exit if we have enough targets
-            if len(filtered) >= limit: # Use limit parameter
-                # CLI-specific print: print(f"\nFound {len(filtered)} targets, stopping search")
-                break
-
-            # Check pagination
-            paginator = nations_data.get("paginatorInfo", {})
-            if not paginator.get("hasMorePages") or page >= max_pages: # Use max_pages parameter
-                # CLI-specific print: print(f"\nReached page limit ({page}/{max_pages})")
-                break
-
-            page += 1
-        except Exception as e:
-            print(f"\n❌ Error fetching page {page}: {str(e)}")
-            traceback.print_exc()
-
-            # If we already have some nations, just use what we have
-            if all_nations:
-                print(f"\n✅ Using {len(all_nations)} nations already fetched before error")
-                break
-            else:
-                # No nations fetched yet, try one more time with a delay
-                try:
-                    print("Retrying with a 5-second delay...")
-                    time.sleep(5)
-                    nations_data = get_nations(api_key, page)
-                    all_nations.extend(nations_data["data"])
-                    pbar.update(1)
-                    page += 1
-                except Exception as retry_e:
-                    print(f"\n❌ Retry also failed: {str(retry_e)}")
-                    # Terminate with an error if we can't fetch any data
-                    if not all_nations:
-                        raise ValueError("Could not fetch any nation data from API after retries")
-                    break
-
-    try:
-        return my_nation, filtered
-    finally:
-        pbar.close()
-        # CLI-specific print: print(f"\nProcessed {len(all_nations)} total nations")
+def iter_beige_targets(api_key: str, nation_id: int, limit: int, max_pages: int, source: str = 'snapshot'):
+    # Streams the scan's events as pages are processed; see scan.iter_scan
+    return iter_scan(api_key, nation_id, ['beige'], limit, max_pages, source=source)
 
 def main():
+    args = parse_args()
     try:
-        args = parse_args()
         print("[⚔️] Samurai Beige Scanner - Finding ending beige...\n")
 
         # For CLI usage, the API key still needs to come from the environment
@@ -293,9 +78,19 @@ def main():
              raise ValueError("PNW_API_KEY environment variable is not set for CLI usage.")
 
         # Call the refactored function with parameters from args
-        my_nation, filtered = get_raid_targets(api_key, args.nationid, args.limit, args.max_pages)
+        if args.stream and not args.json:
+            # Show each target as soon as it is found; the ranked list follows at the end
+            for event in iter_beige_targets(api_key, args.nationid, args.limit, args.max_pages, source=args.source):
+                if event['event'] == 'target':
+                    t = event['target']
+                    print(f"  + {t.name} | 7d {format_money(t.seven_days_stolen)} | {t.nation_url}")
+                elif event['event'] == 'done':
+                    my_nation, filtered = event['nation'], event['results']['beige']
+        else:
+            my_nation, filtered = get_raid_targets(api_key, args.nationid, args.limit, args.max_pages, source=args.source)
         
         # CLI-specific output based on the returned my_nation
+        render_started = time.perf_counter()
         print("Current Parameters:")
         print("  My Nation:")
         print(f"    {my_nation.get('nation_name', 'Unknown')} | {my_nation.get('alliance', {}).get('name', 'No Alliance')}")
@@ -318,27 +113,14 @@ def main():
                 else:
                     treaty_alliances.add(treaty['alliance2_id'])
             
-            # This loop to fetch alliance names is duplicated.
-            # For CLI, this is acceptable. A deeper refactor could avoid this.
+            # Look up every treaty partner's name in one batched query
+            try:
+                names_by_id = get_alliance_names(api_key, treaty_alliances)
+            except Exception as e:
+                # CLI-specific print: print(f"Error fetching alliance names: {str(e)}")
+                names_by_id = {}
             for alliance_id_cli in treaty_alliances:
-                query = f"""
-                {{
-                  alliances(id: {alliance_id_cli}) {{
-                    data {{
-                      name
-                    }}
-                  }}
-                }}
-                """
-                try:
-                    data = run_query(api_key, query) # api_key needs to be available here
-                    if data.get('data', {}).get('alliances', {}).get('data'):
-                        alliance_names.append(data['data']['alliances']['data'][0]['name'])
-                    else: # Handle case where alliance data might be missing even if ID exists
-                        alliance_names.append(f"UnknownAlliance({alliance_id_cli})")
-                except Exception as e:
-                    # CLI-specific print: print(f"Error fetching alliance name for ID {alliance_id_cli}: {str(e)}")
-                    alliance_names.append(f"UnknownAlliance({alliance_id_cli})") # Keep this for context
+                alliance_names.append(names_by_id.get(str(alliance_id_cli), f"UnknownAlliance({alliance_id_cli})"))
             
             print(f"    DNR: {', '.join(alliance_names)}")
         
@@ -346,11 +128,12 @@ def main():
         print("")
 
         # Sort targets by beige_turns (ascending) then by 7-day stolen money (descending)
-        filtered.sort(key=lambda x: (x.get('beige_turns', 0), -x['seven_days_stolen']))
+        filtered.sort(key=lambda x: (x.beige_turns, -x.seven_days_stolen))
 
         if args.json:
             import json
-            print(json.dumps(filtered, indent=2))
+            print(json.dumps(filtered, indent=2, default=TargetRecord.to_dict))
+            RENDER_SECONDS.observe(time.perf_counter() - render_started, view='beige_cli')
             return
 
         # Print summary first
@@ -360,30 +143,31 @@ def main():
         # Print detailed target information
         print(f"\n🎯 Top {len(filtered)} Beige Nations (by smallest turns left):")
         for i, t in enumerate(filtered, 1):
-            nation_url = f"https://politicsandwar.com/nation/id={t['id']}"
-            print(f"{i}. {t['name']} | {t['alliance']}")
-            print(f"  Score: {t['score']:,.2f} | Cities: {t.get('num_cities', 'N/A')}")
-            print(f"  Daily income: ${t.get('daily_income', 0):,.2f}")
-            print(f"  Money stolen last 7d: {format_money(t['seven_days_stolen'])}")
-            print(f"  Beige turns: {t.get('beige_turns', 0)}")
+            print(f"{i}. {t.name} | {t.alliance}")
+            print(f"  Score: {t.score:,.2f} | Cities: {t.num_cities}")
+            print(f"  Daily income: ${t.daily_income:,.2f}")
+            print(f"  Money stolen last 7d: {format_money(t.seven_days_stolen)}")
+            print(f"  Beige turns: {t.beige_turns}")
 
             # Print last stolen info if available
-            money_stolen_amount = format_money(t.get('money_stolen_recent_def_war', 0))
-            # Use the pre-calculated last_stolen_time_ago_str
-            if t.get('money_stolen_recent_def_war', 0) > 0 and t.get('last_stolen_time_ago_str') != 'N/A':
-                 print(f"  Last stolen: {money_stolen_amount} - {t['last_stolen_time_ago_str']}")
-            elif t.get('money_stolen_recent_def_war', 0) > 0 : # If money was stolen but time string is N/A (e.g. error)
+            money_stolen_amount = format_money(t.money_stolen_recent_def_war)
+            # last_stolen_time_ago_str is derived from the scan time on access
+            if t.money_stolen_recent_def_war > 0 and t.last_stolen_time_ago_str != 'N/A':
+                 print(f"  Last stolen: {money_stolen_amount} - {t.last_stolen_time_ago_str}")
+            elif t.money_stolen_recent_def_war > 0 : # If money was stolen but time string is N/A (e.g. error)
                  print(f"  Last stolen: {money_stolen_amount} - timestamp unavailable")
 
             # Print military and commerce info
-            print(f"  Military: sold {t.get('soldiers', 0):,} tank {t.get('tanks', 0):,} air {t.get('aircraft', 0):,} ship {t.get('ships', 0):,} miss {t.get('missiles', 0):,} nuke {t.get('nukes', 0):,} spy {t.get('spies', 0):,}")
-            print(f"  Commerce: mrkt {t.get('supermarket', 0)} bank {t.get('bank', 0)} mall {t.get('shopping_mall', 0)} stad {t.get('stadium', 0)} subw {t.get('subway', 0)}")
-            print(f"  URL: {t.get('nation_url', 'N/A')}") # Uses nation_url
+            print(f"  Military: sold {t.soldiers:,} tank {t.tanks:,} air {t.aircraft:,} ship {t.ships:,} miss {t.missiles:,} nuke {t.nukes:,} spy {t.spies:,}")
+            print(f"  Commerce: mrkt {t.supermarket} bank {t.bank} mall {t.shopping_mall} stad {t.stadium} subw {t.subway}")
+            print(f"  URL: {t.nation_url}") # Uses nation_url
             print()
 
         # Print usage tips
         print("\nRaid Options:")
         print("  --json               Output results in JSON format")
+        print("  --stream             Print targets as they are found")
+        print("  --metrics            Print metrics to stderr when done")
         print("  --limit N            Limit number of results (current: {})".format(args.limit))
         print("  --max-pages N        Maximum number of pages to fetch (current: {})".format(args.max_pages))
 
@@ -392,10 +176,14 @@ def main():
         print(f"Samurai Beige Scanner - last updated {get_last_updated()}")
         print("built with ❤️ by the weakest of the Samurai: Bako Gayo")
         print("=" * 80)
+        RENDER_SECONDS.observe(time.perf_counter() - render_started, view='beige_cli')
 
     except Exception as e:
         print(f"\n❌ Fatal error: {str(e)}")
         traceback.print_exc()
+    finally:
+        if args.metrics:
+            print(registry.render(), file=sys.stderr, end="")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,72 @@
+"""
+Compare scanning for every member of an alliance, one scan per member vs. one batch scan.
+
+One scan per member looks each member up and crawls the candidate pages
+again for every one of them. The batch scan looks the members up in one
+query, crawls the pool covering all their war ranges once and fetches each
+candidate's details at most once.
+
+Reports the API requests made and the time taken for both.
+
+Usage:
+    python benchmarks/bench_batch.py [--members N] [--pages N] [--latency S]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PNW_API_KEY", "benchmark")
+os.environ["NATION_STORE_PATH"] = ""  # Crawl the stub server, not a local store
+
+import pnw_api
+import scan
+from stub_server import StubAPIServer
+
+MODES = ['raid', 'beige']
+
+def per_member(server, nation_ids, pages: int):
+    results = {}
+    for nation_id in nation_ids:
+        results[nation_id] = scan.scan_targets("benchmark", nation_id, MODES, 10, pages, source="api")[1]
+    return results
+
+def batch(server, nation_ids, pages: int):
+    return scan.scan_targets_batch("benchmark", nation_ids, MODES, 10, pages, source="api")[1]
+
+def measure(label: str, server, run, nation_ids, pages: int):
+    pnw_api.nation_cache.invalidate()
+    # Start every run with a full token bucket, so runs don't pay for the previous one's requests
+    time.sleep(pnw_api.rate_limiter.capacity / pnw_api.rate_limiter.rate)
+    queries = server.queries
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        results = run(server, nation_ids, pages)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {server.queries - queries:5d} API requests  {elapsed * 1000:8.0f} ms")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Alliance-wide scans, one per member vs. one batch')
+    parser.add_argument('--members', type=int, default=20, help='Attacking nations in the alliance (default: 20)')
+    parser.add_argument('--pages', type=int, default=10, help='Pages of 500 nations to scan (default: 10)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated API latency in seconds (default: 0)')
+    args = parser.parse_args()
+
+    with StubAPIServer(total_pages=args.pages, latency=args.latency) as server:
+        pnw_api.API_URL = server.url
+        # Spread over the stub's nations, so the members' war ranges differ
+        step = max(1, server.total_pages * server.per_page // args.members)
+        nation_ids = [1 + index * step for index in range(args.members)]
+        single = measure("per member", server, per_member, nation_ids, args.pages)
+        batched = measure("batch", server, batch, nation_ids, args.pages)
+
+    same = all([target.id for target in single[nation_id][mode]] == [target.id for target in batched[nation_id][mode]]
+               for nation_id in single for mode in MODES)
+    print(f"Same targets for every member: {'yes' if same else 'NO'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Count the connections a full nation scan opens against a local stand-in server.
+
+Compares the shared keep-alive session in pnw_api with the previous
+behaviour of a fresh connection per query (a bare requests.post).
+
+Usage:
+    python benchmarks/bench_connections.py [--pages N] [--pool-size N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PNW_API_KEY", "benchmark")
+
+import requests
+import pnw_api
+from stub_server import StubAPIServer
+
+def run_scan(pages: int):
+    """Run the queries a scan issues: the caller's nation, then every page."""
+    pnw_api.get_nation_by_id("benchmark", 1)
+    for page in range(1, pages + 1):
+        pnw_api.get_nations("benchmark", page)
+
+def measure(server, label: str, pages: int):
+    server.reset_counters()
+    started = time.perf_counter()
+    run_scan(pages)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<12} queries={server.queries:<4} connections={server.connections:<4} wall={elapsed:.2f}s")
+    return server.connections
+
+def main():
+    parser = argparse.ArgumentParser(description='Connections opened per scan, pooled vs unpooled')
+    parser.add_argument('--pages', type=int, default=10, help='Pages fetched per scan (default: 10)')
+    parser.add_argument('--pool-size', type=int, default=pnw_api.HTTP_POOL_SIZE, help='Connection pool size')
+    args = parser.parse_args()
+
+    with StubAPIServer(total_pages=args.pages) as server:
+        pnw_api.API_URL = server.url
+
+        # Previous behaviour: every query builds its own session and connection
+        original_get_session = pnw_api.get_session
+        pnw_api.get_session = requests.Session
+        try:
+            unpooled = measure(server, "unpooled", args.pages)
+        finally:
+            pnw_api.get_session = original_get_session
+
+        pnw_api.configure_http_client(args.pool_size)
+        pooled = measure(server, "pooled", args.pages)
+
+    print(f"\nConnections per scan: {unpooled} -> {pooled}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare the per-page cost of war date handling before and after parse-once epochs.
+
+The old loop ran datetime.strptime on each defensive war for the 7-day
+window, again inside the sort that finds the most recent war, once more on
+the winner, and called datetime.now() per war. The new path parses every
+war and attack date once at ingest (stamp_war_dates) and compares epochs
+against one "now" per scan.
+
+Usage:
+    python benchmarks/bench_dates.py [--pages N] [--repeat N]
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PNW_API_KEY", "benchmark")
+
+import pnw_api
+import scan
+from stub_server import StubAPIServer
+
+def old_dates(nation):
+    """The date handling of the loot computation as it was, minus the result dict."""
+    seven_days_stolen = 0
+    one_day_stolen = 0
+    if nation.get('wars') and isinstance(nation['wars'], list):
+        for war in nation['wars']:
+            if war.get('def_id') == nation['id']:
+                war_date = datetime.strptime(war['date'], '%Y-%m-%dT%H:%M:%S%z')
+                now_aware = datetime.now(war_date.tzinfo)
+                if (now_aware - war_date).days <= 7:
+                    for attack in war.get('attacks') or []:
+                        if attack.get('def_id') == nation['id']:
+                            seven_days_stolen += attack.get('money_stolen', 0)
+                if (now_aware - war_date).days <= 1:
+                    for attack in war.get('attacks') or []:
+                        if attack.get('def_id') == nation['id']:
+                            one_day_stolen += attack.get('money_stolen', 0)
+    if seven_days_stolen == 0:
+        return None
+    defensive_wars = [w for w in nation['wars'] if w.get('def_id') == nation['id']]
+    most_recent = sorted(defensive_wars, key=lambda x: datetime.strptime(x['date'], '%Y-%m-%dT%H:%M:%S%z'),
+                         reverse=True)[0]
+    most_recent_date = datetime.strptime(most_recent['date'], '%Y-%m-%dT%H:%M:%S%z')
+    hours_ago = int((datetime.now(most_recent_date.tzinfo) - most_recent_date).total_seconds() / 3600)
+    return seven_days_stolen, one_day_stolen, most_recent_date.strftime('%Y-%m-%d %H:%M:%S%z'), hours_ago
+
+def new_dates(nation, now: float):
+    """The same work on epochs parsed at ingest."""
+    seven_days_stolen, one_day_stolen, most_recent = scan._recent_loot(nation, now)
+    if seven_days_stolen == 0:
+        return None
+    most_recent_ts, most_recent_date, _ = most_recent
+    most_recent_date = datetime.fromisoformat(most_recent_date)
+    hours_ago = int((now - most_recent_ts) / 3600)
+    return seven_days_stolen, one_day_stolen, most_recent_date.strftime('%Y-%m-%d %H:%M:%S%z'), hours_ago
+
+def run_old(pages):
+    for page in pages:
+        for nation in page:
+            old_dates(nation)
+
+def run_new(pages):
+    now = time.time()
+    for page in pages:
+        for nation in page:
+            pnw_api.stamp_war_dates(nation)  # Once, at ingest
+            new_dates(nation, now)
+
+def measure(label: str, run, universe, page_count: int, repeat: int):
+    best = None
+    for _ in range(repeat):
+        # Fresh copies so each run parses dates from scratch
+        pages = [copy.deepcopy(universe[i * 500:(i + 1) * 500]) for i in range(page_count)]
+        started = time.perf_counter()
+        run(pages)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    wars = sum(len(nation.get('wars') or []) for nation in universe[:page_count * 500])
+    print(f"{label:<5} {best * 1000 / page_count:.1f} ms/page ({wars / page_count:.0f} wars/page, best of {repeat})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-page cost of war date handling')
+    parser.add_argument('--pages', type=int, default=10, help='Pages of 500 nations to process (default: 10)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per variant, best is reported (default: 5)')
+    args = parser.parse_args()
+
+    universe = list(StubAPIServer(total_pages=args.pages).universe)
+    measure("old", run_old, universe, args.pages, args.repeat)
+    measure("new", run_new, universe, args.pages, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure how long a user waits for the first target, list-returning scan vs. streaming scan.
+
+scan_targets only returns once every page has been processed, so its
+time to first result is the whole scan. iter_scan yields a 'target' event
+as soon as the first target makes the top list and a 'page' event after
+each page, so a caller can start rendering after the first page. The stub
+server adds a fixed latency per query to stand in for the API's round trip.
+
+Usage:
+    python benchmarks/bench_first_result.py [--pages N] [--nationid ID] [--latency S] [--repeat N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PNW_API_KEY", "benchmark")
+os.environ["NATION_STORE_PATH"] = ""  # Crawl the stub server, not a local store
+
+import pnw_api
+import scan
+from stub_server import StubAPIServer
+
+def run_list(nation_id: int, pages: int):
+    """Time to first result and to completion of scan_targets (the same moment)."""
+    started = time.perf_counter()
+    _, results = scan.scan_targets("benchmark", nation_id, ['raid'], 10, pages, source="api")
+    elapsed = time.perf_counter() - started
+    return (elapsed if results['raid'] else None), None, elapsed
+
+def run_stream(nation_id: int, pages: int):
+    """Time to the first 'target' event, the first 'page' event and completion of iter_scan."""
+    started = time.perf_counter()
+    first_target = first_page = None
+    for event in scan.iter_scan("benchmark", nation_id, ['raid'], 10, pages, source="api"):
+        if event['event'] == 'target' and first_target is None:
+            first_target = time.perf_counter() - started
+        elif event['event'] == 'page' and first_page is None:
+            first_page = time.perf_counter() - started
+    return first_target, first_page, time.perf_counter() - started
+
+def measure(label: str, run, nation_id: int, pages: int, repeat: int):
+    best = None
+    for _ in range(repeat):
+        pnw_api.nation_cache.invalidate()
+        # Start every run with a full token bucket, so runs don't pay for the previous one's requests
+        time.sleep(pnw_api.rate_limiter.capacity / pnw_api.rate_limiter.rate)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            timings = run(nation_id, pages)
+        if best is None or timings[2] < best[2]:
+            best = timings
+    first_target, first_page, total = best
+    show = lambda seconds: f"{seconds * 1000:.0f} ms" if seconds is not None else "n/a"
+    print(f"{label:<7} first target {show(first_target):>8}  first page {show(first_page):>8}  total {show(total):>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Time to first result, list vs. streaming scan')
+    parser.add_argument('--pages', type=int, default=10, help='Pages of 500 nations to scan (default: 10)')
+    parser.add_argument('--nationid', type=int, default=2222, help='Attacking nation ID (default: 2222)')
+    parser.add_argument('--latency', type=float, default=0.1, help='Seconds of latency per query (default: 0.1)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per variant, fastest is reported (default: 3)')
+    args = parser.parse_args()
+
+    with StubAPIServer(total_pages=args.pages, latency=args.latency) as server:
+        pnw_api.API_URL = server.url
+        measure("list", run_list, args.nationid, args.pages, args.repeat)
+        measure("stream", run_stream, args.nationid, args.pages, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare peak memory of buffered and streaming decoding of nation pages.
+
+The buffered path decodes each full 500-nation page (cities, wars and
+attacks included) with response.json() and filters afterwards, as
+get_nations did before pages were streamed. The streaming path decodes one
+nation at a time and drops the ones the filter rejects straight away.
+
+Each mode runs in its own process, apart from the stub server, so the
+server's own allocations don't count towards the measured peak.
+
+Usage:
+    python benchmarks/bench_memory.py [--pages N] [--nationid ID]
+"""
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PNW_API_KEY", "benchmark")
+
+import pnw_api
+from stub_server import StubAPIServer
+
+def make_filter(my_nation):
+    """A cheap scalar filter standing in for a scan's sweep filter."""
+    min_score = my_nation['score'] * pnw_api.MIN_SCORE_RATIO
+    max_score = my_nation['score'] * pnw_api.MAX_SCORE_RATIO
+    return lambda nation: min_score <= nation.get('score', 0) <= max_score and nation.get('color') != 'beige'
+
+def buffered(pages: int, keep):
+    """Decode each whole page, then filter it."""
+    kept = 0
+    for page in range(1, pages + 1):
+        query = "{ nations(page: %d, first: 500) { data {%s} paginatorInfo { hasMorePages } } }" % (
+            page, pnw_api.NATION_FULL_FIELDS)
+        nations = pnw_api.run_query("benchmark", query)["data"]["nations"]["data"]
+        kept += sum(1 for nation in nations if keep(nation))
+    return kept
+
+def streaming(pages: int, keep):
+    """Decode each page one nation at a time, keeping only the matches."""
+    kept = 0
+    for page in range(1, pages + 1):
+        kept += len(pnw_api.get_nations("benchmark", page, prefilter=keep)["data"])
+    return kept
+
+MODES = {"buffered": buffered, "streaming": streaming}
+
+def run_mode(mode: str, url: str, pages: int, nation_id: int):
+    """Run one mode against a running stub server and print its measurements."""
+    pnw_api.API_URL = url
+    with contextlib.redirect_stdout(io.StringIO()):
+        keep = make_filter(pnw_api.get_nation_by_id("benchmark", nation_id))
+        tracemalloc.start()
+        started = time.perf_counter()
+        kept = MODES[mode](pages, keep)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{mode:<10} kept={kept:<5} wall={elapsed:.2f}s peak={peak / (1024 * 1024):.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak memory of buffered vs streaming page decoding')
+    parser.add_argument('--pages', type=int, default=10, help='Pages in the stand-in universe (default: 10)')
+    parser.add_argument('--nationid', type=int, default=3000, help='Attacking nation ID (default: 3000)')
+    parser.add_argument('--mode', choices=sorted(MODES), help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.url, args.pages, args.nationid)
+        return
+
+    with StubAPIServer(total_pages=args.pages) as server:
+        server.universe  # Generate the data before timing anything
+        for mode in ("buffered", "streaming"):
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode, "--url", server.url,
+                            "--pages", str(args.pages), "--nationid", str(args.nationid)], check=True)
+
+if __name__ == "__main__":
+    main()
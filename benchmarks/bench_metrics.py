@@ -0,0 +1,76 @@
+"""
+Measure the overhead of the metrics instrumentation, enabled vs. disabled.
+
+Times the per-call cost of the metric operations the hot paths use, then a
+whole scan against the stub server with the registry switched on and off.
+
+Usage:
+    python benchmarks/bench_metrics.py [--pages N] [--nationid ID] [--calls N] [--repeat N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PNW_API_KEY", "benchmark")
+os.environ["NATION_STORE_PATH"] = ""  # Crawl the stub server, not a local store
+
+import pnw_api
+import scan
+from metrics import Registry, registry
+from stub_server import StubAPIServer
+
+def per_call(label: str, enabled: bool, calls: int):
+    """Nanoseconds per inc(), observe() and timed block on a registry like the shared one."""
+    bench_registry = Registry(enabled=enabled)
+    counter = bench_registry.counter("bench_total", "Benchmark counter", ["mode"])
+    histogram = bench_registry.histogram("bench_seconds", "Benchmark histogram", ["query"])
+    timings = []
+    for operation in (lambda: counter.inc(mode='raid'),
+                      lambda: histogram.observe(0.01, query='sweep')):
+        started = time.perf_counter()
+        for _ in range(calls):
+            operation()
+        timings.append((time.perf_counter() - started) / calls * 1e9)
+    started = time.perf_counter()
+    for _ in range(calls):
+        with histogram.time(query='sweep'):
+            pass
+    timings.append((time.perf_counter() - started) / calls * 1e9)
+    print(f"{label:<9} inc {timings[0]:6.0f} ns  observe {timings[1]:6.0f} ns  timed block {timings[2]:6.0f} ns")
+
+def whole_scan(label: str, enabled: bool, nation_id: int, pages: int, repeat: int):
+    registry.enabled = enabled
+    best = None
+    for _ in range(repeat):
+        pnw_api.nation_cache.invalidate()
+        # Start every run with a full token bucket, so runs don't pay for the previous one's requests
+        time.sleep(pnw_api.rate_limiter.capacity / pnw_api.rate_limiter.rate)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            scan.scan_targets("benchmark", nation_id, ['raid', 'beige'], 10, pages, source="api")
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<9} scan of {pages} pages {best * 1000:8.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Metrics overhead, enabled vs. disabled')
+    parser.add_argument('--pages', type=int, default=10, help='Pages of 500 nations to scan (default: 10)')
+    parser.add_argument('--nationid', type=int, default=2222, help='Attacking nation ID (default: 2222)')
+    parser.add_argument('--calls', type=int, default=200000, help='Calls per metric operation (default: 200000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Scans per variant, fastest is reported (default: 3)')
+    args = parser.parse_args()
+
+    per_call("disabled", False, args.calls)
+    per_call("enabled", True, args.calls)
+
+    with StubAPIServer(total_pages=args.pages) as server:
+        pnw_api.API_URL = server.url
+        whole_scan("disabled", False, args.nationid, args.pages, args.repeat)
+        whole_scan("enabled", True, args.nationid, args.pages, args.repeat)
+
+if __name__ == "__main__":
+    main()
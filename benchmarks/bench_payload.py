@@ -0,0 +1,69 @@
+"""
+Compare the response payload of a single-pass scan with the two-phase scan.
+
+The single-pass scan downloads every nested field for every nation in war
+range. The two-phase scan sweeps scalar fields only and fetches cities,
+wars and attacks for the nations that survive the filters.
+
+Usage:
+    python benchmarks/bench_payload.py [--pages N] [--nationid ID]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PNW_API_KEY", "benchmark")
+
+import pnw_api
+import raid
+import scan
+from page_fetcher import iter_nation_pages
+from stub_server import StubAPIServer
+
+def single_pass(nation_id: int, pages: int, stats):
+    """Fetch every page with the full nested selection, as scans did before the sweep."""
+    my_nation = pnw_api.get_nation_by_id("benchmark", nation_id)
+    filters = pnw_api.build_nation_filters(my_nation)
+    for _ in iter_nation_pages("benchmark", pages, filters, fields=pnw_api.NATION_FULL_FIELDS, stats=stats):
+        pass
+
+def two_phase(nation_id: int, pages: int, stats):
+    """Run the real raid scan, which sweeps first and fetches details for survivors."""
+    original = pnw_api.TransferStats
+    scan.TransferStats = lambda: stats
+    try:
+        raid.get_raid_targets("benchmark", nation_id, limit=10 ** 6, max_pages=pages, source="api")
+    finally:
+        scan.TransferStats = original
+
+def measure(label: str, run, nation_id: int, pages: int):
+    stats = pnw_api.TransferStats()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        run(nation_id, pages, stats)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} wall={elapsed:.2f}s peak={peak / (1024 * 1024):.1f} MB")
+    print(f"{'':<12} {stats.summary()}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Bytes transferred per scan phase')
+    parser.add_argument('--pages', type=int, default=10, help='Pages in the stand-in universe (default: 10)')
+    parser.add_argument('--nationid', type=int, default=3000, help='Attacking nation ID (default: 3000)')
+    args = parser.parse_args()
+
+    with StubAPIServer(total_pages=args.pages) as server:
+        pnw_api.API_URL = server.url
+        server.universe  # Generate the data before timing anything
+        measure("single-pass", single_pass, args.nationid, args.pages)
+        measure("two-phase", two_phase, args.nationid, args.pages)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compare the web app's per-nation rate limit before and after the sliding window counter.
+
+The old limiter kept a list of request timestamps per nation in a
+module-level dict, rebuilt the list on every check and never dropped
+nations that stopped coming back; each worker process kept its own dict.
+The new limiter keeps two window counters per nation in a backend, and
+the SQLite backend is shared by every worker process.
+
+Reports the memory held and the time per counted request for many distinct
+nations, then how many requests worker processes let one nation make.
+
+Usage:
+    python benchmarks/bench_rate_limit.py [--nations N] [--workers N]
+"""
+import argparse
+import functools
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PNW_API_KEY", "benchmark")
+
+from rate_limit import SlidingWindowLimiter, MemoryBackend, SQLiteBackend
+
+LIMIT = 10
+
+class OldLimiter:
+    """The timestamp-list limiter as it was in app.py."""
+
+    def __init__(self):
+        self.logs = {}
+
+    def check(self, nation_id):
+        current_time = datetime.now()
+        if nation_id not in self.logs:
+            self.logs[nation_id] = []
+        valid_requests = [timestamp for timestamp in self.logs[nation_id]
+                          if current_time - timestamp < timedelta(days=1)]
+        self.logs[nation_id] = valid_requests
+        return len(valid_requests) < LIMIT
+
+    def record(self, nation_id):
+        self.logs.setdefault(nation_id, []).append(datetime.now())
+
+    def acquire(self, nation_id):
+        # None when limited, like SlidingWindowLimiter.acquire
+        if not self.check(nation_id):
+            return None
+        self.record(nation_id)
+        return 0
+
+def measure_memory(label: str, limiter, nations: int):
+    tracemalloc.start()
+    started = time.perf_counter()
+    for request in range(LIMIT):
+        for nation_id in range(nations):
+            limiter.acquire(nation_id)
+    elapsed = time.perf_counter() - started
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<7} {held / 1024 / 1024:7.1f} MiB held  {elapsed / (LIMIT * nations) * 1e6:6.1f} us/request")
+
+def _worker(make_limiter, attempts: int, allowed):
+    limiter = make_limiter()
+    for _ in range(attempts):
+        if limiter.acquire(42) is not None:
+            with allowed.get_lock():
+                allowed.value += 1
+
+def _old_limiter():
+    return OldLimiter()
+
+def _shared_limiter(path):
+    return SlidingWindowLimiter(SQLiteBackend(path), limit=LIMIT)
+
+def measure_workers(label: str, make_limiter, workers: int):
+    allowed = multiprocessing.Value('i', 0)
+    processes = [multiprocessing.Process(target=_worker, args=(make_limiter, LIMIT, allowed)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    print(f"{label:<7} {allowed.value} requests allowed for one nation across {workers} workers (limit {LIMIT})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Rate limiter memory and cross-worker enforcement, old vs. new')
+    parser.add_argument('--nations', type=int, default=50000, help='Distinct nation IDs (default: 50000)')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes (default: 4)')
+    args = parser.parse_args()
+
+    measure_memory("old", OldLimiter(), args.nations)
+    measure_memory("new", SlidingWindowLimiter(MemoryBackend(max_keys=args.nations), limit=LIMIT), args.nations)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rate_limits.db")
+        measure_workers("old", _old_limiter, args.workers)
+        measure_workers("new", functools.partial(_shared_limiter, path), args.workers)
+
+if __name__ == "__main__":
+    main()
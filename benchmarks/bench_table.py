@@ -0,0 +1,62 @@
+"""
+Compare filtering the nation snapshot nation by nation with vectorized masks.
+
+Both runs go through NationSnapshot.iter_pages with the scan's sweep filter
+pipeline. The per-nation run passes the pipeline's plain function, which
+is what happens without NumPy; the vectorized run passes the pipeline
+itself, so the snapshot filters its NationTable columns with masks.
+
+Usage:
+    python benchmarks/bench_table.py [--pages N] [--nationid ID] [--repeat N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PNW_API_KEY", "benchmark")
+os.environ["NATION_STORE_PATH"] = ""  # Load the snapshot from the stub server, not a local store
+
+import pnw_api
+import scan
+from filters import compile_sweep_filters
+from snapshot import NationSnapshot
+from stub_server import StubAPIServer
+
+def measure(label: str, snapshot, my_nation, modes, as_pipeline: bool, repeat: int):
+    filters = scan._scan_filters(my_nation, modes)
+    best = None
+    for _ in range(repeat):
+        pipeline = compile_sweep_filters(my_nation, modes)
+        prefilter = pipeline if as_pipeline else pipeline.accepts
+        started = time.perf_counter()
+        kept = sum(len(data["data"]) for _, data in snapshot.iter_pages("benchmark", snapshot.max_pages, filters,
+                                                                         prefilter=prefilter))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<11} {best * 1000:.2f} ms kept={kept} ({pipeline.summary()})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot filtering, per nation vs. vectorized')
+    parser.add_argument('--pages', type=int, default=10, help='Pages of 500 nations in the snapshot (default: 10)')
+    parser.add_argument('--nationid', type=int, default=3000, help='Attacking nation ID (default: 3000)')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per variant, best is reported (default: 20)')
+    args = parser.parse_args()
+
+    with StubAPIServer(total_pages=args.pages) as server:
+        pnw_api.API_URL = server.url
+        snapshot = NationSnapshot(max_pages=args.pages)
+        with contextlib.redirect_stdout(io.StringIO()):
+            snapshot.refresh("benchmark")
+            my_nation = pnw_api.get_nation_by_id("benchmark", args.nationid)
+
+    modes = list(scan.SCAN_MODES.values())
+    print(f"{snapshot.stats()['nations']} nations in the snapshot, modes: {', '.join(scan.SCAN_MODES)}")
+    measure("per-nation", snapshot, my_nation, modes, False, args.repeat)
+    measure("vectorized", snapshot, my_nation, modes, True, args.repeat)
+
+if __name__ == "__main__":
+    main()
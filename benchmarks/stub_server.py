@@ -0,0 +1,284 @@
+"""
+Local stand-in for the Politics & War GraphQL API used by the benchmarks.
+
+The server answers `nations(...)` and `alliances(...)` queries with
+deterministic generated data, speaks HTTP/1.1 keep-alive, gzip-compresses
+responses when asked to, and counts the TCP connections it accepts so
+benchmarks can compare client behaviour without touching the real API.
+"""
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NATIONS_PER_PAGE = 500
+TOTAL_PAGES = 10
+
+def _make_nation(nation_id: int, now: datetime):
+    """Build one generated nation with the fields requested by pnw_api.get_nations."""
+    rng = random.Random(nation_id)
+    num_cities = rng.randint(1, 40)
+    wars = []
+    for war_index in range(rng.randint(0, 6)):
+        war_date = now - timedelta(hours=rng.randint(0, 24 * 14))
+        defending = rng.random() < 0.5
+        other_id = str(rng.randint(1, 700000))
+        def_id = str(nation_id) if defending else other_id
+        war_id = nation_id * 10 + war_index
+        wars.append({
+            "id": str(war_id),
+            "turns_left": rng.randint(0, 60),
+            "date": war_date.strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+            "att_id": other_id if defending else str(nation_id),
+            "def_id": def_id,
+            "attacks": [
+                {
+                    "id": str(war_id * 10 + attack_index),
+                    "war_id": str(war_id),
+                    "def_id": def_id,
+                    "money_stolen": round(rng.random() * 2000000, 2) if rng.random() < 0.3 else 0,
+                    "date": (war_date + timedelta(hours=rng.randint(0, 48))).strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+                }
+                for attack_index in range(rng.randint(0, 8))
+            ],
+        })
+    alliance_id = str(rng.randint(1, 300)) if rng.random() < 0.6 else None
+    return {
+        "id": str(nation_id),
+        "nation_name": f"Nation {nation_id}",
+        "score": round(rng.uniform(10, 6000), 2),
+        "num_cities": num_cities,
+        "alliance_id": alliance_id or "0",
+        "vacation_mode_turns": rng.choice([0] * 9 + [rng.randint(1, 100)]),
+        "beige_turns": rng.choice([0] * 4 + [rng.randint(1, 24)]),
+        "color": rng.choice(["beige", "blue", "red", "green", "black", "white", "gray"]),
+        "soldiers": rng.randint(0, 300000),
+        "tanks": rng.randint(0, 25000),
+        "aircraft": rng.randint(0, 3000),
+        "ships": rng.randint(0, 300),
+        "missiles": rng.randint(0, 20),
+        "nukes": rng.randint(0, 10),
+        "spies": rng.randint(0, 60),
+        "gross_national_income": round(rng.uniform(1e5, 5e8), 2),
+        "cities": [
+            {
+                "supermarket": rng.randint(0, 4),
+                "bank": rng.randint(0, 5),
+                "shopping_mall": rng.randint(0, 4),
+                "stadium": rng.randint(0, 3),
+                "subway": rng.randint(0, 1),
+            }
+            for _ in range(num_cities)
+        ],
+        "alliance": {
+            "id": alliance_id,
+            "name": f"Alliance {alliance_id}",
+            "treaties": [
+                {
+                    "alliance1_id": alliance_id,
+                    "alliance2_id": str(rng.randint(1, 300)),
+                    "treaty_type": rng.choice(["MDP", "ODP", "NAP", "PIAT", "Extension"]),
+                    "treaty_url": "",
+                }
+                for _ in range(rng.randint(0, 3))
+            ],
+        } if alliance_id else None,
+        "wars": wars,
+        "defensive_wars_count": rng.randint(0, 3),
+    }
+
+def _int_arg(query: str, name: str, default=None):
+    match = re.search(r'\b%s:\s*(\d+)' % name, query)
+    return int(match.group(1)) if match else default
+
+def _float_arg(query: str, name: str):
+    match = re.search(r'\b%s:\s*([\d.]+)' % name, query)
+    return float(match.group(1)) if match else None
+
+def _list_arg(query: str, name: str):
+    match = re.search(r'\b%s:\s*\[([^\]]*)\]' % name, query)
+    if not match:
+        single = _int_arg(query, name)
+        return [single] if single is not None else None
+    return [int(part) for part in match.group(1).split(',') if part.strip()]
+
+def _selection(query: str):
+    """
+    Parse the field selection inside `data { ... }` into a nested dict.
+
+    Leaf fields map to None, nested selections to their own dict.
+    """
+    tokens = re.findall(r'[A-Za-z_][A-Za-z0-9_]*|[{}]', query[query.index("data {"):])
+    stack = [{}]
+    last = None
+    for token in tokens[2:]:
+        if token == "{":
+            stack[-1][last] = {}
+            stack.append(stack[-1][last])
+        elif token == "}":
+            if len(stack) == 1:
+                break
+            stack.pop()
+        else:
+            stack[-1][token] = None
+            last = token
+    return stack[0]
+
+def _project(value, selection):
+    """Keep only the selected fields of a generated object, like a GraphQL server would."""
+    if selection is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [_project(item, selection) for item in value]
+    return {name: _project(value.get(name), sub) for name, sub in selection.items() if name in value}
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.record_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        query = json.loads(self.rfile.read(length) or b"{}").get("query", "")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        payload = json.dumps(self.server.answer(query)).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            payload = gzip.compress(payload, compresslevel=1)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class StubAPIServer(ThreadingHTTPServer):
+    """Threaded stand-in server. Use as a context manager to run it in the background."""
+    daemon_threads = True
+
+    def __init__(self, total_pages: int = TOTAL_PAGES, per_page: int = NATIONS_PER_PAGE, latency: float = 0):
+        """
+        Args:
+            total_pages: Pages of nations in the generated universe.
+            per_page: Nations per page.
+            latency: Seconds each query waits before it is answered, standing in for the real API's round trip.
+        """
+        super().__init__(("127.0.0.1", 0), StubAPIHandler)
+        self.total_pages = total_pages
+        self.per_page = per_page
+        self.latency = latency
+        self.now = datetime.now(timezone.utc)
+        self._universe = None
+        self.connections = 0
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/graphql"
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def reset_counters(self):
+        with self._lock:
+            self.connections = 0
+            self.queries = 0
+
+    @property
+    def universe(self):
+        """Every nation the server knows about, generated once."""
+        with self._lock:
+            if self._universe is None:
+                total = self.total_pages * self.per_page
+                self._universe = [_make_nation(i, self.now) for i in range(1, total + 1)]
+            return self._universe
+
+    def _filter_nations(self, query: str):
+        """Apply the nations(...) filter arguments the API supports server-side."""
+        nations = self.universe
+        min_id = _list_arg(query, "min_id")
+        if min_id:
+            nations = [nation for nation in nations if int(nation["id"]) >= min_id[0]]
+        min_score = _float_arg(query, "min_score")
+        max_score = _float_arg(query, "max_score")
+        max_cities = _int_arg(query, "max_cities")
+        colors = re.search(r'\bcolor:\s*\[([^\]]*)\]', query)
+        colors = set(re.findall(r'"([^"]+)"', colors.group(1))) if colors else None
+        vmode = re.search(r'\bvmode:\s*(true|false)', query)
+        vmode = vmode.group(1) == "true" if vmode else None
+
+        return [
+            nation for nation in nations
+            if (min_score is None or nation["score"] >= min_score)
+            and (max_score is None or nation["score"] <= max_score)
+            and (max_cities is None or nation["num_cities"] <= max_cities)
+            and (colors is None or nation["color"] in colors)
+            and (vmode is None or (nation["vacation_mode_turns"] > 0) == vmode)
+        ]
+
+    def answer(self, query: str):
+        with self._lock:
+            self.queries += 1
+        if "alliances(" in query:
+            ids = _list_arg(query, "id") or []
+            return {"data": {"alliances": {"data": [{"id": str(i), "name": f"Alliance {i}"} for i in ids]}}}
+
+        selection = _selection(query)
+        for collection in ("warattacks", "wars"):
+            if collection + "(" in query:
+                return self._answer_history(query, collection, selection)
+
+        ids = _list_arg(query, "id")
+        if ids is not None:
+            return {"data": {"nations": {
+                "data": [_project(_make_nation(i, self.now), selection) for i in ids],
+                "paginatorInfo": {"hasMorePages": False, "currentPage": 1},
+            }}}
+
+        page = _int_arg(query, "page", 1)
+        first = _int_arg(query, "first", self.per_page)
+        nations = self._filter_nations(query)
+        start = (page - 1) * first
+        return {"data": {"nations": {
+            "data": _project(nations[start:start + first], selection),
+            "paginatorInfo": {"hasMorePages": start + first < len(nations), "currentPage": page},
+        }}}
+
+    def _answer_history(self, query: str, collection: str, selection):
+        """Answer top-level wars(...) and warattacks(...) queries from the generated nations."""
+        wars = [war for nation in self.universe for war in nation["wars"]]
+        items = wars if collection == "wars" else [attack for war in wars for attack in war["attacks"]]
+        min_id = _int_arg(query, "min_id")
+        if min_id is not None:
+            items = [item for item in items if int(item["id"]) >= min_id]
+        items.sort(key=lambda item: int(item["id"]), reverse="order: DESC" in query)
+
+        page = _int_arg(query, "page", 1)
+        first = _int_arg(query, "first", 50)
+        start = (page - 1) * first
+        return {"data": {collection: {
+            "data": _project(items[start:start + first], selection),
+            "paginatorInfo": {"hasMorePages": start + first < len(items), "currentPage": page},
+        }}}
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+class _InFlight:
+    """A load in progress that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a TTL.
+
+    get_or_load() coalesces concurrent misses for the same key: the first
+    caller runs the loader while the others wait for its result (or its
+    exception), so a burst of identical lookups costs one upstream request.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get_locked(self, key, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get(self, key, default=None):
+        """Return the cached value for `key`, or `default` if missing or expired."""
+        with self._lock:
+            found, value = self._get_locked(key, time.monotonic())
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        """
+        Store a value, evicting the least recently used entries beyond `maxsize`.
+
+        Args:
+            key: Cache key.
+            value: Value to store.
+            ttl: Optional lifetime in seconds overriding the cache's default.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key, or every entry if no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for `key`, calling `loader()` once on a miss.
+
+        Concurrent callers missing the same key share a single call to `loader`.
+
+        Args:
+            key: Cache key.
+            loader: Zero-argument function producing the value.
+
+        Returns:
+            The cached or freshly loaded value
+
+        Raises:
+            Whatever `loader` raises; failed loads are not cached.
+        """
+        with self._lock:
+            found, value = self._get_locked(key, time.monotonic())
+            if found:
+                self.hits += 1
+                return value
+            flight = self._in_flight.get(key)
+            if flight is None:
+                self.misses += 1
+                flight = self._in_flight[key] = _InFlight()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            self.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+    def stats(self):
+        """Return the cache's size and hit/miss/coalesced counts."""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+            }
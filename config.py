@@ -10,9 +10,92 @@ if not API_KEY:
 # Maximum number of pages to fetch from the API
 MAX_PAGES = 10
 
+# Maximum number of keep-alive connections pooled for API requests
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+
+# Pacing of API requests (shared token bucket) and pages fetched in parallel
+API_REQUESTS_PER_SECOND = 10
+API_BURST = 5
+PAGE_FETCH_CONCURRENCY = 4
+
+# Retries of throttled/failed API requests and the shared circuit breaker
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5  # Seconds; doubled per attempt, with full jitter
+RETRY_MAX_DELAY = 8
+RETRY_MAX_SLEEP = 2  # Longest in-line wait; longer waits fail fast instead
+BREAKER_FAILURE_THRESHOLD = 5  # Consecutive failures that open the circuit (a 429 opens it at once)
+BREAKER_COOLDOWN = 5  # Seconds the circuit stays open without a Retry-After
+BREAKER_MAX_COOLDOWN = 60
+
+# Nations per detail query in the second phase of a scan
+DETAIL_BATCH_SIZE = 100
+
+# Bytes read at a time when nation pages are decoded as they stream in
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Short-lived cache of get_nation_by_id lookups
+NATION_CACHE_TTL = int(os.getenv("NATION_CACHE_TTL", "30"))  # Seconds
+NATION_CACHE_SIZE = 1024  # Nations kept, least recently used evicted first
+
+# In-process snapshot of the nation universe shared by web requests
+SNAPSHOT_TTL = int(os.getenv("SNAPSHOT_TTL", "300"))  # Seconds before a background refresh
+SNAPSHOT_MAX_PAGES = 30  # Pages of 500 nations kept in the snapshot
+
+# Game turns change every TURN_INTERVAL seconds on the UTC clock (even hours), shifted by TURN_OFFSET
+TURN_INTERVAL = 7200
+TURN_OFFSET = int(os.getenv("TURN_OFFSET", "0"))  # Seconds
+
+# Refresh nation data this long after every turn change, once across all workers (see prewarm.py)
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "True").lower() == "true"
+PREWARM_DELAY = 15  # Seconds after the turn change
+PREWARM_LOCK_PATH = os.getenv("PREWARM_LOCK_PATH", "prewarm.lock")  # Lock file shared by the workers
+PREWARM_SNAPSHOT_PATH = os.getenv("PREWARM_SNAPSHOT_PATH", "prewarm_snapshot.json")  # Leader's snapshot, loaded by the other workers without a store
+
+# Web scans cover raid and beige in one pass; results are kept until the next turn change, at most this long
+SCAN_RESULT_TTL = int(os.getenv("SCAN_RESULT_TTL", "7200"))  # Seconds
+SCAN_RESULT_CACHE_SIZE = 256  # (nation, fingerprint) result sets kept
+
+# Web scans run as background jobs on a bounded pool (see jobs.py)
+SCAN_JOB_WORKERS = int(os.getenv("SCAN_JOB_WORKERS", "4"))  # Scans running at once per process
+SCAN_JOB_MAX_PENDING = 32  # Queued and running jobs before new scans are refused
+SCAN_JOB_TTL = 600  # Seconds finished jobs are kept for their results
+
+# JSON API (/api/raid/<id>, /api/beige/<id>)
+API_GZIP_LEVEL = 6  # Compression level of gzipped responses
+BATCH_SCAN_MAX_NATIONS = int(os.getenv("BATCH_SCAN_MAX_NATIONS", "500"))  # Attackers per /api/batch scan
+
+# Per-nation limit of web scans, counted in a sliding window shared by every worker (see rate_limit.py)
+RATE_LIMIT_MAX_REQUESTS = 10
+RATE_LIMIT_WINDOW = 86400  # Seconds
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite")  # 'memory', 'sqlite' or 'redis'
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", "rate_limits.db")  # SQLite file shared by the workers
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")  # e.g. redis://localhost:6379/0
+RATE_LIMIT_MAX_KEYS = 100000  # Nations tracked by the memory backend, least recently used evicted first
+RATE_LIMIT_SWEEP_INTERVAL = 600  # Seconds between sweeps of nations whose requests all expired
+
+# Prometheus metrics at /metrics (see metrics.py); when disabled, instrumented code skips recording
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+
+# Persistent SQLite store of nations, wars and attacks; opt-in, set a path such as nations.db to enable it
+NATION_STORE_PATH = os.getenv("NATION_STORE_PATH", "")
+STORE_REFRESH_INTERVAL = 120  # Seconds between incremental syncs
+STORE_MAX_PAGES = 40  # Pages fetched by a full or incremental nation sweep
+STORE_FULL_SWEEP_INTERVAL = 86400  # Seconds between full sweeps, which also drop deleted nations
+STORE_DETAIL_TTL = 86400  # Seconds before stored city totals are re-fetched
+
+# Rolling loot sums fed by polling wars and attacks (see loot_index.py), used by the web app
+LOOT_INDEX_ENABLED = os.getenv("LOOT_INDEX_ENABLED", "True").lower() == "true"
+LOOT_POLL_INTERVAL = 60  # Seconds between polls of new wars and attacks
+LOOT_MAX_LAG = 300  # Seconds since the last poll before scans stop trusting the index
+LOOT_BACKFILL_MAX_PAGES = 200  # Pages of 1000 wars or attacks fetched per poll
+LOOT_INDEX_PATH = os.getenv("LOOT_INDEX_PATH", "loot_index.db")  # SQLite feed the workers share polled wars and attacks through; empty to poll in every process
+
 # Raid war specific settings (optimized for loot)
 MIN_SCORE_RATIO = 0.75  # Can down-declare to 25% of your score for raid wars
 MAX_SCORE_RATIO = 1.5  # Can up-declare to 150% of your score for raid wars
 
+# Treaty types that protect an allied alliance's members from being raided
+PROTECTED_TREATY_TYPES = tuple(os.getenv("PROTECTED_TREATY_TYPES", "MDP,MDOAP,ODP,ODOAP,NAP,PIAT,Protectorate").split(","))
+
 # Web app settings
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
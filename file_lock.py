@@ -0,0 +1,44 @@
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the lock then only covers this process
+    fcntl = None
+
+class FileLock:
+    """
+    Exclusive lock shared by every worker process on the host, held on a lock file.
+
+    Threads of one process queue on a thread lock first, since flock locks
+    are held per open file, not per thread. Subclasses may read and write
+    the open file in `_file` while the lock is held.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._file = open(self.path, 'a+')
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_EX)  # Waits for the worker holding it
+        except Exception:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        finally:
+            self._file = None
+            self._thread_lock.release()
+        return False
@@ -0,0 +1,222 @@
+import threading
+from pnw_api import treaty_protected_alliances
+from nation_table import np  # None without NumPy; only mask() needs it
+from config import MIN_SCORE_RATIO, MAX_SCORE_RATIO
+
+class FilterPipeline:
+    """
+    Ordered chain of named nation checks that stops at the first failure.
+
+    Each stage is a function taking a nation and returning True to keep it.
+    Stages run in the order given, so cheap, selective checks should come
+    first. The pipeline counts how many nations each stage rejected; scans
+    can also record rejections from later stages with reject().
+
+    Counters are kept per thread, so the pipeline can be used without locking
+    as the prefilter of pages decoded in parallel.
+
+    A stage can also carry a vectorized form taking a NationTable and
+    returning a boolean mask over all its rows; mask() uses it to filter a
+    whole table at once, falling back to the per-nation check for stages
+    without one.
+    """
+
+    def __init__(self, stages):
+        """
+        Args:
+            stages: List of (stage name, predicate) or (stage name, predicate,
+                vectorized predicate) tuples, in evaluation order.
+        """
+        self.stages = [tuple(stage) + (None,) * (3 - len(stage)) for stage in stages]
+        self._checks = [keep for _, keep, _ in self.stages]
+        self._names = [name for name, _, _ in self.stages]
+        self._extra = {}
+        self._local = threading.local()
+        self._counters = []
+        self._lock = threading.Lock()
+        # Hot path: pass `pipeline.accepts` rather than the pipeline itself to skip a call level
+        self.accepts = self._compile()
+
+    def _thread_counts(self):
+        """Per-thread counters (one per stage, then passed), so counting needs no lock."""
+        counts = getattr(self._local, 'counts', None)
+        if counts is None:
+            counts = self._local.counts = [0] * (len(self._checks) + 1)
+            with self._lock:
+                self._counters.append(counts)
+        return counts
+
+    def __call__(self, nation):
+        return self.accepts(nation)
+
+    def _compile(self):
+        """Build the per-nation function as a closure over the stage list, avoiding attribute lookups."""
+        indexed_checks = tuple(enumerate(self._checks))
+        local = self._local
+        thread_counts = self._thread_counts
+
+        def accepts(nation):
+            try:
+                counts = local.counts
+            except AttributeError:
+                counts = thread_counts()
+            for index, keep in indexed_checks:
+                if not keep(nation):
+                    counts[index] += 1
+                    return False
+            counts[-1] += 1
+            return True
+        return accepts
+
+    def mask(self, table, rows):
+        """
+        Run the pipeline over rows of a NationTable, counting rejections like a per-nation call.
+
+        Args:
+            table: NationTable holding the nations.
+            rows: NumPy array of the row indices to check.
+
+        Returns:
+            Boolean NumPy array, True for each row in `rows` that passes every stage
+        """
+        counts = self._thread_counts()
+        passed = np.ones(len(rows), dtype=bool)
+        # Stages see only the rows asked for, so checking a slice costs the slice, not the table
+        if len(rows) < len(table):
+            table = table.take(rows)
+            alive = np.arange(len(rows))
+        else:
+            alive = rows
+        for index, (_, keep, vectorized) in enumerate(self.stages):
+            if not len(alive):
+                break
+            if vectorized is not None:
+                ok = vectorized(table)[alive]
+            else:
+                ok = np.fromiter((keep(table.nations[row]) for row in alive), dtype=bool, count=len(alive))
+            counts[index] += int(len(ok) - np.count_nonzero(ok))
+            passed[passed] = ok
+            alive = alive[ok]
+        counts[-1] += len(alive)
+        return passed
+
+    def reject(self, stage: str):
+        """Count one nation rejected by a stage outside the pipeline, e.g. after details are fetched."""
+        with self._lock:
+            self._extra[stage] = self._extra.get(stage, 0) + 1
+
+    def stats(self):
+        """Return the number of nations checked and kept, and the rejections per stage, in stage order."""
+        with self._lock:
+            totals = [sum(column) for column in zip(*self._counters)] or [0] * (len(self._checks) + 1)
+            rejected = dict(zip(self._names, totals))
+            rejected.update(self._extra)
+            return {'checked': sum(totals), 'passed': totals[-1], 'rejected': rejected}
+
+    def summary(self):
+        """Human-readable one-line summary of the rejection counters."""
+        stats = self.stats()
+        rejected = ", ".join(f"{name}: {count}" for name, count in stats['rejected'].items() if count)
+        return f"{stats['passed']} passed the sweep" + (f", rejected by {rejected}" if rejected else "")
+
+# The attacker's score, military and alliance: scans for the same attacker
+# with the same figures pass the same nations
+FINGERPRINT_FIELDS = ('score', 'num_cities', 'soldiers', 'tanks', 'aircraft', 'ships', 'missiles', 'nukes',
+                      'spies', 'alliance_id')
+
+def nation_fingerprint(my_nation):
+    """Return a hashable summary of the attacking nation's figures that scan results depend on."""
+    return tuple(my_nation.get(name) for name in FINGERPRINT_FIELDS)
+
+def _mode_checks(modes):
+    """Return the per-nation and vectorized checks (or None) that at least one of `modes` accepts a nation."""
+    mode_checks = [mode.accepts for mode in modes]
+    if len(mode_checks) == 1:
+        accepted_by_mode = mode_checks[0]
+    else:
+        accepted_by_mode = lambda nation: any(accepts(nation) for accepts in mode_checks)
+    mode_masks = [mode.mask for mode in modes]
+    if all(mode_masks):
+        mode_mask = lambda table: np.logical_or.reduce([mask(table) for mask in mode_masks])
+    else:
+        mode_mask = None
+    return accepted_by_mode, mode_mask
+
+def compile_pool_filters(modes):
+    """
+    Compile the sweep checks that don't depend on the attacker, for a pool shared by several attackers.
+
+    Batch scans crawl one candidate pool for many attackers; these stages
+    drop the nations none of them could target before the pool is kept.
+    Each attacker's own compile_sweep_filters pipeline then runs over it.
+
+    Args:
+        modes: ScanMode objects; a nation must be accepted by at least one of them.
+
+    Returns:
+        A FilterPipeline
+    """
+    accepted_by_mode, mode_mask = _mode_checks(modes)
+    return FilterPipeline([
+        ('vacation', lambda nation: nation.get('vacation_mode_turns', 0) <= 0,
+         lambda table: table.vacation_mode_turns <= 0),
+        ('mode', accepted_by_mode, mode_mask),
+        ('defensive_wars', lambda nation: nation.get('defensive_wars_count', 0) < 3,
+         lambda table: table.defensive_wars_count < 3),
+    ])
+
+def compile_sweep_filters(my_nation, modes):
+    """
+    Compile the attacker's thresholds into the scan's sweep filter pipeline.
+
+    The thresholds are computed once here rather than for every nation.
+    Stages only read the sweep's scalar fields, cheapest and most selective
+    first: war range, vacation mode, city count, the scan modes' own checks,
+    defensive wars, military and finally treaties. The built-in stages also
+    have vectorized forms for NationTable snapshots.
+
+    Args:
+        my_nation: Attacking nation data from get_nation_by_id.
+        modes: ScanMode objects; a nation must be accepted by at least one of them.
+
+    Returns:
+        A FilterPipeline
+    """
+    min_score = my_nation['score'] * MIN_SCORE_RATIO
+    max_score = my_nation['score'] * MAX_SCORE_RATIO
+    max_cities = my_nation.get('num_cities', 0)
+    max_ships = my_nation.get('ships', 0)
+    max_missiles = my_nation.get('missiles', 0)
+    max_nukes = my_nation.get('nukes', 0)
+    max_spies = my_nation.get('spies', 0)
+    my_alliance = my_nation.get('alliance')
+    accepted_by_mode, mode_mask = _mode_checks(modes)
+
+    stages = [
+        ('war_range', lambda nation: min_score <= nation.get('score', 0) <= max_score,
+         lambda table: (table.score >= min_score) & (table.score <= max_score)),
+        ('vacation', lambda nation: nation.get('vacation_mode_turns', 0) <= 0,
+         lambda table: table.vacation_mode_turns <= 0),
+        # Exclude nations with more cities than us
+        ('cities', lambda nation: nation.get('num_cities', 0) <= max_cities,
+         lambda table: table.num_cities <= max_cities),
+        # Mode-specific checks (beige or not, beige turns left)
+        ('mode', accepted_by_mode, mode_mask),
+        # Nations already under 3+ defensive wars can't be declared on
+        ('defensive_wars', lambda nation: nation.get('defensive_wars_count', 0) < 3,
+         lambda table: table.defensive_wars_count < 3),
+        # Filter out nations with stronger military (ships, missiles, nukes, spies)
+        ('military', lambda nation: (nation.get('ships', 0) <= max_ships and
+                                     nation.get('missiles', 0) <= max_missiles and
+                                     nation.get('nukes', 0) <= max_nukes and
+                                     nation.get('spies', 0) <= max_spies),
+         lambda table: ((table.ships <= max_ships) & (table.missiles <= max_missiles) &
+                        (table.nukes <= max_nukes) & (table.spies <= max_spies))),
+    ]
+    # Always respect treaties: our treaty partners' IDs are indexed once, then
+    # only the target's alliance ID is needed
+    protected = treaty_protected_alliances(my_alliance)
+    if protected:
+        stages.append(('treaty', lambda nation: str(nation.get('alliance_id')) not in protected,
+                       lambda table: ~table.alliance_in(protected)))
+    return FilterPipeline(stages)
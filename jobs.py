@@ -0,0 +1,168 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config import SCAN_JOB_WORKERS, SCAN_JOB_MAX_PENDING, SCAN_JOB_TTL
+
+def _encode_results(results):
+    """Results as JSON-ready values: lists of TargetRecords, nested in dicts per mode (and per attacker for batches)."""
+    if isinstance(results, dict):
+        return {str(key): _encode_results(value) for key, value in results.items()}
+    return [target.to_dict() for target in results]
+
+class ScanJob:
+    """
+    One scan running in the background, and the progress it has reported.
+
+    The job runs a generator of scan events (see scan.iter_scan) and keeps
+    the latest progress, results and error. Every update bumps `version`
+    and wakes waiters, so status polls and event streams see it at once.
+    """
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.page = 0
+        self.max_pages = None
+        self.found = 0
+        self.results = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def _update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def run(self, events_factory):
+        """Run a scan and consume its events, recording progress; called on a worker thread."""
+        self._update(status='running')
+        try:
+            for event in events_factory():
+                if event['event'] == 'target':
+                    self._update(found=self.found + 1)
+                elif event['event'] == 'page':
+                    self._update(page=event['page'], max_pages=event['max_pages'])
+                elif event['event'] == 'done':
+                    self._update(status='done', results=event['results'], finished_at=time.time())
+            if not self.finished:
+                raise ValueError("The scan ended without results")
+        except ValueError as e:
+            print(f"Scan job {self.id} failed: {str(e)}")
+            self._update(status='error', error=str(e), finished_at=time.time())
+        except Exception as e:
+            print(f"Scan job {self.id} failed unexpectedly: {str(e)}")
+            self._update(status='error', finished_at=time.time(),
+                         error="An unexpected server error occurred. Please try again later or contact support.")
+
+    def wait(self, version: int, timeout: float):
+        """
+        Block until the job changes after `version` or `timeout` seconds pass.
+
+        Returns:
+            The job's current version
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def to_dict(self, include_results: bool = True):
+        """Return the job's state as a JSON-ready dictionary, with results once done."""
+        with self._changed:
+            state = {
+                'id': self.id,
+                'status': self.status,
+                'page': self.page,
+                'max_pages': self.max_pages,
+                'found': self.found,
+                'error': self.error,
+            }
+            if include_results and self.results is not None:
+                state['results'] = _encode_results(self.results)
+            return state
+
+class JobManager:
+    """
+    Runs scans on a bounded thread pool so web requests return at once.
+
+    submit() deduplicates identical scans: while a job for the same key is
+    queued or running, it is returned instead of starting another. At most
+    `max_pending` jobs may be unfinished at a time. Finished jobs are kept
+    for `ttl` seconds so their results can still be fetched.
+    """
+
+    def __init__(self, max_workers: int = SCAN_JOB_WORKERS, max_pending: int = SCAN_JOB_MAX_PENDING,
+                 ttl: float = SCAN_JOB_TTL):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan-job")
+        self._jobs = {}
+        self._active = {}  # key -> unfinished job
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished_at > self.ttl]:
+            del self._jobs[job_id]
+
+    def submit(self, key, events_factory):
+        """
+        Start a job for `key`, or return the unfinished job already running it.
+
+        Args:
+            key: Identifies identical scans, e.g. the attacking nation ID.
+            events_factory: Function with no arguments returning the scan's event generator.
+
+        Returns:
+            Tuple of (ScanJob, True if a new job was started)
+
+        Raises:
+            ValueError: If `max_pending` jobs are already queued or running
+        """
+        with self._lock:
+            self._prune(time.time())
+            job = self._active.get(key)
+            if job is not None and not job.finished:
+                return job, False
+            unfinished = sum(1 for job in self._active.values() if not job.finished)
+            if unfinished >= self.max_pending:
+                raise ValueError("Too many scans are running. Please try again in a minute.")
+            job = ScanJob(key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job, events_factory)
+        return job, True
+
+    def _run(self, job, events_factory):
+        try:
+            job.run(events_factory)
+        finally:
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+
+    def get(self, job_id: str):
+        """Return a job by ID, or None if it is unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        """Return the number of jobs kept and how many are still unfinished."""
+        with self._lock:
+            return {
+                'jobs': len(self._jobs),
+                'unfinished': sum(1 for job in self._jobs.values() if not job.finished),
+            }
+
+# Shared by every request in this process
+scan_jobs = JobManager()
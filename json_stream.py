@@ -0,0 +1,108 @@
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'\s*')
+
+class JSONArrayStream:
+    """
+    Incrementally decode the items of one array inside a streamed JSON document.
+
+    The array is located by its key path, e.g. ('data', 'nations', 'data')
+    for a `nations(...)` query. Iterating the stream yields the array's items
+    one at a time while the rest of the body is still being read, so only the
+    current item and a small text buffer are held in memory rather than the
+    whole decoded document.
+
+    Everything outside the array (pagination info, GraphQL errors) is kept as
+    text and can be decoded with skeleton() once iteration is finished. If the
+    document does not contain the array at all, e.g. an error response,
+    iteration yields nothing and skeleton() returns the whole document.
+    """
+
+    def __init__(self, chunks, path):
+        """
+        Args:
+            chunks: Iterable of decoded text chunks of the JSON document.
+            path: Keys leading to the array, outermost first.
+        """
+        self._chunks = iter(chunks)
+        self._markers = [re.compile(r'"%s"\s*:\s*\{' % re.escape(key)) for key in path[:-1]]
+        self._markers.append(re.compile(r'"%s"\s*:\s*\[' % re.escape(path[-1])))
+        self._buffer = ""
+        self._head = None
+        self._tail = None
+
+    def _read(self):
+        """Append the next chunk to the buffer. Returns False once the body is exhausted."""
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += chunk
+                return True
+        return False
+
+    def _find_array(self):
+        """Read until the array's opening bracket, keeping the text before it as the head."""
+        pos = 0
+        for marker in self._markers:
+            match = marker.search(self._buffer, pos)
+            while match is None:
+                if not self._read():
+                    return False
+                match = marker.search(self._buffer, pos)
+            pos = match.end()
+        self._head = self._buffer[:pos]
+        self._buffer = self._buffer[pos:]
+        return True
+
+    def __iter__(self):
+        if self._head is not None:
+            raise ValueError("JSONArrayStream can only be iterated once")
+        if not self._find_array():
+            self._head = self._buffer
+            self._tail = ""
+            self._buffer = ""
+            return
+
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(self._buffer, pos).end()
+            if pos < len(self._buffer):
+                if self._buffer[pos] == ',':
+                    pos += 1
+                    continue
+                if self._buffer[pos] == ']':
+                    break
+                try:
+                    item, pos = _decoder.raw_decode(self._buffer, pos)
+                except json.JSONDecodeError:
+                    pass  # The item is cut off at the end of the buffer
+                else:
+                    yield item
+                    continue
+            # Drop what's been consumed and read on
+            self._buffer = self._buffer[pos:]
+            pos = 0
+            if not self._read():
+                raise ValueError("API response ended in the middle of an array")
+
+        # Keep the closing bracket so head + tail is the document with an empty array
+        self._tail = self._buffer[pos:]
+        self._buffer = ""
+        while self._read():
+            self._tail += self._buffer
+            self._buffer = ""
+
+    def skeleton(self):
+        """
+        Decode the document without the array's items.
+
+        Returns:
+            The parsed document, with the streamed array left empty
+
+        Raises:
+            ValueError: If called before iteration finished, or the document is not valid JSON.
+        """
+        if self._tail is None:
+            raise ValueError("JSONArrayStream must be fully iterated before reading the skeleton")
+        return json.loads(self._head + self._tail)
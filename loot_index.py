@@ -0,0 +1,464 @@
+import heapq
+import sqlite3
+import threading
+import time
+from pnw_api import get_wars, get_war_attacks, parse_api_date, format_api_datetime
+from file_lock import FileLock
+from config import LOOT_POLL_INTERVAL, LOOT_MAX_LAG, LOOT_BACKFILL_MAX_PAGES, LOOT_INDEX_PATH
+
+DAY = 86400
+
+# Wars count towards the 7-day and 1-day sums while fewer whole days than
+# this have passed since they started, as in scan._recent_loot
+SEVEN_DAY_WINDOW = 8 * DAY
+ONE_DAY_WINDOW = 2 * DAY
+
+class _War:
+    """A defensive war within the 7-day window and the money stolen from its defender so far."""
+
+    __slots__ = ('id', 'def_id', 'ts', 'date', 'loot', 'in_one_day')
+
+    def __init__(self, war_id: int, def_id: str, ts: int, date: str):
+        self.id = war_id
+        self.def_id = def_id
+        self.ts = ts
+        self.date = date
+        self.loot = 0
+        self.in_one_day = True
+
+class _Defender:
+    """Rolling loot sums of one nation over its defensive wars in the window."""
+
+    __slots__ = ('seven_days', 'one_day', 'last_looted', 'wars')
+
+    def __init__(self):
+        self.seven_days = 0
+        self.one_day = 0
+        self.last_looted = None
+        self.wars = []
+
+FEED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS wars (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    date_ts INTEGER,
+    def_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_wars_date_ts ON wars (date_ts);
+
+CREATE TABLE IF NOT EXISTS attacks (
+    id INTEGER PRIMARY KEY,
+    war_id INTEGER,
+    def_id INTEGER,
+    money_stolen REAL,
+    date TEXT,
+    date_ts INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_attacks_date_ts ON attacks (date_ts);
+
+CREATE TABLE IF NOT EXISTS feed_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Feed rows read into a LootIndex at a time
+FEED_READ_BATCH = 5000
+
+class LootFeed:
+    """
+    Wars and attacks of the last 8 days, polled from the API once for every worker process.
+
+    The feed is a SQLite file shared by the workers on a host. The worker
+    whose poll is due first pulls the new wars and attacks into it, holding
+    a lock file next to the database; workers taking the lock after it find
+    the feed fresh and make no API request. Each worker then reads the rows
+    it hasn't applied yet into its own LootIndex.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = FileLock(path + '.lock')
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def _connection(self):
+        """Return this thread's connection, creating the schema on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                conn.executescript(FEED_SCHEMA)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def state(self):
+        """Return the feed's cursors, the time of its last poll and whether that poll caught up."""
+        state = {row['key']: row['value'] for row in self._connection().execute("SELECT key, value FROM feed_state")}
+        return {
+            'wars_max_id': int(state['wars_max_id']) if 'wars_max_id' in state else None,
+            'attacks_max_id': int(state['attacks_max_id']) if 'attacks_max_id' in state else None,
+            'polled_at': float(state['polled_at']) if 'polled_at' in state else None,
+            'caught_up': state.get('caught_up') == '1',
+        }
+
+    def set_state(self, **values):
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT INTO feed_state (key, value) VALUES (?, ?) "
+                             "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                             [(key, str(int(value) if isinstance(value, bool) else value))
+                              for key, value in values.items()])
+
+    def save_wars(self, wars):
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO wars (id, date, date_ts, def_id) VALUES (?, ?, ?, ?)",
+                             [(int(war['id']), war.get('date'), parse_api_date(war.get('date')),
+                               int(war['def_id']) if war.get('def_id') else None) for war in wars])
+
+    def save_attacks(self, attacks):
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO attacks (id, war_id, def_id, money_stolen, date, date_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(int(attack['id']), int(attack['war_id']), int(attack['def_id']) if attack.get('def_id') else None,
+                  attack.get('money_stolen') or 0, attack.get('date'), parse_api_date(attack.get('date')))
+                 for attack in attacks])
+
+    def read(self, table: str, after_id: int, limit: int = FEED_READ_BATCH):
+        """Return up to `limit` rows of 'wars' or 'attacks' with an ID above `after_id`, in ID order."""
+        columns = "id, date, def_id" if table == 'wars' else "id, war_id, def_id, money_stolen, date"
+        return [dict(row) for row in self._connection().execute(
+            f"SELECT {columns} FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))]
+
+    def prune(self, now: float):
+        """Delete wars and attacks that have left the 7-day window."""
+        cutoff = int(now - SEVEN_DAY_WINDOW)
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM attacks WHERE date_ts < ?", (cutoff,))
+            conn.execute("DELETE FROM wars WHERE date_ts < ?", (cutoff,))
+
+class LootIndex:
+    """
+    Rolling 1-day and 7-day loot sums per defender, fed from the top-level
+    `wars` and `warattacks` queries.
+
+    A background thread polls both queries with min_id cursors and applies
+    each new war and attack once, so scans look up a nation's loot figures
+    in constant time instead of walking its nested wars and attacks. Wars
+    expire from the 1-day and 7-day sums as they age out of the windows.
+
+    The windows match scan._recent_loot: a defensive war counts while fewer
+    than 2 (1-day) or 8 (7-day) whole days have passed since it started, and
+    every attack on the defender in it adds to the sums. Until a poll has
+    reached the newest wars and attacks (the first backfill of the last 8
+    days may take several polls), or when polling has fallen behind by more
+    than `max_lag` seconds, the index is not warm and scans
+    fall back to the nested wars of each nation.
+
+    With a LootFeed, the wars and attacks are pulled from the API once for
+    every worker on the host and each index reads them from the feed, so
+    upstream load doesn't grow with the number of workers and a new worker
+    is warm as soon as it has read the feed.
+    """
+
+    def __init__(self, poll_interval: float = LOOT_POLL_INTERVAL, max_lag: float = LOOT_MAX_LAG,
+                 backfill_max_pages: int = LOOT_BACKFILL_MAX_PAGES, feed=None):
+        self.poll_interval = poll_interval
+        self.max_lag = max_lag
+        self.backfill_max_pages = backfill_max_pages
+        self.feed = feed
+        self.wars_max_id = None
+        self.attacks_max_id = None
+        self.polled_at = None
+        self.caught_up = False  # Whether the last poll reached the newest war and attack
+        self.polls = 0
+        self._wars = {}
+        self._defenders = {}
+        self._orphans = {}  # war ID -> [newest attack epoch, attacks seen before their war]
+        self._seven_day_expiry = []  # Heaps of (war start epoch, war ID)
+        self._one_day_expiry = []
+        self._orphan_expiry = []  # Heap of (orphan attack epoch, war ID)
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()  # Polls of this process apply each war and attack once
+        self._thread = None
+        self._wake = threading.Event()
+
+    # Ingest
+
+    def add_wars(self, wars, now: float = None):
+        """Index wars from get_wars; wars already out of the 7-day window are skipped."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for war in wars:
+                ts = parse_api_date(war.get('date'))
+                war_id = int(war['id'])
+                if ts is None or now - ts >= SEVEN_DAY_WINDOW or war_id in self._wars or not war.get('def_id'):
+                    continue
+                entry = _War(war_id, str(war['def_id']), ts, war['date'])
+                entry.in_one_day = now - ts < ONE_DAY_WINDOW
+                self._wars[war_id] = entry
+                self._defenders.setdefault(entry.def_id, _Defender()).wars.append(entry)
+                heapq.heappush(self._seven_day_expiry, (ts, war_id))
+                if entry.in_one_day:
+                    heapq.heappush(self._one_day_expiry, (ts, war_id))
+                orphan = self._orphans.pop(war_id, None)
+                for attack in orphan[1] if orphan is not None else ():
+                    self._apply_attack(entry, attack)
+
+    def add_attacks(self, attacks):
+        """Add attacks from get_war_attacks to the sums of their wars' defenders."""
+        with self._lock:
+            for attack in attacks:
+                # Parsed once here, whether the attack is applied now or kept as an orphan
+                attack['date_ts'] = ts = parse_api_date(attack.get('date')) or 0
+                war_id = int(attack['war_id'])
+                war = self._wars.get(war_id)
+                if war is None:
+                    # Its war is either older than the window or not polled yet
+                    orphan = self._orphans.setdefault(war_id, [ts, []])
+                    orphan[0] = max(orphan[0], ts)
+                    orphan[1].append(attack)
+                    heapq.heappush(self._orphan_expiry, (ts, war_id))
+                else:
+                    self._apply_attack(war, attack)
+
+    def _apply_attack(self, war, attack):
+        if str(attack.get('def_id')) != war.def_id:  # The defender's own attacks steal nothing from them
+            return
+        money = attack.get('money_stolen') or 0
+        if not money:
+            return
+        defender = self._defenders[war.def_id]
+        war.loot += money
+        defender.seven_days += money
+        if war.in_one_day:
+            defender.one_day += money
+        ts = attack.get('date_ts')
+        if ts and (defender.last_looted is None or ts > defender.last_looted):
+            defender.last_looted = ts
+
+    def _expiry_due(self, now: float):
+        return ((self._one_day_expiry and now - self._one_day_expiry[0][0] >= ONE_DAY_WINDOW) or
+                (self._seven_day_expiry and now - self._seven_day_expiry[0][0] >= SEVEN_DAY_WINDOW))
+
+    def expire(self, now: float):
+        """Drop wars that left the 7-day window and take those past 1 day out of the 1-day sums."""
+        with self._lock:
+            changed = set()
+            while self._one_day_expiry and now - self._one_day_expiry[0][0] >= ONE_DAY_WINDOW:
+                _, war_id = heapq.heappop(self._one_day_expiry)
+                war = self._wars.get(war_id)
+                if war is not None and war.in_one_day:
+                    war.in_one_day = False
+                    changed.add(war.def_id)
+            while self._seven_day_expiry and now - self._seven_day_expiry[0][0] >= SEVEN_DAY_WINDOW:
+                _, war_id = heapq.heappop(self._seven_day_expiry)
+                war = self._wars.pop(war_id, None)
+                if war is not None:
+                    self._defenders[war.def_id].wars.remove(war)
+                    changed.add(war.def_id)
+            # Re-add the few remaining wars rather than subtracting, so float sums don't drift
+            for def_id in changed:
+                defender = self._defenders[def_id]
+                if not defender.wars:
+                    del self._defenders[def_id]
+                    continue
+                defender.seven_days = sum(war.loot for war in defender.wars)
+                defender.one_day = sum(war.loot for war in defender.wars if war.in_one_day)
+            # Attacks are never older than their war, so once an orphan's newest
+            # attack is out of the window its war is too
+            while self._orphan_expiry and now - self._orphan_expiry[0][0] >= SEVEN_DAY_WINDOW:
+                _, war_id = heapq.heappop(self._orphan_expiry)
+                orphan = self._orphans.get(war_id)
+                if orphan is not None and now - orphan[0] >= SEVEN_DAY_WINDOW:
+                    del self._orphans[war_id]
+
+    # Polling
+
+    def _pull(self, api_key: str, fetch, cursor, save, filters, stats):
+        """
+        Fetch every item newer than `cursor` (or from the last 8 days without one), at most `backfill_max_pages` pages.
+
+        Returns:
+            Tuple of (new cursor, True if the last page was reached rather than the page cap)
+        """
+        if cursor is None:
+            filters = dict(filters, after=format_api_datetime(time.time() - SEVEN_DAY_WINDOW), orderBy=[('ID', 'ASC')])
+        else:
+            filters = dict(filters, min_id=cursor + 1, orderBy=[('ID', 'ASC')])
+        highest = cursor or 0
+        for page in range(1, self.backfill_max_pages + 1):
+            result = fetch(api_key, page, filters, stats=stats)
+            items = result["data"]
+            if not items:
+                return highest, True
+            save(items)
+            highest = max(highest, max(int(item['id']) for item in items))
+            if not result.get("paginatorInfo", {}).get("hasMorePages"):
+                return highest, True
+        # Ascending IDs, so the next poll carries on after the last item saved
+        return highest, False
+
+    def poll(self, api_key: str, stats=None, force: bool = False):
+        """
+        Apply every war and attack since the last poll, then expire old wars.
+
+        The first poll backfills the last 8 days. Wars are pulled before
+        attacks so new attacks find their war. A poll that stops on the page
+        cap leaves the index not warm; the next one continues from there.
+        With a feed, only a poll finding the feed older than `poll_interval`
+        (or a forced one) pulls from the API; every poll then reads the new
+        rows from the feed.
+
+        Args:
+            api_key: The Politics & War API key.
+            stats: Optional TransferStats to record response sizes in.
+            force: Pull into the feed even if another worker just did.
+        """
+        with self._poll_lock:
+            if self.feed is None:
+                started = time.time()
+                # Ended wars still count towards the sums
+                self.wars_max_id, wars_complete = self._pull(api_key, get_wars, self.wars_max_id, self.add_wars,
+                                                             {'active': False}, stats)
+                self.attacks_max_id, attacks_complete = self._pull(api_key, get_war_attacks, self.attacks_max_id,
+                                                                   self.add_attacks, {}, stats)
+                caught_up = wars_complete and attacks_complete
+                if not caught_up:
+                    print(f"Loot index poll stopped after {self.backfill_max_pages} pages; "
+                          f"not warm until it catches up")
+            else:
+                started, caught_up = self._poll_feed(api_key, stats, force)
+                self._read_feed()
+            self.expire(time.time())
+            with self._lock:
+                self.polled_at = started
+                self.caught_up = caught_up
+                self.polls += 1
+
+    def _poll_feed(self, api_key: str, stats, force: bool):
+        """
+        Pull new wars and attacks into the feed unless another worker polled it within `poll_interval`.
+
+        Returns:
+            Tuple of (epoch seconds of the feed's last poll, True if it caught up)
+        """
+        feed = self.feed
+        with feed.lock:
+            state = feed.state()
+            if not force and state['polled_at'] is not None and time.time() - state['polled_at'] < self.poll_interval:
+                return state['polled_at'], state['caught_up']
+            started = time.time()
+            wars_max_id, wars_complete = self._pull(api_key, get_wars, state['wars_max_id'], feed.save_wars,
+                                                    {'active': False}, stats)
+            attacks_max_id, attacks_complete = self._pull(api_key, get_war_attacks, state['attacks_max_id'],
+                                                          feed.save_attacks, {}, stats)
+            caught_up = wars_complete and attacks_complete
+            feed.prune(started)
+            feed.set_state(wars_max_id=wars_max_id, attacks_max_id=attacks_max_id, polled_at=started,
+                           caught_up=caught_up)
+        if not caught_up:
+            print(f"Loot feed poll stopped after {self.backfill_max_pages} pages; not warm until it catches up")
+        return started, caught_up
+
+    def _read_feed(self):
+        """Apply the feed's wars, then attacks, not applied yet; the cursors track the last row read."""
+        for table, cursor, add in (('wars', 'wars_max_id', self.add_wars),
+                                   ('attacks', 'attacks_max_id', self.add_attacks)):
+            while True:
+                rows = self.feed.read(table, getattr(self, cursor) or 0)
+                if not rows:
+                    break
+                add(rows)
+                setattr(self, cursor, rows[-1]['id'])
+
+    @property
+    def polling(self):
+        """True once the background polling thread has been started."""
+        return self._thread is not None
+
+    def _run(self, api_key: str):
+        while True:
+            try:
+                self.poll(api_key)
+            except Exception as e:
+                print(f"Loot index poll failed: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self, api_key: str):
+        """Start polling in a background thread, unless it is already running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(api_key,), name="loot-index", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Make the polling thread poll now rather than at the end of its interval."""
+        self._wake.set()
+
+    # Reads
+
+    def is_warm(self):
+        """True if the last poll reached the newest wars and attacks and is at most `max_lag` seconds old."""
+        polled_at = self.polled_at
+        return self.caught_up and polled_at is not None and time.time() - polled_at <= self.max_lag
+
+    def lookup(self, nation_id, now: float):
+        """
+        Return a nation's loot figures, shaped like scan._recent_loot.
+
+        Args:
+            nation_id: ID of the defending nation.
+            now: Epoch seconds of the scan; wars past the windows at that time are expired first.
+
+        Returns:
+            Tuple of (7-day stolen, 1-day stolen, (epoch, date string, money stolen)
+            of the most recent defensive war or None)
+        """
+        if self._expiry_due(now):
+            self.expire(now)
+        with self._lock:
+            defender = self._defenders.get(str(nation_id))
+            if defender is None:
+                return 0, 0, None
+            most_recent = None
+            for war in defender.wars:
+                # Ties go to the first war, as in scan._recent_loot
+                if most_recent is None or war.ts > most_recent.ts:
+                    most_recent = war
+            return defender.seven_days, defender.one_day, (most_recent.ts, most_recent.date, most_recent.loot)
+
+    def last_looted(self, nation_id):
+        """Epoch seconds of the last attack that stole money from a nation in the window, or None."""
+        with self._lock:
+            defender = self._defenders.get(str(nation_id))
+            return defender.last_looted if defender is not None else None
+
+    def stats(self):
+        """Return the index size, cursors and the age of the last poll."""
+        with self._lock:
+            return {
+                'wars': len(self._wars),
+                'defenders': len(self._defenders),
+                'orphan_wars': len(self._orphans),
+                'wars_max_id': self.wars_max_id,
+                'attacks_max_id': self.attacks_max_id,
+                'polls': self.polls,
+                'shared_feed': self.feed is not None,
+                'poll_age_seconds': time.time() - self.polled_at if self.polled_at else None,
+                'warm': self.is_warm(),
+            }
+
+# Shared by every scan in this process; only polls once started. Reads wars and
+# attacks from the feed shared by the host's workers unless LOOT_INDEX_PATH is empty
+loot_index = LootIndex(feed=LootFeed(LOOT_INDEX_PATH) if LOOT_INDEX_PATH else None)
@@ -0,0 +1,204 @@
+import bisect
+import math
+import threading
+import time
+from config import METRICS_ENABLED
+
+# Seconds; suits everything from a page's filtering (milliseconds) to an upstream query (seconds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _NullTimer:
+    """Timer handed out while metrics are disabled; does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    """Context manager observing the seconds its block took into a histogram."""
+
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name: str, help: str, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        return tuple(zip(self.labelnames, key)) + tuple(extra)
+
+class Counter(_Metric):
+    """Monotonic count, optionally per label set."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, optionally per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Return a context manager observing how long its block takes."""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", self._labels(key, [('le', _format_value(bound))]),
+                                    cumulative))
+                samples.append((f"{self.name}_bucket", self._labels(key, [('le', '+Inf')]), count))
+                samples.append((f"{self.name}_sum", self._labels(key), total))
+                samples.append((f"{self.name}_count", self._labels(key), count))
+        return samples
+
+class _Callback(_Metric):
+    """Gauge or counter read from a function when scraped, so keeping it up to date costs nothing."""
+
+    def __init__(self, registry, name: str, help: str, kind: str, fn, labelnames=()):
+        super().__init__(registry, name, help, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        value = self.fn()
+        if not isinstance(value, dict):
+            return [(self.name, (), value)]
+        return [(self.name, self._labels(key if isinstance(key, tuple) else (key,)), count)
+                for key, count in value.items()]
+
+class Registry:
+    """
+    Process-wide metrics, rendered in the Prometheus text exposition format.
+
+    Metrics are defined next to the code they measure. While the registry is
+    disabled, inc() and observe() return at once and time() hands out a
+    shared no-op timer, so instrumented hot paths cost one attribute check.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()):
+        return self._register(Counter(self, name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn, labelnames=()):
+        """
+        Register a gauge read from `fn` at scrape time.
+
+        Args:
+            name: Metric name.
+            help: Description shown in the exposition.
+            fn: Function returning the value, or a dictionary mapping label values to values.
+            labelnames: Label names, for a dictionary-returning `fn`.
+        """
+        return self._register(_Callback(self, name, help, 'gauge', fn, labelnames))
+
+    def counter_func(self, name: str, help: str, fn, labelnames=()):
+        """Register a counter read from `fn` at scrape time, e.g. counts another object keeps anyway."""
+        return self._register(_Callback(self, name, help, 'counter', fn, labelnames))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Metric {metric.name} failed: {str(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# Shared by every module in this process
+registry = Registry(enabled=METRICS_ENABLED)
+
+# Shared by the web app's templates and the CLIs' printed results
+RENDER_SECONDS = registry.histogram("render_seconds", "Seconds rendering results, per template or CLI view", ["view"])
@@ -0,0 +1,106 @@
+try:
+    import numpy as np
+except ImportError:  # Optional: without NumPy, snapshots filter nation by nation
+    np = None
+
+# Integer sweep fields packed into columns, missing values count as 0
+INT_COLUMNS = ('num_cities', 'vacation_mode_turns', 'beige_turns', 'ships', 'missiles', 'nukes', 'spies',
+               'defensive_wars_count')
+
+def numpy_available():
+    """Return True if NumPy is installed, so nation tables can be built."""
+    return np is not None
+
+class NationTable:
+    """
+    Column arrays of the sweep's scalar fields for a fixed list of nations.
+
+    Row i of every column describes `nations[i]`. Filters are evaluated as
+    vectorized boolean masks over the columns, and only the rows that
+    survive are turned back into nation dicts, so filtering thousands of
+    nations costs a handful of array operations instead of a Python loop.
+
+    Requires NumPy; check numpy_available() first.
+    """
+
+    def __init__(self, nations):
+        """
+        Args:
+            nations: List of nation dicts with the sweep fields. Kept by reference, not copied.
+        """
+        if np is None:
+            raise ValueError("NationTable requires NumPy. Install it with 'pip install numpy'.")
+        self.nations = nations
+        count = len(nations)
+        self.score = np.fromiter((nation.get('score') or 0 for nation in nations), dtype=np.float64, count=count)
+        for column in INT_COLUMNS:
+            setattr(self, column, np.fromiter((nation.get(column) or 0 for nation in nations),
+                                              dtype=np.int64, count=count))
+        # Alliance IDs arrive as strings; no alliance is 0
+        self.alliance_id = np.fromiter((int(nation.get('alliance_id') or 0) for nation in nations),
+                                       dtype=np.int64, count=count)
+        # Colors as small integer codes into the list of distinct names
+        names, codes = np.unique([nation.get('color') or '' for nation in nations], return_inverse=True)
+        self._color_names = [str(name) for name in names]
+        self.color = codes.reshape(-1)
+
+    def __len__(self):
+        return len(self.nations)
+
+    def take(self, rows):
+        """
+        Return a NationTable of just the given rows, without re-reading the nation dicts.
+
+        Args:
+            rows: NumPy array of row indices; row i of the result is row `rows[i]` here.
+        """
+        table = NationTable.__new__(NationTable)
+        table.nations = [self.nations[row] for row in rows.tolist()]
+        table.score = self.score[rows]
+        for column in INT_COLUMNS:
+            setattr(table, column, getattr(self, column)[rows])
+        table.alliance_id = self.alliance_id[rows]
+        table._color_names = self._color_names
+        table.color = self.color[rows]
+        return table
+
+    def _color_mask(self, matches):
+        codes = [code for code, name in enumerate(self._color_names) if matches(name)]
+        return np.isin(self.color, codes)
+
+    def color_in(self, colors):
+        """Mask of rows whose color is one of `colors` (exact match, as the API filters)."""
+        colors = set(colors)
+        return self._color_mask(lambda name: name in colors)
+
+    def color_is(self, color: str):
+        """Mask of rows whose color equals `color`, ignoring case."""
+        color = color.lower()
+        return self._color_mask(lambda name: name.lower() == color)
+
+    def alliance_in(self, alliance_ids):
+        """Mask of rows whose alliance ID is one of `alliance_ids` (strings or ints)."""
+        return np.isin(self.alliance_id, [int(alliance_id) for alliance_id in alliance_ids])
+
+    def match_filters(self, filters):
+        """
+        Mask of rows matching the server-side filters from build_nation_filters.
+
+        Args:
+            filters: Filter spec with optional min_score, max_score, vmode, max_cities and color.
+
+        Returns:
+            Boolean array with one entry per row
+        """
+        mask = np.ones(len(self.nations), dtype=bool)
+        if filters.get('min_score') is not None:
+            mask &= self.score >= filters['min_score']
+        if filters.get('max_score') is not None:
+            mask &= self.score <= filters['max_score']
+        if filters.get('vmode') is not None:
+            mask &= (self.vacation_mode_turns > 0) == filters['vmode']
+        if filters.get('max_cities') is not None:
+            mask &= self.num_cities <= filters['max_cities']
+        if filters.get('color'):
+            mask &= self.color_in(filters['color'])
+        return mask
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+from pnw_api import get_nations, get_nation_details, NATION_SWEEP_FIELDS
+from config import PAGE_FETCH_CONCURRENCY
+
+def iter_nation_pages(api_key: str, max_pages: int, filters=None, fields=NATION_SWEEP_FIELDS, stats=None,
+                      concurrency: int = PAGE_FETCH_CONCURRENCY, prefilter=None):
+    """
+    Fetch pages of nations in parallel and yield them in page order.
+
+    Up to `concurrency` pages are kept in flight at once. Requests are paced
+    by the shared token bucket in pnw_api, so raising the concurrency does not
+    raise the request rate above the configured limit. Fetching stops after
+    the last page reported by the API, an empty page, or `max_pages`.
+
+    Closing the generator early (e.g. breaking out of the loop once enough
+    targets are found) cancels any pages that have not started yet and
+    waits for those in flight, so no fetch outlives the generator.
+
+    Args:
+        api_key: The Politics & War API key.
+        max_pages: Maximum number of pages to fetch.
+        filters: Optional server-side filter spec passed to get_nations.
+        fields: GraphQL selection per nation. Defaults to the lightweight sweep
+            fields; details are fetched separately with get_nation_details.
+        stats: Optional TransferStats to record response sizes in.
+        concurrency: Maximum number of pages fetched at the same time.
+        prefilter: Optional function applied to each nation as its page is
+            decoded; only nations it returns True for are yielded.
+
+    Yields:
+        Tuples of (page number, nations data as returned by get_nations)
+
+    Raises:
+        ValueError: If fetching a page fails. Pages before it have already been yielded.
+    """
+    concurrency = max(1, concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="page-fetch")
+    pending = {}
+    next_page = 1
+
+    try:
+        for page in range(1, max_pages + 1):
+            # Top up the in-flight window
+            while next_page <= max_pages and len(pending) < concurrency:
+                pending[next_page] = executor.submit(get_nations, api_key, next_page, filters, fields, stats, prefilter)
+                next_page += 1
+
+            nations_data = pending.pop(page).result()
+            yield page, nations_data
+
+            paginator = nations_data.get("paginatorInfo", {})
+            if not nations_data.get("scanned", len(nations_data["data"])) or not paginator.get("hasMorePages"):
+                break
+    finally:
+        # Pages not started are dropped; requests already sent are waited for, so
+        # none keep spending rate limit tokens or printing after the scan returns
+        for future in pending.values():
+            future.cancel()
+        executor.shutdown(wait=True)
+
+class LiveNationSource:
+    """
+    Nation source that crawls the API on every scan.
+
+    Has the same iter_pages/get_details interface as the snapshot and store
+    sources, so scans can switch between them.
+    """
+
+    def iter_pages(self, api_key: str, max_pages: int, filters=None, stats=None, prefilter=None):
+        # A FilterPipeline's plain function skips a call level per nation
+        prefilter = getattr(prefilter, 'accepts', prefilter)
+        return iter_nation_pages(api_key, max_pages, filters, stats=stats, prefilter=prefilter)
+
+    def get_details(self, api_key: str, nation_ids, stats=None, wars: bool = True):
+        return get_nation_details(api_key, nation_ids, stats=stats, wars=wars)
+
+live_source = LiveNationSource()
@@ -1,62 +1,356 @@
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 import time
 import os
+import codecs
+import copy
+from datetime import datetime, timezone
+from cache import TTLCache
+from json_stream import JSONArrayStream
+from retry_policy import retry_policy
+from metrics import registry
+from config import (HTTP_POOL_SIZE, API_REQUESTS_PER_SECOND, API_BURST, MIN_SCORE_RATIO, MAX_SCORE_RATIO,
+                    NATION_CACHE_SIZE, NATION_CACHE_TTL, STREAM_CHUNK_SIZE, PROTECTED_TREATY_TYPES)
 
-# Removed: API_URL = f"https://api.politicsandwar.com/graphql?api_key={API_KEY}" - URL will be built in run_query
-RATE_LIMIT_DELAY = 0.1  # 1 second delay between requests
+# The API key is passed as a query parameter by run_query
+API_URL = "https://api.politicsandwar.com/graphql"
 
-def run_query(api_key: str, query: str):
+# Shared HTTP session, created lazily by get_session()
+_session = None
+_session_lock = threading.Lock()
+
+def _build_session(pool_size: int):
     """
-    Run a GraphQL query against the Politics & War API.
+    Build a requests session with a keep-alive connection pool.
+
+    Args:
+        pool_size: Maximum number of pooled connections kept open per host.
+
+    Returns:
+        A configured requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
+
+def get_session():
+    """
+    Get the shared HTTP session used for every API query.
+
+    The session is created on first use and reuses TCP/TLS connections
+    between queries. It is safe to share between threads.
+
+    Returns:
+        The shared requests.Session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(HTTP_POOL_SIZE)
+    return _session
+
+def configure_http_client(pool_size: int = HTTP_POOL_SIZE):
+    """
+    Replace the shared HTTP session with one using a new pool size.
+
+    Connections held by the previous session are closed.
+
+    Args:
+        pool_size: Maximum number of pooled connections kept open per host.
+    """
+    global _session
+    with _session_lock:
+        old_session = _session
+        _session = _build_session(pool_size)
+    if old_session is not None:
+        old_session.close()
+
+# Every nation field used by the scans (single-pass fetch)
+NATION_FULL_FIELDS = """
+          id
+          nation_name
+          score
+          num_cities
+          alliance_id
+          vacation_mode_turns
+          beige_turns
+          color
+          soldiers
+          tanks
+          aircraft
+          ships
+          missiles
+          nukes
+          spies
+          gross_national_income
+          cities {
+            supermarket
+            bank
+            shopping_mall
+            stadium
+            subway
+          }
+          alliance {
+            id
+            name
+          }
+          wars {
+            turns_left
+            date
+            def_id
+            attacks {
+              def_id
+              money_stolen
+              date
+            }
+          }
+          defensive_wars_count
+"""
+
+# Scalar fields the scans filter on, fetched for every candidate in phase 1
+NATION_SWEEP_FIELDS = """
+          id
+          nation_name
+          score
+          num_cities
+          alliance_id
+          vacation_mode_turns
+          beige_turns
+          color
+          soldiers
+          tanks
+          aircraft
+          ships
+          missiles
+          nukes
+          spies
+          gross_national_income
+          defensive_wars_count
+"""
+
+# Nested fields fetched in phase 2 only for nations that passed the sweep filters
+NATION_PROFILE_FIELDS = """
+          id
+          cities {
+            supermarket
+            bank
+            shopping_mall
+            stadium
+            subway
+          }
+          alliance {
+            id
+            name
+          }
+"""
+
+# Defensive and offensive wars with their attacks, the heaviest part of a detail query
+NATION_WAR_FIELDS = """
+          wars {
+            id
+            turns_left
+            date
+            att_id
+            def_id
+            attacks {
+              id
+              def_id
+              money_stolen
+              date
+            }
+          }
+"""
+
+# Nested nation fields fetched in phase 2 for the nations that pass the sweep
+NATION_DETAIL_FIELDS = NATION_PROFILE_FIELDS + NATION_WAR_FIELDS
+
+class TransferStats:
+    """
+    Thread-safe tally of API requests and response sizes per scan phase.
+
+    `wire_bytes` is the size as sent over the network (compressed when the
+    API gzips the response); `bytes` is the decoded JSON body size.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, wire_bytes: int, decoded_bytes: int):
+        with self._lock:
+            totals = self.phases.setdefault(phase, {'requests': 0, 'wire_bytes': 0, 'bytes': 0})
+            totals['requests'] += 1
+            totals['wire_bytes'] += wire_bytes
+            totals['bytes'] += decoded_bytes
+
+    def summary(self):
+        """Return a one-line, human-readable summary of bytes transferred per phase."""
+        with self._lock:
+            parts = [
+                f"{phase}: {totals['requests']} requests, {_format_bytes(totals['bytes'])}"
+                f" ({_format_bytes(totals['wire_bytes'])} on the wire)"
+                for phase, totals in self.phases.items()
+            ]
+        return "; ".join(parts) if parts else "no requests"
+
+def _format_bytes(size: int):
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MB"
+    if size >= 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size} B"
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to pace requests to the API.
+
+    Tokens refill continuously at `rate` per second up to `capacity`, so
+    short bursts go out immediately while the long-run request rate stays
+    at `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1):
+        """
+        Take tokens from the bucket, blocking until enough are available.
+
+        Args:
+            tokens: Number of tokens to take.
+        """
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+# Shared by every thread issuing API queries in this process
+rate_limiter = TokenBucket(API_REQUESTS_PER_SECOND, API_BURST)
+
+# Recent get_nation_by_id results, keyed by nation ID
+nation_cache = TTLCache(NATION_CACHE_SIZE, NATION_CACHE_TTL)
+
+# Metrics, labelled by query type (the `phase` of run_query and stream_query)
+QUERY_SECONDS = registry.histogram("pnw_api_query_seconds",
+                                   "Seconds per API request attempt until the response headers arrive", ["query"])
+DECODE_SECONDS = registry.histogram("pnw_api_decode_seconds", "Seconds reading and decoding API response bodies",
+                                    ["query"])
+PAGES_FETCHED = registry.counter("pnw_api_pages_fetched_total", "Nation pages fetched from the API", ["query"])
+registry.counter_func("pnw_api_request_outcomes_total",
+                      "API request attempts by outcome (throttled: 429 responses, retried: retries sent)",
+                      lambda: retry_policy.stats()['outcomes'], ["outcome"])
+registry.gauge("pnw_api_nation_cache_entries", "Nations in the get_nation_by_id cache", lambda: len(nation_cache))
+
+def _send_query(api_key: str, query: str, stream: bool = False, phase: str = "query"):
+    """
+    Send a GraphQL query and check the HTTP status of the response.
 
     Args:
         api_key: The Politics & War API key.
         query: GraphQL query string
+        stream: If True, the response body is left unread for the caller to stream
+        phase: Query type the request's latency is recorded under
 
     Returns:
-        JSON response data
+        The requests.Response, with status 200
 
     Raises:
-        ValueError: If there is an API error, authentication error, or invalid response
+        ValueError: If the API key is missing, or the API answers with an error status
+        requests.exceptions.RequestException: If the request fails on the network
     """
     # Check if API key is provided
     if not api_key:
         raise ValueError("API_KEY is not provided. Please enter your Politics & War API key.")
 
-    API_URL = f"https://api.politicsandwar.com/graphql?api_key={api_key}"
+    session = get_session()
+    params = {"api_key": api_key}
 
-    try:
-        time.sleep(RATE_LIMIT_DELAY)  # Add delay between requests
-        response = requests.post(API_URL, json={"query": query})
-
-        # Handle specific HTTP error codes
-        if response.status_code == 401:
-            raise ValueError("API authentication failed. Check your API key.")
-        elif response.status_code == 403:
-            raise ValueError("API access forbidden. Your key may be invalid or lacks permissions.")
-        elif response.status_code == 429:  # Too Many Requests
-            print("Rate limit hit, waiting to retry...")
-            time.sleep(5)  # Wait longer if we hit the rate limit
-            response = requests.post(API_URL, json={"query": query})
-            if response.status_code != 200:
-                raise ValueError(f"Rate limit retry failed with status code {response.status_code}")
-        elif response.status_code != 200:
-            raise ValueError(f"API request failed with status code {response.status_code}")
+    def send():
+        rate_limiter.acquire()  # Pace requests shared across all threads
+        with QUERY_SECONDS.time(query=phase):
+            return session.post(API_URL, params=params, json={"query": query}, stream=stream)
 
-        # Parse response as JSON
-        data = response.json()
+    # Backoff, Retry-After and the shared circuit breaker live in retry_policy
+    response = retry_policy.send(send)
+
+    # Handle specific HTTP error codes
+    if response.status_code != 200:
+        response.close()
+    if response.status_code == 401:
+        raise ValueError("API authentication failed. Check your API key.")
+    elif response.status_code == 403:
+        raise ValueError("API access forbidden. Your key may be invalid or lacks permissions.")
+    elif response.status_code == 429:  # Too Many Requests, even after retrying
+        raise ValueError("API rate limit exceeded. Please try again later.")
+    elif response.status_code != 200:
+        raise ValueError(f"API request failed with status code {response.status_code}")
+    return response
+
+def _check_graphql_response(data):
+    """
+    Raise if a decoded GraphQL response carries errors or no data.
+
+    Raises:
+        ValueError: If the response has GraphQL errors or is missing its 'data' field
+    """
+    # Check for GraphQL errors
+    if "errors" in data:
+        error_messages = [error.get("message", "Unknown GraphQL error") for error in data.get("errors", [])]
+        error_message = "; ".join(error_messages)
+        print(f"GraphQL API Error: {error_message}")
+        raise ValueError(f"GraphQL API Error: {error_message}")
+
+    # Validate response structure
+    if "data" not in data:
+        raise ValueError("API response missing 'data' field")
+
+def run_query(api_key: str, query: str, stats=None, phase: str = "query"):
+    """
+    Run a GraphQL query against the Politics & War API.
 
-        # Check for GraphQL errors
-        if "errors" in data:
-            error_messages = [error.get("message", "Unknown GraphQL error") for error in data.get("errors", [])]
-            error_message = "; ".join(error_messages)
-            print(f"GraphQL API Error: {error_message}")
-            raise ValueError(f"GraphQL API Error: {error_message}")
+    Args:
+        api_key: The Politics & War API key.
+        query: GraphQL query string
+        stats: Optional TransferStats to record the response size in
+        phase: Label the response size is recorded under in `stats`
+
+    Returns:
+        JSON response data
+
+    Raises:
+        ValueError: If there is an API error, authentication error, or invalid response
+    """
+    try:
+        response = _send_query(api_key, query, phase=phase)
 
-        # Validate response structure
-        if "data" not in data:
-            raise ValueError("API response missing 'data' field")
+        if stats is not None:
+            decoded_bytes = len(response.content)
+            stats.record(phase, int(response.headers.get("Content-Length", decoded_bytes)), decoded_bytes)
 
+        # Parse response as JSON
+        with DECODE_SECONDS.time(query=phase):
+            data = response.json()
+        _check_graphql_response(data)
         return data
 
     except requests.exceptions.RequestException as e:
@@ -71,6 +365,60 @@ def run_query(api_key: str, query: str):
         print(f"Unexpected error in API query: {str(e)}")
         raise ValueError(f"API query failed: {str(e)}")
 
+def stream_query(api_key: str, query: str, path, on_item, stats=None, phase: str = "query"):
+    """
+    Run a GraphQL query, decoding one array of the response incrementally.
+
+    The response body is read in chunks and each item of the array at `path`
+    is handed to `on_item` as soon as it has arrived, so a large page never
+    exists as one fully decoded document. Items the callback doesn't keep are
+    freed straight away.
+
+    Args:
+        api_key: The Politics & War API key.
+        query: GraphQL query string
+        path: Keys leading to the streamed array, e.g. ('data', 'nations', 'data')
+        on_item: Function called with each decoded item of the array, in order
+        stats: Optional TransferStats to record the response size in
+        phase: Label the response size is recorded under in `stats`
+
+    Returns:
+        The rest of the JSON response, with the streamed array left empty
+
+    Raises:
+        ValueError: If there is an API error, authentication error, or invalid response
+    """
+    decoded_bytes = 0
+    try:
+        response = _send_query(api_key, query, stream=True, phase=phase)
+
+        def chunks():
+            nonlocal decoded_bytes
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                decoded_bytes += len(chunk)
+                yield decoder.decode(chunk)
+            yield decoder.decode(b"", final=True)
+
+        try:
+            with DECODE_SECONDS.time(query=phase):
+                items = JSONArrayStream(chunks(), path)
+                for item in items:
+                    on_item(item)
+                data = items.skeleton()
+        finally:
+            response.close()
+
+    except requests.exceptions.RequestException as e:
+        # Handle network errors, including ones while reading the body
+        print(f"Network error communicating with the API: {str(e)}")
+        raise ValueError(f"Network error: {str(e)}")
+
+    if stats is not None:
+        stats.record(phase, int(response.headers.get("Content-Length", decoded_bytes)), decoded_bytes)
+    _check_graphql_response(data)
+    return data
+
 def get_my_nation(api_key: str):
     """
     Get information about the currently authenticated nation.
@@ -113,7 +461,7 @@ def get_my_nation(api_key: str):
     }
     """
     # Run the query with already enhanced error handling
-    data = run_query(api_key, query)
+    data = run_query(api_key, query, phase="me")
 
     # Additional error handling for specific me/nation response errors
     if "data" not in data:
@@ -125,13 +473,17 @@ def get_my_nation(api_key: str):
 
     return data["data"]["me"]["nation"]
 
-def get_nation_by_id(api_key: str, nation_id: int):
+def get_nation_by_id(api_key: str, nation_id: int, use_cache: bool = True):
     """
     Get information about a specific nation by its ID.
 
+    Lookups are cached for NATION_CACHE_TTL seconds, and concurrent lookups of
+    the same ID share a single in-flight request.
+
     Args:
         api_key: The Politics & War API key.
         nation_id: The ID of the nation to retrieve.
+        use_cache: Set to False to always query the API (the result still refreshes the cache).
 
     Returns:
         Nation data dictionary for the specified nation.
@@ -139,9 +491,63 @@ def get_nation_by_id(api_key: str, nation_id: int):
     Raises:
         ValueError: If the nation is not found or the API returns an error.
     """
+    nation_id = int(nation_id)
+    if not use_cache:
+        nation = _fetch_nation_by_id(api_key, nation_id)
+        nation_cache.set(nation_id, nation)
+    else:
+        nation = nation_cache.get_or_load(nation_id, lambda: _fetch_nation_by_id(api_key, nation_id))
+    # Deep copy: callers may change the nested alliance, treaties and wars without touching the cached entry
+    return copy.deepcopy(nation)
+
+def get_nations_by_id(api_key: str, nation_ids, use_cache: bool = True):
+    """
+    Get several nations by ID, with the fields get_nation_by_id returns, in one query per 500 nations.
+
+    Cached nations are served from the same cache as get_nation_by_id, and
+    the ones fetched are added to it.
+
+    Args:
+        api_key: The Politics & War API key.
+        nation_ids: Iterable of nation IDs to retrieve.
+        use_cache: Set to False to always query the API (the results still refresh the cache).
+
+    Returns:
+        Dictionary mapping nation ID (as an int) to nation data, in the order
+        given. IDs the API does not return are left out.
+
+    Raises:
+        ValueError: If the API returns an error or unexpected response structure
+    """
+    nation_ids = list(dict.fromkeys(int(nation_id) for nation_id in nation_ids))
+    nations = {}
+    if use_cache:
+        for nation_id in nation_ids:
+            nation = nation_cache.get(nation_id)
+            if nation is not None:
+                nations[nation_id] = nation
+    missing = [nation_id for nation_id in nation_ids if nation_id not in nations]
+
+    # The API returns at most 500 nations per query
+    for start in range(0, len(missing), 500):
+        for nation in _fetch_nations_by_id(api_key, missing[start:start + 500]):
+            nation_cache.set(int(nation['id']), nation)
+            nations[int(nation['id'])] = nation
+    # Deep copies, as get_nation_by_id returns, so callers can't alter the cached entries
+    return {nation_id: copy.deepcopy(nations[nation_id]) for nation_id in nation_ids if nation_id in nations}
+
+def _fetch_nation_by_id(api_key: str, nation_id: int):
+    """Query the API for one nation with every field the scans use (see get_nation_by_id)."""
+    nations = _fetch_nations_by_id(api_key, [nation_id])
+    if not nations:
+        raise ValueError(f"Nation with ID {nation_id} not found.")
+    return nations[0]
+
+def _fetch_nations_by_id(api_key: str, nation_ids):
+    """Query the API for up to 500 nations with every field the scans use, returning the ones found."""
     query = f"""
     query {{
-      nations(id: {nation_id}, first: 1) {{
+      nations(id: [{", ".join(str(nation_id) for nation_id in nation_ids)}], first: {len(nation_ids)}) {{
         data {{
           id
           nation_name
@@ -192,7 +598,7 @@ def get_nation_by_id(api_key: str, nation_id: int):
     }}
     """
     # Run the query - error handling for network and basic API errors happens in run_query
-    data = run_query(api_key, query)
+    data = run_query(api_key, query, phase="nation")
 
     # Validate response structure specific to this query
     if "data" not in data or not data["data"]:
@@ -204,82 +610,320 @@ def get_nation_by_id(api_key: str, nation_id: int):
     if "data" not in data["data"]["nations"] or not isinstance(data["data"]["nations"]["data"], list):
         raise ValueError("API response missing 'nations.data' field or it's not a list.")
 
-    if not data["data"]["nations"]["data"]:
-        raise ValueError(f"Nation with ID {nation_id} not found.")
-
-    return data["data"]["nations"]["data"][0]
+    return data["data"]["nations"]["data"]
 
-def get_nations(api_key: str, page=1):
+def get_alliance_names(api_key: str, alliance_ids):
     """
-    Get a list of nations from the Politics & War API.
+    Get the names of several alliances in a single query.
 
     Args:
         api_key: The Politics & War API key.
-        page: Page number for pagination
+        alliance_ids: Iterable of alliance IDs to look up.
 
     Returns:
-        Dictionary containing nation data and pagination info
+        Dictionary mapping alliance ID (as a string) to alliance name.
+        IDs the API does not return are left out.
 
     Raises:
         ValueError: If the API returns an error or unexpected response structure
     """
+    alliance_ids = sorted({int(alliance_id) for alliance_id in alliance_ids})
+    if not alliance_ids:
+        return {}
+
     query = """
     {{
-      nations(page: {page}, first: 500) {{
+      alliances(id: [{ids}], first: {first}) {{
         data {{
           id
-          nation_name
-          score
-          num_cities
-          alliance_id
-          vacation_mode_turns
-          beige_turns
-          color
-          soldiers
-          tanks
-          aircraft
-          ships
-          missiles
-          nukes
-          spies
-          gross_national_income
-          cities {{
-            supermarket
-            bank
-            shopping_mall
-            stadium
-            subway
-          }}
-          alliance {{
-            id
-            name
-            treaties {{
-              alliance1_id
-              alliance2_id
-              treaty_type
-            }}
-          }}
-          wars {{
-            turns_left
-            date
-            def_id
-            attacks {{
-              def_id
-              money_stolen
-              date
-            }}
+          name
+        }}
+      }}
+    }}
+    """.format(ids=", ".join(str(alliance_id) for alliance_id in alliance_ids),
+               first=min(len(alliance_ids), 500))
+    data = run_query(api_key, query, phase="alliances")
+
+    if "alliances" not in data["data"] or "data" not in (data["data"]["alliances"] or {}):
+        raise ValueError("API response missing 'alliances' field")
+
+    return {str(alliance['id']): alliance['name'] for alliance in data["data"]["alliances"]["data"]}
+
+def build_nation_filters(my_nation, colors=None, order_by=None):
+    """
+    Build the server-side filter spec for candidate nations in war range of `my_nation`.
+
+    The spec is passed to get_nations so the API only returns nations within
+    the war score range (MIN_SCORE_RATIO/MAX_SCORE_RATIO), not in vacation
+    mode and with no more cities than `my_nation`.
+
+    Args:
+        my_nation: Nation data dictionary of the attacking nation.
+        colors: Optional list of color blocs to restrict candidates to (e.g. ['beige']).
+        order_by: Optional list of (column, order) tuples, e.g. [('SCORE', 'DESC')].
+
+    Returns:
+        Dictionary of `nations(...)` query arguments
+    """
+    filters = {
+        'min_score': round(my_nation['score'] * MIN_SCORE_RATIO, 2),
+        'max_score': round(my_nation['score'] * MAX_SCORE_RATIO, 2),
+        'vmode': False,
+    }
+    if my_nation.get('num_cities'):
+        filters['max_cities'] = my_nation['num_cities']
+    if colors:
+        filters['color'] = list(colors)
+    if order_by:
+        filters['orderBy'] = list(order_by)
+    return filters
+
+def _format_graphql_value(value):
+    """Format a Python value as a GraphQL argument literal."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return "[" + ", ".join(_format_graphql_value(item) for item in value) + "]"
+    if isinstance(value, str):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return str(value)
+
+def _format_query_args(filters):
+    """
+    Format a filter spec (e.g. from build_nation_filters) as query arguments.
+
+    Args:
+        filters: Dictionary of query arguments, or None.
+
+    Returns:
+        String of comma-separated arguments, starting with a comma if not empty
+    """
+    if not filters:
+        return ""
+    args = []
+    for name, value in filters.items():
+        if name == 'orderBy':
+            clauses = ", ".join(f"{{column: {column}, order: {order}}}" for column, order in value)
+            args.append(f"orderBy: [{clauses}]")
+        else:
+            args.append(f"{name}: {_format_graphql_value(value)}")
+    return ", " + ", ".join(args)
+
+def format_api_datetime(epoch: float):
+    """Format epoch seconds as a DateTime argument for the API."""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def parse_api_date(date_str):
+    """
+    Convert an API timestamp (e.g. 2024-05-01T12:00:00+00:00) to epoch seconds.
+
+    Returns:
+        Epoch seconds as an int, or None if `date_str` is empty
+    """
+    if not date_str:
+        return None
+    return int(datetime.fromisoformat(date_str).timestamp())
+
+def stamp_war_dates(nation):
+    """
+    Add a 'date_ts' epoch to each of a nation's wars and their attacks.
+
+    Dates are parsed once when details are ingested, so scans compare
+    integers instead of parsing the same date strings again.
+
+    Args:
+        nation: Nation data with an optional 'wars' list; updated in place.
+
+    Returns:
+        The same nation
+    """
+    for war in nation.get('wars') or []:
+        war['date_ts'] = parse_api_date(war.get('date'))
+        for attack in war.get('attacks') or []:
+            attack['date_ts'] = parse_api_date(attack.get('date'))
+    return nation
+
+def get_nation_details(api_key: str, nation_ids, stats=None, wars: bool = True):
+    """
+    Get the nested details (cities, wars, attacks, alliance) for specific nations.
+
+    This is the second phase of a scan: it is only called for nations that
+    passed the filters on the lightweight sweep fetched with NATION_SWEEP_FIELDS.
+
+    Args:
+        api_key: The Politics & War API key.
+        nation_ids: List of nation IDs to fetch.
+        stats: Optional TransferStats to record the response sizes in
+        wars: Whether to include wars and attacks; leave them out when the
+            loot figures come from the loot index instead.
+
+    Returns:
+        Dictionary mapping nation ID to a dictionary of NATION_DETAIL_FIELDS
+        (NATION_PROFILE_FIELDS without wars), with war and attack dates also
+        parsed to 'date_ts' epochs.
+        Nations the API no longer returns are left out.
+
+    Raises:
+        ValueError: If the API returns an error or unexpected response structure
+    """
+    details = {}
+    nation_ids = list(nation_ids)
+
+    # The API returns at most 500 nations per query
+    for start in range(0, len(nation_ids), 500):
+        batch = nation_ids[start:start + 500]
+        query = """
+        {{
+          nations(id: [{ids}], first: {first}) {{
+            data {{{fields}}}
           }}
-          defensive_wars_count
         }}
+        """.format(ids=", ".join(str(nation_id) for nation_id in batch), first=len(batch),
+                   fields=NATION_DETAIL_FIELDS if wars else NATION_PROFILE_FIELDS)
+        data = run_query(api_key, query, stats=stats, phase="detail")
+
+        if "nations" not in data["data"] or "data" not in (data["data"]["nations"] or {}):
+            raise ValueError("API response missing 'nations' field - API format may have changed")
+
+        for nation in data["data"]["nations"]["data"]:
+            details[nation['id']] = stamp_war_dates(nation)
+
+    return details
+
+def _get_paginated(api_key: str, collection: str, fields: str, page: int, first: int, filters=None, stats=None):
+    """
+    Run a paginated top-level query (e.g. wars, warattacks) and return its paginator.
+
+    Args:
+        api_key: The Politics & War API key.
+        collection: Name of the top-level query field.
+        fields: GraphQL selection for each item.
+        page: Page number for pagination
+        first: Items per page
+        filters: Optional dictionary of extra query arguments
+        stats: Optional TransferStats to record the response size in
+
+    Returns:
+        Dictionary containing the items under 'data' and pagination info
+
+    Raises:
+        ValueError: If the API returns an error or unexpected response structure
+    """
+    query = """
+    {{
+      {collection}(page: {page}, first: {first}{args}) {{
+        data {{{fields}}}
+        paginatorInfo {{
+          hasMorePages
+          currentPage
+        }}
+      }}
+    }}
+    """.format(collection=collection, page=page, first=first, args=_format_query_args(filters), fields=fields)
+    data = run_query(api_key, query, stats=stats, phase=collection)
+
+    if collection not in data["data"] or "data" not in (data["data"][collection] or {}):
+        raise ValueError(f"API response missing '{collection}' field - API format may have changed")
+
+    return data["data"][collection]
+
+def get_wars(api_key: str, page=1, filters=None, stats=None):
+    """
+    Get a page of wars (1000 per page), e.g. every war newer than a known ID.
+
+    Args:
+        api_key: The Politics & War API key.
+        page: Page number for pagination
+        filters: Optional dictionary of `wars(...)` arguments such as
+            {'min_id': 123, 'active': False}
+        stats: Optional TransferStats to record the response size in
+
+    Returns:
+        Dictionary containing war data and pagination info
+    """
+    fields = """
+          id
+          date
+          turns_left
+          att_id
+          def_id
+"""
+    return _get_paginated(api_key, "wars", fields, page, 1000, filters, stats)
+
+def get_war_attacks(api_key: str, page=1, filters=None, stats=None):
+    """
+    Get a page of war attacks (1000 per page), e.g. every attack newer than a known ID.
+
+    Args:
+        api_key: The Politics & War API key.
+        page: Page number for pagination
+        filters: Optional dictionary of `warattacks(...)` arguments such as
+            {'min_id': 123} or {'after': '2024-01-01 00:00:00'}
+        stats: Optional TransferStats to record the response size in
+
+    Returns:
+        Dictionary containing attack data and pagination info
+    """
+    fields = """
+          id
+          date
+          war_id
+          att_id
+          def_id
+          money_stolen
+"""
+    return _get_paginated(api_key, "warattacks", fields, page, 1000, filters, stats)
+
+def get_nations(api_key: str, page=1, filters=None, fields=None, stats=None, prefilter=None):
+    """
+    Get a list of nations from the Politics & War API.
+
+    The page is decoded one nation at a time as the response streams in, so
+    nations rejected by `prefilter` are dropped before the next one is decoded
+    instead of the whole page being held as Python objects.
+
+    Args:
+        api_key: The Politics & War API key.
+        page: Page number for pagination
+        filters: Optional dictionary of extra `nations(...)` arguments, usually
+            built with build_nation_filters
+        fields: Optional GraphQL selection for each nation. Defaults to
+            NATION_FULL_FIELDS; pass NATION_SWEEP_FIELDS for a lightweight sweep.
+        stats: Optional TransferStats to record the response size in
+        prefilter: Optional function called with each decoded nation; only
+            nations it returns True for are kept
+
+    Returns:
+        Dictionary containing nation data and pagination info. 'scanned' holds
+        the number of nations on the page before `prefilter` was applied.
+
+    Raises:
+        ValueError: If the API returns an error or unexpected response structure
+    """
+    query = """
+    {{
+      nations(page: {page}, first: 500{args}) {{
+        data {{{fields}}}
         paginatorInfo {{
           hasMorePages
           currentPage
         }}
       }}
     }}
-    """.format(page=page)
-    # Run the query - error handling happens in run_query function
-    data = run_query(api_key, query)
+    """.format(page=page, args=_format_query_args(filters), fields=fields or NATION_FULL_FIELDS)
+    # Run the query - error handling happens in stream_query
+    phase = "sweep" if fields == NATION_SWEEP_FIELDS else "nations"
+    nations = []
+    scanned = 0
+
+    def keep(nation):
+        nonlocal scanned
+        scanned += 1
+        if prefilter is None or prefilter(nation):
+            nations.append(nation)
+
+    data = stream_query(api_key, query, ("data", "nations", "data"), keep, stats=stats, phase=phase)
+    PAGES_FETCHED.inc(query=phase)
 
     # Additional validation for this specific endpoint
     if "data" not in data:
@@ -290,9 +934,10 @@ def get_nations(api_key: str, page=1):
         raise ValueError("API response missing nation data")
 
     # Log success and nation count
-    nation_count = len(data["data"]["nations"]["data"])
-    print(f"Successfully fetched {nation_count} nations from API (page {page})")
+    print(f"Successfully fetched {scanned} nations from API (page {page})")
 
+    data["data"]["nations"]["data"] = nations
+    data["data"]["nations"]["scanned"] = scanned
     return data["data"]["nations"]
     """
     Get a list of beige nations with 1 beige turn left.
@@ -346,30 +991,44 @@ def get_nations(api_key: str, page=1):
 
     return my_nation, final_filtered_nations
 
+def treaty_protected_alliances(my_alliance, protected_types=None):
+    """
+    Build the set of alliance IDs that a treaty protects from raiding.
+
+    Built once per scan from the attacker's own treaties, so checking a
+    target is a set lookup on its alliance ID.
+
+    Args:
+        my_alliance: Alliance data for your nation, with its treaties
+        protected_types: Treaty types that prevent raiding (default: PROTECTED_TREATY_TYPES in config.py)
+
+    Returns:
+        Frozenset of alliance IDs as strings
+    """
+    if not my_alliance:
+        return frozenset()
+    protected_types = frozenset(protected_types or PROTECTED_TREATY_TYPES)
+    protected = set()
+    for treaty in my_alliance.get('treaties') or []:
+        if treaty['treaty_type'] in protected_types:
+            protected.add(str(treaty['alliance1_id']))
+            protected.add(str(treaty['alliance2_id']))
+    return frozenset(protected)
+
 def has_treaty(my_alliance, target_alliance, protected_types=None):
     """
     Check if two alliances have a treaty that should prevent raiding.
 
+    To check many targets, build the index once with treaty_protected_alliances instead.
+
     Args:
         my_alliance: Alliance data for your nation
         target_alliance: Alliance data for target nation
-        protected_types: List of treaty types that prevent raiding
+        protected_types: List of treaty types that prevent raiding (default: PROTECTED_TREATY_TYPES in config.py)
 
     Returns:
         Boolean indicating if a treaty exists
     """
-    if not protected_types:
-        # Default treaty types that should prevent raiding
-        protected_types = ['MDP', 'MDOAP', 'ODP', 'ODOAP', 'NAP', 'PIAT', 'Protectorate']
-
     if not my_alliance or not target_alliance:
         return False
-
-    # Check both alliances' treaties
-    for treaty in my_alliance.get('treaties', []):
-        if (treaty['alliance1_id'] == target_alliance['id'] or
-            treaty['alliance2_id'] == target_alliance['id']):
-            if treaty['treaty_type'] in protected_types:
-                return True
-
-    return False
+    return str(target_alliance['id']) in treaty_protected_alliances(my_alliance, protected_types)
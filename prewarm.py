@@ -0,0 +1,134 @@
+import threading
+import time
+from turns import turn_start
+from snapshot import nation_snapshot
+from store import nation_store
+from loot_index import loot_index
+from metrics import registry
+from file_lock import FileLock
+from config import TURN_INTERVAL, PREWARM_DELAY, PREWARM_LOCK_PATH, PREWARM_SNAPSHOT_PATH
+
+class TurnLock(FileLock):
+    """
+    FileLock whose file also records the start of the last turn that was warmed,
+    so a worker taking the lock after another one can tell the work is done.
+    """
+
+    def warmed_turn(self):
+        """Start of the last turn warmed (epoch seconds), or 0; call with the lock held."""
+        self._file.seek(0)
+        content = self._file.read().strip()
+        try:
+            return float(content) if content else 0.0
+        except ValueError:
+            return 0.0
+
+    def mark_warmed(self, turn: float):
+        """Record that `turn` has been warmed; call with the lock held."""
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(str(turn))
+        self._file.flush()
+
+class Prewarmer:
+    """
+    Refresh nation data a few seconds after every turn change, before users ask for it.
+
+    Traffic spikes right after a turn change, when every cached result has
+    just expired. `delay` seconds after each change, one worker (whichever
+    takes the cross-worker TurnLock first) pulls the turn's changes from the
+    API: it syncs the persistent nation store if enabled, otherwise it
+    re-crawls its own snapshot and saves it to `snapshot_path`. Every other
+    worker then rebuilds its snapshot from the store or that file without
+    touching the API. The loot index is polled under the same lock: the
+    leader pulls the turn's wars and attacks into the shared loot feed and
+    the others only read them from it.
+    """
+
+    def __init__(self, delay: float = PREWARM_DELAY, lock_path: str = PREWARM_LOCK_PATH,
+                 snapshot_path: str = PREWARM_SNAPSHOT_PATH):
+        self.delay = delay
+        self.snapshot_path = snapshot_path
+        self.lock = TurnLock(lock_path)
+        self.led = 0
+        self.followed = 0
+        self.last_run_at = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def next_run(self, now: float = None):
+        """Return the epoch seconds of the next prewarm, `delay` seconds after a turn change."""
+        now = time.time() if now is None else now
+        run_at = turn_start(now) + self.delay
+        return run_at if run_at > now else run_at + TURN_INTERVAL
+
+    def run_once(self, api_key: str, now: float = None):
+        """
+        Warm this worker for the current turn, pulling from the API only if no other worker has.
+
+        Args:
+            api_key: The Politics & War API key.
+            now: Epoch seconds within the turn to warm; defaults to the current time.
+
+        Returns:
+            True if this worker pulled the turn's data from the API
+        """
+        turn = turn_start(now)
+        with self.lock:
+            led = self.lock.warmed_turn() < turn
+            if led:
+                if nation_store is not None:
+                    nation_store.refresh(api_key, force=True)
+                else:
+                    nation_snapshot.refresh(api_key)
+                    nation_snapshot.save(self.snapshot_path)
+                self.lock.mark_warmed(turn)
+            # Without a shared feed, each follower's index keeps polling on its own schedule instead
+            if loot_index.polling and (led or loot_index.feed is not None):
+                try:
+                    loot_index.poll(api_key, force=led)
+                except Exception as e:
+                    print(f"Loot index poll failed: {str(e)}")
+        # Rebuilding this worker's snapshot from the fresh store, or the leader's saved copy, makes no API requests
+        if nation_store is not None:
+            nation_snapshot.refresh(api_key)
+        elif not led:
+            nation_snapshot.load(self.snapshot_path)
+        if led:
+            self.led += 1
+        else:
+            self.followed += 1
+        self.last_run_at = time.time()
+        return led
+
+    def _run(self, api_key: str):
+        while True:
+            time.sleep(max(0.0, self.next_run() - time.time()))
+            try:
+                led = self.run_once(api_key)
+                print(f"Prewarmed nation data for the new turn ({'pulled from the API' if led else 'already pulled by another worker'})")
+            except Exception as e:
+                print(f"Prewarm failed: {str(e)}")
+
+    def start(self, api_key: str):
+        """Start prewarming after every turn change in a background thread, unless it is already running."""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(api_key,), name="prewarm", daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        """Return how often this worker led or followed a prewarm, and when the next one is due."""
+        return {
+            'led': self.led,
+            'followed': self.followed,
+            'last_run_at': self.last_run_at,
+            'next_run_at': self.next_run(),
+        }
+
+# Shared by every request in this process; only runs once started
+prewarmer = Prewarmer()
+
+registry.counter_func("prewarm_runs_total", "Turn prewarms by role (led: pulled from the API, followed: reused)",
+                      lambda: {'led': prewarmer.led, 'followed': prewarmer.followed}, ["role"])
@@ -0,0 +1,85 @@
+import heapq
+import itertools
+
+class _Entry:
+    """Heap entry ordered worst-first, so the heap's root is the item to evict next."""
+
+    __slots__ = ('key', 'seq', 'item')
+
+    def __init__(self, key, seq: int, item):
+        self.key = key
+        self.seq = seq
+        self.item = item
+
+    def __lt__(self, other):
+        # Larger keys are worse; among equal keys the later item is worse
+        return (self.key, self.seq) > (other.key, other.seq)
+
+class TopK:
+    """
+    Keep the `k` best items of a stream in a bounded heap.
+
+    Items are ranked by `key(item)`, smallest first, the same order as
+    sorted(items, key=key); ties keep their arrival order. Memory stays at
+    `k` items however long the stream is.
+
+    can_improve() supports early termination: given a lower bound on the
+    key of items not yet seen, it says whether any of them could still
+    make the top k.
+    """
+
+    def __init__(self, k: int, key):
+        """
+        Args:
+            k: Number of items to keep.
+            key: Function mapping an item to its sort key; smaller ranks first.
+        """
+        self.k = k
+        self.key = key
+        self.seen = 0
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def full(self):
+        return len(self._heap) >= self.k
+
+    def worst_key(self):
+        """Key of the worst item kept, or None if fewer than `k` items are kept."""
+        return self._heap[0].key if self.full() and self._heap else None
+
+    def can_improve(self, bound):
+        """
+        Return whether an item whose key is at least `bound` could still be kept.
+
+        Args:
+            bound: Lower bound on the item's key. A tuple prefix of the full key works for tuple keys.
+        """
+        if self.k <= 0:
+            return False
+        return not self.full() or bound < self._heap[0].key
+
+    def push(self, item):
+        """
+        Offer an item.
+
+        Returns:
+            True if the item was kept
+        """
+        self.seen += 1
+        if self.k <= 0:
+            return False
+        entry = _Entry(self.key(item), next(self._seq), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry.key < self._heap[0].key:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def items(self):
+        """Return the kept items, best first."""
+        return [entry.item for entry in sorted(self._heap, key=lambda entry: (entry.key, entry.seq))]
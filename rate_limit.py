@@ -0,0 +1,272 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import (RATE_LIMIT_MAX_REQUESTS, RATE_LIMIT_WINDOW, RATE_LIMIT_BACKEND, RATE_LIMIT_PATH,
+                    RATE_LIMIT_REDIS_URL, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SWEEP_INTERVAL)
+
+try:
+    import redis
+except ImportError:  # Optional: only needed for the 'redis' backend
+    redis = None
+
+class RateLimitExceeded(ValueError):
+    """Raised when a key has used up its requests; `retry_after` is the seconds until it may make another."""
+
+    def __init__(self, message: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+class MemoryBackend:
+    """
+    Window counters of this process only.
+
+    Each key holds its current window's index and the counts of that window
+    and the one before it, three numbers however many requests it made.
+    Keys are evicted least recently used first beyond `max_keys`.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._counters = OrderedDict()  # key -> [window, previous count, current count]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._counters)
+
+    @staticmethod
+    def _rolled(counter, window: int):
+        stored_window, previous, current = counter
+        if stored_window == window:
+            return previous, current
+        if stored_window == window - 1:
+            return current, 0
+        return 0, 0
+
+    def counts(self, key, window: int):
+        with self._lock:
+            counter = self._counters.get(key)
+            return self._rolled(counter, window) if counter is not None else (0, 0)
+
+    def incr(self, key, window: int, amount: int = 1):
+        with self._lock:
+            counter = self._counters.get(key)
+            previous, current = self._rolled(counter, window) if counter is not None else (0, 0)
+            current = max(current + amount, 0)
+            self._counters[key] = [window, previous, current]
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+            return previous, current
+
+    def sweep(self, window: int):
+        with self._lock:
+            for key in [key for key, counter in self._counters.items() if counter[0] < window - 1]:
+                del self._counters[key]
+
+class SQLiteBackend:
+    """
+    Window counters in a SQLite file, shared by every worker process using the same path.
+
+    Counts are one row per key and window; sweeps delete the rows of windows
+    that no longer count towards the limit.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        """Return this thread's connection, creating the table on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_limits ("
+                         "key TEXT, window INTEGER, count INTEGER, PRIMARY KEY (key, window))")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(DISTINCT key) FROM rate_limits").fetchone()[0]
+
+    def counts(self, key, window: int):
+        rows = dict(self._connection().execute(
+            "SELECT window, count FROM rate_limits WHERE key = ? AND window >= ?", (str(key), window - 1)))
+        return rows.get(window - 1, 0), rows.get(window, 0)
+
+    def incr(self, key, window: int, amount: int = 1):
+        conn = self._connection()
+        # The write lock is held until the commit, so the counts read back include every other worker's updates
+        with conn:
+            conn.execute("INSERT INTO rate_limits (key, window, count) VALUES (?, ?, MAX(?, 0)) "
+                         "ON CONFLICT(key, window) DO UPDATE SET count = MAX(count + ?, 0)",
+                         (str(key), window, amount, amount))
+            return self.counts(key, window)
+
+    def sweep(self, window: int):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM rate_limits WHERE window < ?", (window - 1,))
+
+class RedisBackend:
+    """
+    Window counters in Redis (or a Redis-compatible server), shared by every worker and host using it.
+
+    Counters expire on their own two windows after they start, so sweeps
+    have nothing to do. Needs the optional `redis` package.
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, window_seconds: float = RATE_LIMIT_WINDOW,
+                 prefix: str = "pnw-raiders:rate:"):
+        if redis is None:
+            raise ValueError("The redis rate limit backend needs the redis package (pip install redis).")
+        if not url:
+            raise ValueError("Set RATE_LIMIT_REDIS_URL to use the redis rate limit backend.")
+        self.client = redis.Redis.from_url(url)
+        self.expire_seconds = int(2 * window_seconds) + 1
+        self.prefix = prefix
+
+    def _name(self, key, window: int):
+        return f"{self.prefix}{key}:{window}"
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}*"))
+
+    def counts(self, key, window: int):
+        previous, current = self.client.mget(self._name(key, window - 1), self._name(key, window))
+        return int(previous or 0), int(current or 0)
+
+    def incr(self, key, window: int, amount: int = 1):
+        name = self._name(key, window)
+        pipe = self.client.pipeline()  # MULTI/EXEC, so the counts returned are read atomically with the update
+        pipe.get(self._name(key, window - 1))
+        pipe.incrby(name, amount)
+        pipe.expire(name, self.expire_seconds)
+        previous, current, _ = pipe.execute()
+        return int(previous or 0), max(int(current), 0)
+
+    def sweep(self, window: int):
+        pass
+
+class SlidingWindowLimiter:
+    """
+    Allow at most `limit` requests per key in any `window` seconds.
+
+    Uses a sliding window counter: requests are counted per fixed window,
+    and the count over the last `window` seconds is estimated as the current
+    window's count plus the previous window's count weighted by how much of
+    it still overlaps. That keeps two counters per key instead of a
+    timestamp per request. Counters live in a pluggable backend, so every
+    worker sharing a SQLite file or Redis server enforces the same limit;
+    acquire() counts and checks a request in one backend update, so workers
+    racing for a key's last request can't both get it. Stale keys are swept
+    every `sweep_interval` seconds.
+    """
+
+    def __init__(self, backend, limit: int = RATE_LIMIT_MAX_REQUESTS, window: float = RATE_LIMIT_WINDOW,
+                 sweep_interval: float = RATE_LIMIT_SWEEP_INTERVAL):
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+        self.sweep_interval = sweep_interval
+        self._swept_at = time.time()
+
+    def _position(self, now: float):
+        """Return the index of the window containing `now` and the fraction of it elapsed."""
+        index, elapsed = divmod(now, self.window)
+        return int(index), elapsed / self.window
+
+    def count(self, key, now: float = None):
+        """Return the estimated number of requests `key` made in the last `window` seconds."""
+        index, elapsed = self._position(time.time() if now is None else now)
+        previous, current = self.backend.counts(key, index)
+        return previous * (1 - elapsed) + current
+
+    def check(self, key, now: float = None):
+        """Return True if `key` may make another request."""
+        return self.count(key, now) < self.limit
+
+    def retry_after(self, key, now: float = None):
+        """Return the seconds until `key` may make another request (0 if it may now)."""
+        now = time.time() if now is None else now
+        index, elapsed = self._position(now)
+        previous, current = self.backend.counts(key, index)
+        if previous * (1 - elapsed) + current < self.limit:
+            return 0.0
+        if current < self.limit:
+            # The previous window's weight fades until the estimate drops below the limit
+            allowed_at = 1 - (self.limit - current) / previous
+        else:
+            # This window alone is at the limit; its weight fades during the next one
+            allowed_at = 2 - self.limit / current
+        return max(0.0, (allowed_at - elapsed) * self.window)
+
+    def acquire(self, key, now: float = None):
+        """
+        Count a request made by `key` if it is still within the limit.
+
+        The request is counted first and taken back if that went over the
+        limit, so concurrent workers can't both take the last request left.
+
+        Returns:
+            The index of the window the request was counted in, to pass to
+            release(), or None if the limit is reached
+        """
+        now = time.time() if now is None else now
+        index, elapsed = self._position(now)
+        previous, current = self.backend.incr(key, index)
+        if now - self._swept_at >= self.sweep_interval:
+            self._swept_at = now
+            self.backend.sweep(index)
+        # The estimate includes this request, so it may be at most `limit` plus the weighted remainder
+        if previous * (1 - elapsed) + current - 1 < self.limit:
+            return index
+        self.backend.incr(key, index, -1)
+        return None
+
+    def release(self, key, window: int):
+        """
+        Take back a request counted by acquire(), e.g. one that failed.
+
+        Args:
+            key: The key the request was counted for.
+            window: The window index acquire() returned; the count is taken from
+                that window even if a later one has started since.
+        """
+        self.backend.incr(key, window, -1)
+
+    def stats(self):
+        """Return the backend, the limit and the number of keys tracked."""
+        return {
+            'backend': type(self.backend).__name__,
+            'limit': self.limit,
+            'window_seconds': self.window,
+            'keys': len(self.backend),
+        }
+
+def get_rate_limit_backend(name: str):
+    """
+    Get a backend for the rate limit counters.
+
+    Args:
+        name: 'memory' for counters of this process only, 'sqlite' for a file
+            shared by every worker on this host, or 'redis' for a server shared
+            by every worker and host.
+
+    Returns:
+        Object with counts(key, window), incr(key, window, amount) and sweep(window) methods
+
+    Raises:
+        ValueError: If the backend is unknown or not configured
+    """
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        if not RATE_LIMIT_PATH:
+            raise ValueError("Set RATE_LIMIT_PATH to use the sqlite rate limit backend.")
+        return SQLiteBackend()
+    if name == 'redis':
+        return RedisBackend()
+    raise ValueError(f"Unknown rate limit backend: {name}")
@@ -0,0 +1,230 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from config import (RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_MAX_SLEEP,
+                    BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN, BREAKER_MAX_COOLDOWN)
+
+# Status codes worth retrying: throttling and transient upstream failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(ValueError):
+    """Raised instead of sending a request while the upstream API is throttling or failing."""
+
+    def __init__(self, retry_in: float):
+        self.retry_in = retry_in
+        super().__init__(f"The Politics & War API is throttling requests. Please try again in {max(1, round(retry_in))} seconds.")
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header value.
+
+    Args:
+        value: Header value, either delay seconds or an HTTP date.
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class CircuitBreaker:
+    """
+    Process-wide circuit breaker shared by every API request.
+
+    After a 429, or `failure_threshold` consecutive failures, the circuit
+    opens (for a 429 without Retry-After that is still being retried, only
+    for the retry's backoff): requests fail fast with CircuitOpenError instead of queuing up
+    behind a throttled upstream. Once the cooldown (or the server's
+    Retry-After) has passed, one trial request is let through. Success
+    closes the circuit; failure re-opens it with a doubled cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, cooldown: float = BREAKER_COOLDOWN,
+                 max_cooldown: float = BREAKER_MAX_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._open_until == 0.0:
+                return 'closed'
+            return 'open' if time.monotonic() < self._open_until else 'half-open'
+
+    def remaining(self):
+        """Seconds until the circuit lets a trial request through (0 if closed or half-open)."""
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic()) if self._open_until else 0.0
+
+    def before_request(self):
+        """
+        Check whether a request may be sent now.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or a half-open trial is already running.
+        """
+        with self._lock:
+            if self._open_until == 0.0:
+                return
+            now = time.monotonic()
+            if now < self._open_until:
+                raise CircuitOpenError(self._open_until - now)
+            if self._trial_in_flight:
+                raise CircuitOpenError(self._cooldown)
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+            self._cooldown = self.base_cooldown
+            self._trial_in_flight = False
+
+    def record_neutral(self):
+        """Record a response that says nothing about the upstream's health (e.g. a 401), leaving the circuit as it is."""
+        with self._lock:
+            self._trial_in_flight = False  # Let the next request be the trial instead
+
+    def record_failure(self, retry_after: float = None, throttled: bool = False):
+        """
+        Record a failed request, opening the circuit if needed.
+
+        Args:
+            retry_after: Seconds to keep the circuit open, e.g. the server's
+                Retry-After; defaults to the current cooldown.
+            throttled: True for a 429, which opens the circuit straight away.
+        """
+        with self._lock:
+            self._failures += 1
+            was_trial = self._trial_in_flight
+            self._trial_in_flight = False
+            if throttled or was_trial or self._failures >= self.failure_threshold:
+                if was_trial:
+                    self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+                wait = retry_after if retry_after is not None else self._cooldown
+                self._open_until = max(self._open_until, time.monotonic() + wait)
+
+class RetryPolicy:
+    """
+    Retry policy for API requests: exponential backoff with full jitter,
+    Retry-After support and a shared circuit breaker.
+
+    A request only sleeps in-line for waits up to `max_sleep` seconds;
+    longer waits (a long Retry-After, or an open circuit) fail fast so a
+    throttled upstream doesn't pin every web worker in time.sleep. Every
+    attempt's outcome is counted in `outcomes`.
+    """
+
+    def __init__(self, breaker: CircuitBreaker, max_attempts: int = RETRY_MAX_ATTEMPTS,
+                 base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY,
+                 max_sleep: float = RETRY_MAX_SLEEP):
+        self.breaker = breaker
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_sleep = max_sleep
+        self.outcomes = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def backoff(self, attempt: int):
+        """Full-jitter exponential backoff delay before retry number `attempt` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def send(self, request):
+        """
+        Send a request, retrying throttled and transient failures.
+
+        Args:
+            request: Zero-argument function sending the request and returning a requests.Response.
+
+        Returns:
+            The final response. Non-retryable error statuses (e.g. 401) are
+            returned as-is for the caller to handle.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or the server asks for a longer wait than `max_sleep`.
+            requests.exceptions.RequestException: If the last attempt failed with a network error.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.breaker.before_request()
+            except CircuitOpenError:
+                self._count('short_circuited')
+                raise
+
+            retry_after = None
+            try:
+                response = request()
+            except requests.exceptions.RequestException:
+                self._count('network_error')
+                self.breaker.record_failure()
+                if attempt >= self.max_attempts:
+                    self._count('gave_up')
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    self._count('ok' if response.status_code == 200 else f'status_{response.status_code}')
+                    if 200 <= response.status_code < 300:
+                        self.breaker.record_success()
+                    else:
+                        # Client errors (bad key, bad query) say nothing about the upstream's health
+                        self.breaker.record_neutral()
+                    return response
+
+                throttled = response.status_code == 429
+                self._count('throttled' if throttled else 'server_error')
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if throttled and retry_after is None and attempt < self.max_attempts:
+                    # Without Retry-After, retry after the usual backoff; the circuit stays
+                    # open only that long, so the retry isn't short-circuited by our own cooldown
+                    retry_after = self.backoff(attempt)
+                self.breaker.record_failure(retry_after, throttled=throttled)
+                if attempt >= self.max_attempts:
+                    self._count('gave_up')
+                    return response
+                response.close()  # Release the connection, the body may not have been read
+
+            # Never retry before the circuit lets requests through again
+            delay = max(retry_after if retry_after is not None else self.backoff(attempt), self.breaker.remaining())
+            if delay > self.max_sleep:
+                # Waiting this long in-line would pin the worker; let the caller fail fast
+                self._count('gave_up')
+                raise CircuitOpenError(delay)
+            self._count('retried')
+            time.sleep(delay)
+
+    def stats(self):
+        """Return per-outcome counts and the circuit breaker state."""
+        with self._lock:
+            outcomes = dict(self.outcomes)
+        return {'outcomes': outcomes, 'circuit': self.breaker.state}
+
+# Shared by every API request in this process
+retry_policy = RetryPolicy(CircuitBreaker())
@@ -0,0 +1,534 @@
+from pnw_api import get_nation_by_id, get_nations_by_id, build_nation_filters, parse_api_date, TransferStats
+from sources import get_nation_source
+from filters import compile_sweep_filters, compile_pool_filters
+from nation_table import NationTable, numpy_available, np
+from ranking import TopK
+from loot_index import loot_index
+from targets import TargetRecord
+from metrics import registry
+from tqdm import tqdm
+import bisect
+import time
+import traceback
+from config import DETAIL_BATCH_SIZE, MIN_SCORE_RATIO, MAX_SCORE_RATIO
+
+# Metrics (see metrics.py)
+PAGE_FILTER_SECONDS = registry.histogram("scan_page_filter_seconds",
+                                         "Seconds per page spent filtering and ranking candidates, detail queries excluded")
+NATIONS_SCANNED = registry.counter("scan_nations_scanned_total", "Nations checked by the sweep filters")
+TARGETS_EMITTED = registry.counter("scan_targets_emitted_total", "Targets returned by finished scans", ["mode"])
+
+class ScanMode:
+    """
+    A kind of target a scan looks for, e.g. raid targets or beige nations.
+
+    Every mode shares the war range, treaty and military checks. A mode adds
+    its own check on the sweep's scalar fields, and optionally the nation
+    colors it is limited to so they can be filtered server-side.
+    """
+
+    def __init__(self, name: str, accepts, rank_key, rank_bound=None, colors=None, mask=None):
+        """
+        Args:
+            name: Key the mode's results are returned under.
+            accepts: Function taking a swept nation, returning True if it's a target for this mode.
+            rank_key: Function taking a target result, returning its sort key; smaller ranks first.
+            rank_bound: Optional function taking a swept nation, returning a lower bound
+                on its rank key (e.g. a prefix of the key tuple) before details are fetched.
+            colors: Optional list of the only nation colors this mode can match.
+            mask: Optional vectorized form of `accepts`, taking a NationTable and
+                returning a boolean mask over its rows.
+        """
+        self.name = name
+        self.accepts = accepts
+        self.rank_key = rank_key
+        self.rank_bound = rank_bound
+        self.colors = colors
+        self.mask = mask
+
+    def can_improve(self, ranker, nation):
+        """Return whether `nation` could still make this mode's top targets in `ranker`."""
+        if self.rank_bound is None:
+            return not ranker.full()
+        return ranker.can_improve(self.rank_bound(nation))
+
+def _is_raid_target(nation):
+    return nation.get('color', '').lower() != 'beige'
+
+def _is_ending_beige(nation):
+    # Only include beige nations with 1-12 turns remaining
+    return nation.get('color', '').lower() == 'beige' and 1 <= nation.get('beige_turns', 0) <= 12
+
+def _raid_target_mask(table):
+    return ~table.color_is('beige')
+
+def _ending_beige_mask(table):
+    return table.color_is('beige') & (table.beige_turns >= 1) & (table.beige_turns <= 12)
+
+SCAN_MODES = {
+    # Fewest defensive wars first, then most money stolen in the last 7 days
+    'raid': ScanMode('raid', _is_raid_target,
+                     rank_key=lambda target: (target.defensive_wars_count, -target.seven_days_stolen),
+                     rank_bound=lambda nation: (nation.get('defensive_wars_count', 0),),
+                     mask=_raid_target_mask),
+    # Fewest beige turns left first, then most money stolen in the last 7 days
+    'beige': ScanMode('beige', _is_ending_beige,
+                      rank_key=lambda target: (target.beige_turns, -target.seven_days_stolen),
+                      rank_bound=lambda nation: (nation.get('beige_turns', 0),),
+                      colors=['beige'], mask=_ending_beige_mask),
+}
+
+def _scan_filters(my_nation, modes):
+    """Server-side filters covering every mode: colors are only pushed down if every mode limits them."""
+    colors = set()
+    for mode in modes:
+        if mode.colors is None:
+            return build_nation_filters(my_nation)
+        colors.update(mode.colors)
+    return build_nation_filters(my_nation, colors=sorted(colors))
+
+def _pool_filters(members, modes):
+    """Server-side filters covering every attacker in a batch: the widest score range and city count of any."""
+    specs = [_scan_filters(member, modes) for member in members]
+    filters = dict(specs[0])
+    filters['min_score'] = min(spec['min_score'] for spec in specs)
+    filters['max_score'] = max(spec['max_score'] for spec in specs)
+    if all('max_cities' in spec for spec in specs):
+        filters['max_cities'] = max(spec['max_cities'] for spec in specs)
+    else:
+        filters.pop('max_cities', None)
+    return filters
+
+def _war_epoch(item):
+    """Epoch seconds of a war or attack, parsed at ingest by stamp_war_dates where possible."""
+    date_ts = item.get('date_ts')
+    return date_ts if date_ts is not None else parse_api_date(item['date'])
+
+def _recent_loot(nation, now: float):
+    """
+    Sum the money stolen from a nation in its recent defensive wars.
+
+    Args:
+        nation: Nation data with its wars and attacks.
+        now: Epoch seconds the time windows are measured from.
+
+    Returns:
+        Tuple of (7-day stolen, 1-day stolen, (epoch, date string, money stolen)
+        of the most recent defensive war or None), as LootIndex.lookup returns
+    """
+    seven_days_stolen = 0
+    one_day_stolen = 0
+    most_recent = None
+    if nation.get('wars') and isinstance(nation['wars'], list):
+        for war in nation['wars']:
+            if war.get('def_id') == nation['id']:  # Only defensive wars
+                war_ts = _war_epoch(war)
+                # Ties go to the first war, as the old reverse sort picked
+                if most_recent is None or war_ts > most_recent[0]:
+                    most_recent = (war_ts, war)
+                # Whole days since the war started, as timedelta.days counted them
+                days_ago = (now - war_ts) // 86400
+                if days_ago <= 7 and war.get('attacks'):
+                    for attack in war['attacks']:
+                        if attack.get('def_id') == nation['id']:
+                            seven_days_stolen += attack.get('money_stolen', 0)
+                            if days_ago <= 1:
+                                one_day_stolen += attack.get('money_stolen', 0)
+    if most_recent is None:
+        return seven_days_stolen, one_day_stolen, None
+
+    most_recent_ts, most_recent_war = most_recent
+    recent_war_stolen = 0
+    if most_recent_war.get('attacks'):
+        for attack in most_recent_war['attacks']:
+            if attack.get('def_id') == nation['id']:
+                recent_war_stolen += attack.get('money_stolen', 0)
+    return seven_days_stolen, one_day_stolen, (most_recent_ts, most_recent_war['date'], recent_war_stolen)
+
+def _build_target(nation, now: float, loot=None):
+    """
+    Compute loot figures for a nation with its details merged in.
+
+    Args:
+        nation: Swept nation with its details merged in.
+        now: Epoch seconds the scan's time windows are measured from.
+        loot: Optional warm LootIndex to read the loot figures from; without
+            one they are summed from the nation's nested wars.
+
+    Returns:
+        TargetRecord for the nation, or None if nothing was stolen from it in the last 7 days
+    """
+    if loot is not None:
+        seven_days_stolen, one_day_stolen, most_recent = loot.lookup(nation['id'], now)
+    else:
+        seven_days_stolen, one_day_stolen, most_recent = _recent_loot(nation, now)
+
+    # Skip nations with zero 7-day stolen money (main filter criteria)
+    if seven_days_stolen == 0:
+        return None
+
+    # Use defensive_wars_count from API response
+    defensive_war_count = nation.get('defensive_wars_count', 0)
+
+    # Stolen money in the most recent defensive war; its date is only formatted when shown
+    total_money_stolen_recent_def_war = 0
+    most_recent_ts = None
+    most_recent_date = None
+    if most_recent is not None:
+        most_recent_ts, most_recent_date, total_money_stolen_recent_def_war = most_recent
+
+    # Calculate commerce buildings totals
+    supermarket = 0
+    bank = 0
+    shopping_mall = 0
+    stadium = 0
+    subway = 0
+    if nation.get('cities'):
+        for city in nation['cities']:
+            supermarket += city.get('supermarket', 0)
+            bank += city.get('bank', 0)
+            shopping_mall += city.get('shopping_mall', 0)
+            stadium += city.get('stadium', 0)
+            subway += city.get('subway', 0)
+
+    return TargetRecord(
+        id=nation.get('id'),
+        name=nation.get('nation_name'),
+        score=nation.get('score'),
+        beige_turns=nation.get('beige_turns', 0),
+        alliance=nation.get('alliance').get('name', 'No Alliance') if nation.get('alliance') else 'No Alliance',
+        money_stolen_recent_def_war=total_money_stolen_recent_def_war,
+        seven_days_stolen=seven_days_stolen,
+        one_day_stolen=one_day_stolen,
+        recent_def_war_ts=most_recent_ts,
+        recent_def_war_date=most_recent_date,
+        scanned_at=now,
+        gni=nation.get('gross_national_income', 0),
+        num_cities=nation.get('num_cities', '?'),
+        soldiers=nation.get('soldiers', 0),
+        tanks=nation.get('tanks', 0),
+        aircraft=nation.get('aircraft', 0),
+        ships=nation.get('ships', 0),
+        missiles=nation.get('missiles', 0),
+        nukes=nation.get('nukes', 0),
+        spies=nation.get('spies', 0),
+        infrastructure=sum(city.get('infrastructure', 0) for city in nation.get('cities', [])),
+        supermarket=supermarket,
+        bank=bank,
+        shopping_mall=shopping_mall,
+        stadium=stadium,
+        subway=subway,
+        defensive_wars_count=defensive_war_count,
+    )
+
+def scan_targets(api_key: str, nation_id: int, modes, limit: int, max_pages: int, source: str = 'snapshot',
+                 ordered: bool = False):
+    """
+    Find the best targets for one or more scan modes, returning once the scan has finished.
+
+    Runs iter_scan to the end; see it for the arguments.
+
+    Returns:
+        Tuple of (attacking nation data, dict of mode name to list of TargetRecords, best first)
+
+    Raises:
+        ValueError: If a mode is unknown, the attacking nation can't be fetched,
+            or no nation data could be fetched at all.
+    """
+    for event in iter_scan(api_key, nation_id, modes, limit, max_pages, source=source, ordered=ordered):
+        if event['event'] == 'done':
+            return event['nation'], event['results']
+
+def iter_scan(api_key: str, nation_id: int, modes, limit: int, max_pages: int, source: str = 'snapshot',
+              ordered: bool = False):
+    """
+    Find the best targets for one or more scan modes in a single pass over the nations, streaming progress.
+
+    Nations are swept once; each nation that passes the shared checks is
+    tested against every requested mode. Every page up to `max_pages` is
+    considered, and each mode keeps its `limit` best targets by its rank key
+    in a bounded heap, so the results don't depend on the API's page order.
+    Details are only fetched for nations whose rank bound shows they could
+    still make the top targets of at least one mode.
+
+    Args:
+        api_key: The Politics & War API key.
+        nation_id: ID of the attacking nation.
+        modes: Names of the modes to scan for, keys of SCAN_MODES (e.g. ['raid', 'beige']).
+        limit: Maximum number of targets per mode.
+        max_pages: Maximum number of 500-nation pages to scan.
+        source: Nation source name, see sources.get_nation_source.
+        ordered: Set if the source yields nations in ascending rank bound order
+            across pages; the scan then stops at the first nation that can't
+            make any mode's top targets.
+
+    Yields:
+        Event dictionaries, keyed by 'event':
+        - 'started' once the attacking nation is known, with 'nation'.
+        - 'target' whenever a target makes a mode's current top targets, with
+          'mode' and 'target' (a TargetRecord). Better targets found later
+          may still push it out, so treat these as provisional.
+        - 'page' after each page is processed, with 'page', 'max_pages' and
+          'results' (each mode's best targets so far).
+        - 'done' last, with 'nation' and the final 'results'.
+
+    Raises:
+        ValueError: If a mode is unknown, the attacking nation can't be fetched,
+            or no nation data could be fetched at all.
+    """
+    unknown = [name for name in modes if name not in SCAN_MODES]
+    if unknown:
+        raise ValueError(f"Unknown scan mode(s): {', '.join(unknown)}. Choose from: {', '.join(SCAN_MODES)}")
+    scan_modes = [SCAN_MODES[name] for name in modes]
+
+    my_nation = get_nation_by_id(api_key, nation_id)
+    yield {'event': 'started', 'nation': my_nation}
+
+    # Shared snapshot, persistent store or a live crawl (see sources.py)
+    nation_source = get_nation_source(source)
+
+    # Drop out-of-range, vacation mode and larger nations up front (server-side when crawling)
+    nation_filters = _scan_filters(my_nation, scan_modes)
+
+    transfer_stats = TransferStats()
+
+    # One "now" for the whole scan, so every nation's time windows line up
+    now = time.time()
+
+    # With a warm loot index, details skip the nested wars and attacks
+    loot = loot_index if loot_index.is_warm() else None
+
+    # Each mode's best targets so far, in constant memory
+    rankers = {mode.name: TopK(limit, mode.rank_key) for mode in scan_modes}
+    pages_processed = 0
+
+    def open_modes(nation):
+        """Modes the nation is a target for that it could still make the top targets of."""
+        return [mode for mode in scan_modes if mode.accepts(nation) and mode.can_improve(rankers[mode.name], nation)]
+
+    def rank_bounds(nation):
+        return [mode.rank_bound(nation) if mode.rank_bound else () for mode in scan_modes]
+
+    # Phase 1 filter on the lightweight sweep's scalar fields only. It runs while
+    # each page is decoded, so rejected nations are dropped as they stream in.
+    sweep_filter = compile_sweep_filters(my_nation, scan_modes)
+
+    def exhausted(nation):
+        """With ordered pages: True once neither this nation nor any after it can be kept."""
+        return all(not mode.can_improve(rankers[mode.name], nation) for mode in scan_modes)
+
+    finished = False
+    pbar = tqdm(desc="Fetching nations", unit="page", total=max_pages)
+
+    try:
+        for page, nations_data in nation_source.iter_pages(api_key, max_pages, nation_filters, stats=transfer_stats,
+                                                           prefilter=sweep_filter):
+            pbar.update(1)
+            pages_processed += 1
+            page_started = time.perf_counter()
+            detail_seconds = 0.0
+
+            # Phase 1 already ran in sweep_filter as the page was decoded. Likely
+            # winners go first, so the heaps fill early and prune the rest.
+            candidates = sorted(nations_data["data"], key=rank_bounds)
+
+            # Phase 2: fetch wars, attacks and cities for the survivors only, in batches
+            for batch_start in range(0, len(candidates), DETAIL_BATCH_SIZE):
+                batch = []
+                for nation in candidates[batch_start:batch_start + DETAIL_BATCH_SIZE]:
+                    if ordered and exhausted(nation):
+                        finished = True
+                        break
+                    if open_modes(nation):
+                        batch.append(nation)
+                if not batch:
+                    if finished:
+                        break
+                    continue
+                detail_started = time.perf_counter()
+                details = nation_source.get_details(api_key, [nation['id'] for nation in batch], stats=transfer_stats,
+                                                    wars=loot is None)
+                detail_seconds += time.perf_counter() - detail_started
+
+                for nation in batch:
+                    matched = open_modes(nation)
+                    if not matched:
+                        continue
+                    if nation['id'] not in details:  # Nation deleted since the sweep
+                        continue
+                    nation.update(details[nation['id']])
+
+                    target = _build_target(nation, now, loot)
+                    if target is None:
+                        sweep_filter.reject('no_recent_loot')
+                        continue
+                    for mode in matched:
+                        if rankers[mode.name].push(target):
+                            yield {'event': 'target', 'mode': mode.name, 'target': target}
+                if finished:
+                    break
+
+            PAGE_FILTER_SECONDS.observe(time.perf_counter() - page_started - detail_seconds)
+            yield {'event': 'page', 'page': pages_processed, 'max_pages': max_pages,
+                   'results': {name: ranker.items() for name, ranker in rankers.items()}}
+
+            # Early exit once nothing later can make the top targets (stops the remaining fetches)
+            if finished:
+                break
+    except Exception as e:
+        # Transient failures were already retried by the API client's retry policy
+        print(f"\n❌ Error fetching nations: {str(e)}")
+        traceback.print_exc()
+
+        # Terminate with an error if we can't fetch any data
+        if not pages_processed:
+            raise ValueError(f"Could not fetch any nation data from API: {str(e)}")
+        # If we already have some pages, just use what we have
+        print(f"\n✅ Using {pages_processed} pages already fetched before error")
+    finally:
+        pbar.close()
+        print(f"\nTransferred: {transfer_stats.summary()}")
+        print(f"Filtered: {sweep_filter.summary()}")
+        NATIONS_SCANNED.inc(sweep_filter.stats()['checked'])
+
+    results = {name: ranker.items() for name, ranker in rankers.items()}
+    for name, targets in results.items():
+        TARGETS_EMITTED.inc(len(targets), mode=name)
+    yield {'event': 'done', 'nation': my_nation, 'results': results}
+
+def scan_targets_batch(api_key: str, nation_ids, modes, limit: int, max_pages: int, source: str = 'snapshot'):
+    """
+    Find the best targets of many attacking nations, e.g. an alliance's members, in one pass over the nations.
+
+    The attackers are fetched in one query, and one candidate pool covering
+    all their war ranges is crawled once. Each attacker's sweep filters (war
+    range, military, treaties) then run over the shared pool: with NumPy as
+    masks over one NationTable, and only on the slice of the score-sorted
+    pool within the attacker's war range. Details are fetched and targets
+    built at most once per nation, however many attackers it is a candidate
+    for, so API requests grow with the pool rather than pool x attackers.
+
+    Args:
+        api_key: The Politics & War API key.
+        nation_ids: IDs of the attacking nations.
+        modes: Names of the modes to scan for, keys of SCAN_MODES (e.g. ['raid']).
+        limit: Maximum number of targets per mode and attacker.
+        max_pages: Maximum number of 500-nation pages to scan.
+        source: Nation source name, see sources.get_nation_source.
+
+    Returns:
+        Tuple of (dict of nation ID to attacking nation data, dict of nation ID
+        to dict of mode name to list of TargetRecords, best first); nations
+        that weren't found are left out of both
+
+    Raises:
+        ValueError: If a mode is unknown, none of the attacking nations are
+            found, or no nation data could be fetched at all.
+    """
+    unknown = [name for name in modes if name not in SCAN_MODES]
+    if unknown:
+        raise ValueError(f"Unknown scan mode(s): {', '.join(unknown)}. Choose from: {', '.join(SCAN_MODES)}")
+    scan_modes = [SCAN_MODES[name] for name in modes]
+
+    members = get_nations_by_id(api_key, nation_ids)
+    if not members:
+        raise ValueError("None of the attacking nations were found.")
+    missing = [str(nation_id) for nation_id in nation_ids if int(nation_id) not in members]
+    if missing:
+        print(f"⚠️ Nations not found, skipped: {', '.join(missing)}")
+
+    nation_source = get_nation_source(source)
+    transfer_stats = TransferStats()
+    now = time.time()
+    loot = loot_index if loot_index.is_warm() else None
+
+    # Phase 1, once for everyone: crawl every attacker's war range, keeping
+    # the nations the checks that don't depend on the attacker let through
+    pool_filter = compile_pool_filters(scan_modes)
+    pool = []
+    pages_processed = 0
+    pbar = tqdm(desc="Fetching nations", unit="page", total=max_pages)
+    try:
+        for page, nations_data in nation_source.iter_pages(api_key, max_pages, _pool_filters(members.values(), scan_modes),
+                                                           stats=transfer_stats, prefilter=pool_filter):
+            pbar.update(1)
+            pages_processed += 1
+            pool.extend(nations_data["data"])
+    except Exception as e:
+        # Transient failures were already retried by the API client's retry policy
+        print(f"\n❌ Error fetching nations: {str(e)}")
+        traceback.print_exc()
+        if not pages_processed:
+            raise ValueError(f"Could not fetch any nation data from API: {str(e)}")
+        print(f"\n✅ Using {pages_processed} pages already fetched before error")
+    finally:
+        pbar.close()
+        NATIONS_SCANNED.inc(pool_filter.stats()['checked'])
+
+    # Sorted by score, so each attacker's war range is one contiguous slice
+    pool.sort(key=lambda nation: nation.get('score', 0))
+    scores = [nation.get('score', 0) for nation in pool]
+    table = NationTable(pool) if pool and numpy_available() else None
+
+    # Target per nation ID (None without recent loot), shared by every attacker
+    built = {}
+    results = {}
+    for nation_id, member in members.items():
+        sweep_filter = compile_sweep_filters(member, scan_modes)
+        start = bisect.bisect_left(scores, member['score'] * MIN_SCORE_RATIO)
+        end = bisect.bisect_right(scores, member['score'] * MAX_SCORE_RATIO)
+        if table is not None:
+            rows = np.arange(start, end)
+            candidates = [pool[row] for row in rows[sweep_filter.mask(table, rows)].tolist()]
+        else:
+            candidates = [nation for nation in pool[start:end] if sweep_filter.accepts(nation)]
+        results[nation_id] = _rank_shared_candidates(api_key, nation_source, candidates, scan_modes, limit,
+                                                     built, now, loot, transfer_stats)
+
+    print(f"\nTransferred: {transfer_stats.summary()}")
+    print(f"Filtered: {pool_filter.summary()}, shared by {len(members)} attackers; "
+          f"{len(built)} nations' details fetched")
+    for member_results in results.values():
+        for name, targets in member_results.items():
+            TARGETS_EMITTED.inc(len(targets), mode=name)
+    return members, results
+
+def _rank_shared_candidates(api_key: str, nation_source, candidates, scan_modes, limit: int, built, now: float,
+                            loot, stats):
+    """
+    Rank one attacker's candidates from a shared pool, as phase 2 of iter_scan does.
+
+    Details are only fetched for candidates that could still make one of
+    the attacker's top targets and that no earlier attacker built a target
+    for; `built` maps nation ID to its TargetRecord (or None) and is updated.
+
+    Returns:
+        Dict of mode name to list of TargetRecords, best first
+    """
+    rankers = {mode.name: TopK(limit, mode.rank_key) for mode in scan_modes}
+
+    def open_modes(nation):
+        return [mode for mode in scan_modes if mode.accepts(nation) and mode.can_improve(rankers[mode.name], nation)]
+
+    # Likely winners go first, so the heaps fill early and prune the rest
+    candidates = sorted(candidates, key=lambda nation: [mode.rank_bound(nation) if mode.rank_bound else ()
+                                                        for mode in scan_modes])
+    for batch_start in range(0, len(candidates), DETAIL_BATCH_SIZE):
+        batch = [nation for nation in candidates[batch_start:batch_start + DETAIL_BATCH_SIZE] if open_modes(nation)]
+        needed = [nation for nation in batch if nation['id'] not in built]
+        if needed:
+            details = nation_source.get_details(api_key, [nation['id'] for nation in needed], stats=stats,
+                                                wars=loot is None)
+            for nation in needed:
+                if nation['id'] not in details:  # Nation deleted since the sweep
+                    built[nation['id']] = None
+                    continue
+                nation.update(details[nation['id']])
+                built[nation['id']] = _build_target(nation, now, loot)
+        for nation in batch:
+            target = built[nation['id']]
+            if target is None:
+                continue
+            for mode in open_modes(nation):
+                rankers[mode.name].push(target)
+    return {name: ranker.items() for name, ranker in rankers.items()}
@@ -63,6 +63,20 @@
      *  void respondWith(Promise<Response> r)
      */
     self.addEventListener('fetch', event => {
+    // JSON API: revalidate with the server's ETag (a 304 is cheap) instead of cache-busting,
+    // and fall back to the last copy when offline.
+    const requestUrl = new URL(event.request.url)
+    if (requestUrl.hostname === self.location.hostname && requestUrl.pathname.startsWith('/api/')) {
+        const fetched = fetch(event.request, { cache: 'no-cache' })
+        event.respondWith(fetched.catch(_ => caches.match(event.request)))
+        event.waitUntil(
+        Promise.all([fetched.then(resp => resp.clone()), caches.open("pwa-cache")])
+            .then(([response, cache]) => response.ok && cache.put(event.request, response))
+            .catch(_ => { /* eat any errors */ })
+        )
+        return
+    }
+
     // Skip some of cross-origin requests, like those for Google Analytics.
     if (HOSTNAME_WHITELIST.indexOf(new URL(event.request.url).hostname) > -1) {
         // Stale-while-revalidate
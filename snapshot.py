@@ -0,0 +1,281 @@
+import bisect
+import json
+import os
+import threading
+import time
+from pnw_api import get_nation_details, NATION_SWEEP_FIELDS
+from page_fetcher import iter_nation_pages
+from store import nation_store
+from nation_table import NationTable, numpy_available, np
+from config import SNAPSHOT_TTL, SNAPSHOT_MAX_PAGES
+
+def _matches(nation, filters):
+    """Apply the server-side filters from build_nation_filters to a snapshot nation."""
+    if filters.get('vmode') is not None and (nation.get('vacation_mode_turns', 0) > 0) != filters['vmode']:
+        return False
+    if filters.get('max_cities') is not None and nation.get('num_cities', 0) > filters['max_cities']:
+        return False
+    if filters.get('color') and nation.get('color') not in filters['color']:
+        return False
+    return True
+
+class NationSnapshot:
+    """
+    In-process snapshot of the nation universe shared by every scan.
+
+    The snapshot holds the lightweight sweep fields of up to `max_pages`
+    pages of nations not in vacation mode, sorted by score so a war range
+    lookup is a bisect. With NumPy installed it is also packed into a
+    NationTable, so scans filter it with vectorized masks. It is loaded on first use; once older than `ttl`
+    seconds it keeps serving the current data while a background thread
+    fetches a fresh copy. When the persistent store is enabled, loading and
+    refreshing sync the store and read every stored nation from it instead
+    of crawling (`max_pages` only caps the crawl). Nested
+    details fetched for scan survivors are memoized until the next refresh.
+    """
+
+    def __init__(self, ttl: float = SNAPSHOT_TTL, max_pages: int = SNAPSHOT_MAX_PAGES):
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._nations = None
+        self._scores = []
+        self._by_id = {}
+        self._table = None
+        self._details = {}
+        self._loaded_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def age(self):
+        """Seconds since the snapshot was loaded, or None if it was never loaded."""
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def refresh(self, api_key: str, stats=None):
+        """
+        Fetch a fresh copy of the nation universe and swap it in.
+
+        Only one refresh runs at a time; concurrent callers wait for it and
+        then return without fetching again.
+
+        Args:
+            api_key: The Politics & War API key.
+            stats: Optional TransferStats to record response sizes in.
+        """
+        version = self.version
+        with self._refresh_lock:
+            if self.version != version:  # Someone else refreshed while we waited
+                return
+            if nation_store is not None:
+                # Sync the persistent store incrementally instead of re-crawling
+                nation_store.refresh(api_key, stats=stats)
+                # Every stored nation: the store is ordered by score, so a limit would
+                # drop the top of the score range and leave strong attackers no candidates
+                nations = nation_store.query_candidates({'vmode': False})
+            else:
+                nations = []
+                for _, nations_data in iter_nation_pages(api_key, self.max_pages, {'vmode': False},
+                                                         fields=NATION_SWEEP_FIELDS, stats=stats):
+                    nations.extend(nations_data["data"])
+            self._swap_in(nations)
+
+    def _swap_in(self, nations):
+        """Replace the snapshot's nations, sorting them by score and building their columns."""
+        nations.sort(key=lambda nation: nation.get('score', 0))
+        # Columns for vectorized filtering, built once per refresh
+        table = NationTable(nations) if numpy_available() else None
+
+        with self._lock:
+            self._nations = nations
+            self._scores = [nation.get('score', 0) for nation in nations]
+            self._by_id = {int(nation['id']): nation for nation in nations}
+            self._table = table
+            self._details = {}
+            self._loaded_at = time.monotonic()
+            self.version += 1
+            self.refreshes += 1
+
+    def save(self, path: str):
+        """
+        Write the snapshot's nations to a JSON file, so other processes can load them without crawling.
+
+        The file is replaced atomically; readers see the old or the new copy, never a partial one.
+        """
+        with self._lock:
+            nations = self._nations
+        if nations is None:
+            raise ValueError("The snapshot is not loaded")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(nations, f, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    def load(self, path: str):
+        """
+        Replace the snapshot with the nations saved to `path` by save(), without any API request.
+
+        Raises:
+            ValueError: If the file can't be read.
+        """
+        try:
+            with open(path) as f:
+                nations = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Could not load the nation snapshot from {path}: {str(e)}")
+        self._swap_in(nations)
+
+    def _refresh_in_background(self, api_key: str):
+        try:
+            self.refresh(api_key)
+        except Exception as e:
+            print(f"Background snapshot refresh failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _refresh_if_stale(self, api_key: str):
+        """Start a background refresh once the loaded snapshot is stale; call with `_lock` held."""
+        stale = time.monotonic() - self._loaded_at > self.ttl
+        if stale and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, args=(api_key,),
+                             name="snapshot-refresh", daemon=True).start()
+
+    def _ensure_loaded(self, api_key: str, stats=None):
+        """Load the snapshot if needed and start a background refresh once it is stale."""
+        with self._lock:
+            loaded = self._nations is not None
+            if loaded:
+                self.hits += 1
+                self._refresh_if_stale(api_key)
+            else:
+                self.misses += 1
+        if not loaded:
+            self.refresh(api_key, stats=stats)
+
+    def peek_nation(self, api_key: str, nation_id):
+        """
+        Return a copy of one nation's sweep fields, without ever fetching in the foreground.
+
+        Args:
+            api_key: The Politics & War API key, used if a stale snapshot starts its background refresh.
+            nation_id: ID of the nation.
+
+        Returns:
+            The nation dictionary, or None if the snapshot isn't loaded or doesn't hold the nation
+        """
+        with self._lock:
+            if self._nations is None:
+                return None
+            self._refresh_if_stale(api_key)
+            nation = self._by_id.get(int(nation_id))
+        return dict(nation) if nation is not None else None
+
+    def iter_pages(self, api_key: str, max_pages: int, filters=None, stats=None, page_size: int = 500,
+                   prefilter=None):
+        """
+        Yield snapshot nations matching `filters`, shaped like iter_nation_pages output.
+
+        Args:
+            api_key: The Politics & War API key, used if the snapshot must be loaded.
+            max_pages: Maximum number of pages to yield.
+            filters: Optional filter spec from build_nation_filters.
+            stats: Optional TransferStats, used if the snapshot must be loaded.
+            page_size: Nations per yielded page.
+            prefilter: Optional function or FilterPipeline; only nations it returns
+                True for are yielded.
+
+        Yields:
+            Tuples of (page number, nations data) with copies of the snapshot nations
+        """
+        self._ensure_loaded(api_key, stats=stats)
+        filters = filters or {}
+        with self._lock:
+            nations, scores, table = self._nations, self._scores, self._table
+
+        if table is not None and (prefilter is None or hasattr(prefilter, 'mask')):
+            yield from self._iter_table_pages(table, max_pages, filters, page_size, prefilter)
+            return
+
+        start = 0
+        end = len(nations)
+        if filters.get('min_score') is not None:
+            start = bisect.bisect_left(scores, filters['min_score'])
+        if filters.get('max_score') is not None:
+            end = bisect.bisect_right(scores, filters['max_score'])
+
+        # Copies, so scans can merge details into them without touching the snapshot
+        matching = [dict(nation) for nation in nations[start:end] if _matches(nation, filters)]
+
+        page_count = min(max_pages, max(1, -(-len(matching) // page_size)))
+        for page in range(1, page_count + 1):
+            page_nations = matching[(page - 1) * page_size:page * page_size]
+            if prefilter is not None:
+                page_nations = [nation for nation in page_nations if prefilter(nation)]
+            yield page, {
+                "data": page_nations,
+                "paginatorInfo": {"hasMorePages": page * page_size < len(matching), "currentPage": page},
+            }
+
+    def _iter_table_pages(self, table, max_pages: int, filters, page_size: int, prefilter):
+        """Vectorized iter_pages: same pages, filtered with masks over the snapshot's columns."""
+        # Rows matching the server-side filters, capped like the paged path
+        matching = np.flatnonzero(table.match_filters(filters))
+        rows = matching[:max_pages * page_size]
+        if prefilter is not None:
+            kept = np.flatnonzero(prefilter.mask(table, rows))
+        else:
+            kept = np.arange(len(rows))
+
+        page_count = min(max_pages, max(1, -(-len(matching) // page_size)))
+        # Positions in `kept` where each page starts and ends
+        bounds = np.searchsorted(kept, np.arange(page_count + 1) * page_size)
+        for page in range(1, page_count + 1):
+            page_rows = rows[kept[bounds[page - 1]:bounds[page]]]
+            yield page, {
+                # Copies, so scans can merge details into them without touching the snapshot
+                "data": [dict(table.nations[row]) for row in page_rows.tolist()],
+                "paginatorInfo": {"hasMorePages": page * page_size < len(matching), "currentPage": page},
+            }
+
+    def get_details(self, api_key: str, nation_ids, stats=None, wars: bool = True):
+        """
+        Get nested nation details, fetching only those not already memoized.
+
+        Takes the same arguments and returns the same mapping as pnw_api.get_nation_details.
+        Memoized details without wars are fetched again if wars are asked for.
+        """
+        with self._lock:
+            details = self._details
+            missing = [nation_id for nation_id in nation_ids
+                       if nation_id not in details or (wars and 'wars' not in details[nation_id])]
+        if missing:
+            if nation_store is not None:
+                fetched = nation_store.get_details(api_key, missing, stats=stats, wars=wars)
+            else:
+                fetched = get_nation_details(api_key, missing, stats=stats, wars=wars)
+            with self._lock:
+                details.update(fetched)
+        return {nation_id: details[nation_id] for nation_id in nation_ids if nation_id in details}
+
+    def stats(self):
+        """Return the snapshot's age, size, version and hit/miss counts."""
+        with self._lock:
+            return {
+                'age_seconds': self.age(),
+                'nations': len(self._nations) if self._nations is not None else 0,
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'detail_entries': len(self._details),
+            }
+
+# Shared by every scan in this process
+nation_snapshot = NationSnapshot()
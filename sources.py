@@ -0,0 +1,32 @@
+from page_fetcher import live_source
+from snapshot import nation_snapshot
+from store import nation_store
+
+def get_nation_source(name: str):
+    """
+    Get the source a scan reads candidate nations and their details from.
+
+    Args:
+        name: 'snapshot' for the shared in-process snapshot, 'store' for the
+            persistent SQLite store, or 'api' to crawl the API directly.
+
+    Returns:
+        Object with iter_pages(api_key, max_pages, filters, stats, prefilter) and
+        get_details(api_key, nation_ids, stats, wars) methods
+
+    Raises:
+        ValueError: If the source is unknown or not configured
+    """
+    if name == 'snapshot':
+        return nation_snapshot
+    if name == 'store':
+        if nation_store is None:
+            raise ValueError("The nation store is disabled. Set NATION_STORE_PATH to use it.")
+        return nation_store
+    if name == 'api':
+        return live_source
+    raise ValueError(f"Unknown nation source: {name}")
+
+def default_cli_source():
+    """Source for one-off CLI runs: the persistent store if enabled, otherwise the API."""
+    return 'store' if nation_store is not None else 'api'
@@ -0,0 +1,525 @@
+import sqlite3
+import threading
+import time
+from pnw_api import (get_nations, get_nation_details, get_wars, get_war_attacks, parse_api_date,
+                     format_api_datetime, NATION_SWEEP_FIELDS)
+from page_fetcher import iter_nation_pages
+from file_lock import FileLock
+from turns import turn_start
+from config import (NATION_STORE_PATH, STORE_REFRESH_INTERVAL, STORE_MAX_PAGES, STORE_DETAIL_TTL,
+                    STORE_FULL_SWEEP_INTERVAL)
+
+# Wars and attacks older than this are pruned (nation.wars only covers the last 14 days)
+HISTORY_DAYS = 14
+
+# Scalar nation columns, matching NATION_SWEEP_FIELDS
+NATION_COLUMNS = [
+    'id', 'nation_name', 'score', 'num_cities', 'alliance_id', 'vacation_mode_turns', 'beige_turns',
+    'color', 'soldiers', 'tanks', 'aircraft', 'ships', 'missiles', 'nukes', 'spies',
+    'gross_national_income', 'defensive_wars_count',
+]
+
+# Commerce buildings, summed over all cities when details are saved
+CITY_COLUMNS = ['supermarket', 'bank', 'shopping_mall', 'stadium', 'subway']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nations (
+    id INTEGER PRIMARY KEY,
+    nation_name TEXT,
+    score REAL,
+    num_cities INTEGER,
+    alliance_id INTEGER,
+    vacation_mode_turns INTEGER,
+    beige_turns INTEGER,
+    color TEXT,
+    soldiers INTEGER,
+    tanks INTEGER,
+    aircraft INTEGER,
+    ships INTEGER,
+    missiles INTEGER,
+    nukes INTEGER,
+    spies INTEGER,
+    gross_national_income REAL,
+    defensive_wars_count INTEGER,
+    supermarket INTEGER,
+    bank INTEGER,
+    shopping_mall INTEGER,
+    stadium INTEGER,
+    subway INTEGER,
+    updated_at REAL,
+    details_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_nations_score ON nations (score);
+CREATE INDEX IF NOT EXISTS idx_nations_color ON nations (color);
+CREATE INDEX IF NOT EXISTS idx_nations_alliance_id ON nations (alliance_id);
+CREATE INDEX IF NOT EXISTS idx_nations_beige_turns ON nations (beige_turns);
+
+CREATE TABLE IF NOT EXISTS alliances (
+    id INTEGER PRIMARY KEY,
+    name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS wars (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    date_ts INTEGER,
+    turns_left INTEGER,
+    att_id INTEGER,
+    def_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_wars_def_id ON wars (def_id, date_ts);
+
+CREATE TABLE IF NOT EXISTS attacks (
+    id INTEGER PRIMARY KEY,
+    war_id INTEGER,
+    def_id INTEGER,
+    money_stolen REAL,
+    date TEXT,
+    date_ts INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_attacks_war_id ON attacks (war_id);
+CREATE INDEX IF NOT EXISTS idx_attacks_def_id ON attacks (def_id, date_ts);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _int_or_none(value):
+    return int(value) if value not in (None, '') else None
+
+class NationStore:
+    """
+    SQLite-backed store of nations, alliances, wars and attacks.
+
+    The store survives restarts and is shared by every process pointing at
+    the same file (gunicorn workers, CLI runs). Syncs hold a lock file next
+    to the database, so only one process at a time writes a sync; the others
+    wait and then find the store fresh. refresh() pulls only what
+    changed since the last sync: nations active since then or newer than the
+    highest known ID, and wars and attacks newer than the highest known IDs.
+    Beige and vacation turns count down without any activity, so after every
+    turn change the beige and vacation mode nations are swept again, and a
+    periodic full sweep drops deleted nations. Scans read candidates and
+    details straight from the tables.
+    """
+
+    def __init__(self, path: str = NATION_STORE_PATH, refresh_interval: float = STORE_REFRESH_INTERVAL,
+                 max_pages: int = STORE_MAX_PAGES, detail_ttl: float = STORE_DETAIL_TTL,
+                 full_sweep_interval: float = STORE_FULL_SWEEP_INTERVAL):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.max_pages = max_pages
+        self.detail_ttl = detail_ttl
+        self.full_sweep_interval = full_sweep_interval
+        self._local = threading.local()
+        # Held across processes; also serializes this process's threads
+        self._refresh_lock = FileLock(path + '.lock')
+        self._schema_ready = False
+
+    def _connection(self):
+        """Return this thread's connection, creating the schema on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _get_state(self, key: str):
+        row = self._connection().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def _set_state(self, conn, key: str, value):
+        conn.execute("INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                     "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value)))
+
+    # Writes
+
+    def upsert_nations(self, nations):
+        """Insert or update the scalar fields of nations from a sweep page."""
+        now = time.time()
+        columns = NATION_COLUMNS + ['updated_at']
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        rows = [
+            [_int_or_none(nation.get('id')), nation.get('nation_name'), nation.get('score'),
+             nation.get('num_cities'), _int_or_none(nation.get('alliance_id')),
+             nation.get('vacation_mode_turns'), nation.get('beige_turns'), nation.get('color'),
+             nation.get('soldiers'), nation.get('tanks'), nation.get('aircraft'), nation.get('ships'),
+             nation.get('missiles'), nation.get('nukes'), nation.get('spies'),
+             nation.get('gross_national_income'), nation.get('defensive_wars_count'), now]
+            for nation in nations
+        ]
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                f"INSERT INTO nations ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                rows)
+
+    def upsert_wars(self, wars):
+        """Insert or update wars, as returned by get_wars or nested under a nation."""
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO wars (id, date, date_ts, turns_left, att_id, def_id) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET turns_left = excluded.turns_left",
+                [(int(war['id']), war.get('date'), parse_api_date(war.get('date')), war.get('turns_left'),
+                  _int_or_none(war.get('att_id')), _int_or_none(war.get('def_id'))) for war in wars])
+
+    def upsert_attacks(self, attacks):
+        """Insert attacks, as returned by get_war_attacks (each must carry a war_id)."""
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO attacks (id, war_id, def_id, money_stolen, date, date_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(int(attack['id']), _int_or_none(attack.get('war_id')), _int_or_none(attack.get('def_id')),
+                  attack.get('money_stolen') or 0, attack.get('date'), parse_api_date(attack.get('date')))
+                 for attack in attacks])
+
+    def save_details(self, details):
+        """Save nested details from get_nation_details: commerce totals, alliance, wars and attacks."""
+        now = time.time()
+        wars = []
+        attacks = []
+        conn = self._connection()
+        with conn:
+            for nation_id, nation in details.items():
+                totals = {column: 0 for column in CITY_COLUMNS}
+                for city in nation.get('cities') or []:
+                    for column in CITY_COLUMNS:
+                        totals[column] += city.get(column, 0) or 0
+                conn.execute(
+                    f"UPDATE nations SET {', '.join(f'{column} = ?' for column in CITY_COLUMNS)}, details_at = ? "
+                    f"WHERE id = ?",
+                    [totals[column] for column in CITY_COLUMNS] + [now, int(nation_id)])
+
+                alliance = nation.get('alliance')
+                if alliance and alliance.get('id'):
+                    conn.execute("INSERT INTO alliances (id, name) VALUES (?, ?) "
+                                 "ON CONFLICT(id) DO UPDATE SET name = excluded.name",
+                                 (int(alliance['id']), alliance.get('name')))
+
+                for war in nation.get('wars') or []:
+                    if war.get('id') is None:
+                        continue
+                    wars.append(war)
+                    for attack in war.get('attacks') or []:
+                        if attack.get('id') is not None:
+                            attacks.append(dict(attack, war_id=war['id']))
+        self.upsert_wars(wars)
+        self.upsert_attacks(attacks)
+
+    # Incremental refresh
+
+    def refresh(self, api_key: str, stats=None, force: bool = False):
+        """
+        Pull changes from the API since the last sync.
+
+        The first sync sweeps up to `max_pages` pages of nations and
+        backfills the wars and attacks of the last HISTORY_DAYS. Later syncs fetch only nations active
+        since the last sync or with a higher ID than any stored, plus every
+        war and attack newer than the stored cursors. Defenders of new
+        attacks are re-swept since their score and military may have changed.
+
+        Beige and vacation turns tick down every turn whether a nation is
+        active or not, so the first sync after a turn change also sweeps the
+        beige and vacation mode nations, and re-sweeps by ID those stored as
+        beige or in vacation mode that have since left it. Every
+        `full_sweep_interval` seconds the whole universe is swept again and
+        nations it no longer returns are dropped.
+
+        Args:
+            api_key: The Politics & War API key.
+            stats: Optional TransferStats to record response sizes in.
+            force: Refresh even if the last sync is younger than `refresh_interval`.
+
+        Returns:
+            True if a sync ran, False if the store was fresh enough
+        """
+        with self._refresh_lock:
+            synced_at = self._get_state('synced_at')
+            started = time.time()
+            if not force and synced_at and started - float(synced_at) < self.refresh_interval:
+                return False
+
+            full_swept_at = self._get_state('full_swept_at')
+            full_sweep = (synced_at is None or full_swept_at is None
+                          or started - float(full_swept_at) >= self.full_sweep_interval)
+            if full_sweep:
+                if self._sweep(api_key, None, stats):
+                    # Only a sweep that reached the last page shows which nations are gone
+                    self._drop_unswept(started)
+                else:
+                    print(f"Full store sweep stopped after {self.max_pages} pages; no nations were dropped")
+            else:
+                max_id = self._connection().execute("SELECT MAX(id) FROM nations").fetchone()[0] or 0
+                self._sweep(api_key, {'active_since': format_api_datetime(float(synced_at) - 60)}, stats)
+                self._sweep(api_key, {'min_id': [max_id + 1]}, stats)
+                if turn_start(started) > float(synced_at):
+                    self._sweep_turn_counters(api_key, started, stats)
+
+            self._pull_new(api_key, 'wars_max_id', get_wars, self.upsert_wars, {'active': False}, stats)
+            defenders = self._pull_new(api_key, 'attacks_max_id', get_war_attacks, self.upsert_attacks, {}, stats)
+            if synced_at is not None and defenders:
+                self._resweep(api_key, defenders, stats)
+
+            self._prune(started)
+            conn = self._connection()
+            with conn:
+                self._set_state(conn, 'synced_at', started)
+                if full_sweep:
+                    self._set_state(conn, 'full_swept_at', started)
+            return True
+
+    def _sweep(self, api_key: str, filters, stats):
+        """
+        Upsert every nation matching `filters`, up to `max_pages` pages.
+
+        Returns:
+            True if the sweep reached the last page
+        """
+        complete = True
+        for _, nations_data in iter_nation_pages(api_key, self.max_pages, filters,
+                                                 fields=NATION_SWEEP_FIELDS, stats=stats):
+            self.upsert_nations(nations_data["data"])
+            complete = not nations_data.get("paginatorInfo", {}).get("hasMorePages")
+        return complete
+
+    def _sweep_turn_counters(self, api_key: str, started: float, stats):
+        """Refresh the beige and vacation turns of every nation that is, or was stored as, beige or in vacation mode."""
+        self._sweep(api_key, {'color': ['beige']}, stats)
+        self._sweep(api_key, {'vmode': True}, stats)
+        # Stored as beige or in vacation mode but missed by the sweeps above: left it since
+        left = [row[0] for row in self._connection().execute(
+            "SELECT id FROM nations WHERE (color = 'beige' OR beige_turns > 0 OR vacation_mode_turns > 0) "
+            "AND updated_at < ?", (started,))]
+        if left:
+            self._resweep(api_key, left, stats)
+
+    def _drop_unswept(self, started: float):
+        """Delete nations a complete sweep starting at `started` did not return; they no longer exist."""
+        conn = self._connection()
+        with conn:
+            dropped = conn.execute("DELETE FROM nations WHERE updated_at < ?", (started,)).rowcount
+        if dropped:
+            print(f"Dropped {dropped} deleted nations from the store")
+
+    def _pull_new(self, api_key: str, cursor_key: str, fetch, save, filters, stats):
+        """
+        Fetch every item newer than the stored cursor and advance it.
+
+        Without a cursor the last HISTORY_DAYS are backfilled, oldest first.
+        Items are always pulled in ascending ID order, so if `max_pages` runs
+        out first the cursor stops at the last item saved and the next sync
+        carries on from there; nothing is skipped.
+
+        Returns:
+            Set of defender IDs seen in the new items
+        """
+        cursor = self._get_state(cursor_key)
+        if cursor is None:
+            filters = dict(filters, after=format_api_datetime(time.time() - HISTORY_DAYS * 86400),
+                           orderBy=[('ID', 'ASC')])
+        else:
+            filters = dict(filters, min_id=int(cursor) + 1, orderBy=[('ID', 'ASC')])
+
+        defenders = set()
+        highest = int(cursor) if cursor is not None else 0
+        for page in range(1, self.max_pages + 1):
+            result = fetch(api_key, page, filters, stats=stats)
+            items = result["data"]
+            if not items:
+                break
+            save(items)
+            highest = max(highest, max(int(item['id']) for item in items))
+            defenders.update(item['def_id'] for item in items if item.get('def_id'))
+            if not result.get("paginatorInfo", {}).get("hasMorePages"):
+                break
+        else:
+            print(f"Store sync of {cursor_key} stopped after {self.max_pages} pages; "
+                  f"the next sync continues after ID {highest}")
+
+        conn = self._connection()
+        with conn:
+            self._set_state(conn, cursor_key, highest)
+        return defenders
+
+    def _resweep(self, api_key: str, nation_ids, stats):
+        """Re-fetch the sweep fields of specific nations, deleting those the API no longer returns."""
+        nation_ids = sorted(nation_ids, key=int)
+        for start in range(0, len(nation_ids), 500):
+            batch = [int(nation_id) for nation_id in nation_ids[start:start + 500]]
+            nations_data = get_nations(api_key, 1, {'id': batch}, fields=NATION_SWEEP_FIELDS, stats=stats)
+            self.upsert_nations(nations_data["data"])
+            gone = set(batch) - {int(nation['id']) for nation in nations_data["data"]}
+            if gone:
+                conn = self._connection()
+                with conn:
+                    conn.executemany("DELETE FROM nations WHERE id = ?", [(nation_id,) for nation_id in gone])
+
+    def _prune(self, now: float):
+        cutoff = int(now - HISTORY_DAYS * 86400)
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM attacks WHERE date_ts < ?", (cutoff,))
+            conn.execute("DELETE FROM wars WHERE date_ts < ?", (cutoff,))
+
+    # Reads
+
+    def query_candidates(self, filters=None, limit=None):
+        """
+        Select stored nations matching a filter spec from build_nation_filters.
+
+        Args:
+            filters: Optional filter spec (min_score, max_score, vmode, max_cities, color).
+            limit: Optional maximum number of nations.
+
+        Returns:
+            List of nation dictionaries shaped like NATION_SWEEP_FIELDS, ordered by score
+        """
+        filters = filters or {}
+        clauses = []
+        params = []
+        if filters.get('min_score') is not None:
+            clauses.append("score >= ?")
+            params.append(filters['min_score'])
+        if filters.get('max_score') is not None:
+            clauses.append("score <= ?")
+            params.append(filters['max_score'])
+        if filters.get('vmode') is not None:
+            clauses.append("vacation_mode_turns > 0" if filters['vmode'] else "vacation_mode_turns = 0")
+        if filters.get('max_cities') is not None:
+            clauses.append("num_cities <= ?")
+            params.append(filters['max_cities'])
+        if filters.get('color'):
+            clauses.append(f"color IN ({', '.join('?' * len(filters['color']))})")
+            params.extend(filters['color'])
+
+        sql = f"SELECT {', '.join(NATION_COLUMNS)} FROM nations"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY score"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        nations = []
+        for row in self._connection().execute(sql, params):
+            nation = dict(row)
+            nation['id'] = str(nation['id'])
+            nation['alliance_id'] = str(nation['alliance_id'] or 0)
+            nations.append(nation)
+        return nations
+
+    def iter_pages(self, api_key: str, max_pages: int, filters=None, stats=None, page_size: int = 500,
+                   prefilter=None):
+        """
+        Yield stored nations matching `filters`, shaped like iter_nation_pages output.
+
+        The store is refreshed first if its last sync is older than `refresh_interval`.
+        Only nations `prefilter` returns True for are yielded, if one is given.
+        """
+        self.refresh(api_key, stats=stats)
+        matching = self.query_candidates(filters, limit=max_pages * page_size)
+        page_count = max(1, -(-len(matching) // page_size))
+        for page in range(1, page_count + 1):
+            page_nations = matching[(page - 1) * page_size:page * page_size]
+            if prefilter is not None:
+                page_nations = [nation for nation in page_nations if prefilter(nation)]
+            yield page, {
+                "data": page_nations,
+                "paginatorInfo": {"hasMorePages": page < page_count, "currentPage": page},
+            }
+
+    def get_details(self, api_key: str, nation_ids, stats=None, wars: bool = True):
+        """
+        Get nested nation details from the store, fetching those missing or older than `detail_ttl`.
+
+        Takes the same arguments and returns the same mapping as pnw_api.get_nation_details.
+        Fetched details always include wars, so the stored war history stays complete.
+        """
+        nation_ids = list(nation_ids)
+        conn = self._connection()
+        placeholders = ', '.join('?' * len(nation_ids))
+        fresh_after = time.time() - self.detail_ttl
+        fresh = {str(row['id']) for row in conn.execute(
+            f"SELECT id FROM nations WHERE id IN ({placeholders}) AND details_at > ?",
+            [int(nation_id) for nation_id in nation_ids] + [fresh_after])}
+
+        missing = [nation_id for nation_id in nation_ids if str(nation_id) not in fresh]
+        if missing:
+            fetched = get_nation_details(api_key, missing, stats=stats)
+            self.save_details(fetched)
+            fresh.update(str(nation_id) for nation_id in fetched)
+
+        return self._load_details([nation_id for nation_id in nation_ids if str(nation_id) in fresh], wars=wars)
+
+    def _load_details(self, nation_ids, wars: bool = True):
+        """Assemble stored details shaped like NATION_DETAIL_FIELDS, or NATION_PROFILE_FIELDS without wars."""
+        if not nation_ids:
+            return {}
+        conn = self._connection()
+        ids = [int(nation_id) for nation_id in nation_ids]
+        placeholders = ', '.join('?' * len(ids))
+
+        details = {}
+        for row in conn.execute(
+                f"SELECT n.id, n.alliance_id, a.name AS alliance_name, "
+                f"{', '.join('n.' + column for column in CITY_COLUMNS)} "
+                f"FROM nations n LEFT JOIN alliances a ON a.id = n.alliance_id WHERE n.id IN ({placeholders})", ids):
+            nation_id = str(row['id'])
+            details[nation_id] = {
+                'id': nation_id,
+                # Commerce totals stand in for the per-city list; scans only sum it
+                'cities': [{column: row[column] or 0 for column in CITY_COLUMNS}],
+                'alliance': {'id': str(row['alliance_id']), 'name': row['alliance_name']} if row['alliance_id'] else None,
+            }
+            if wars:
+                details[nation_id]['wars'] = []
+        if not wars:
+            return details
+
+        wars_by_id = {}
+        for row in conn.execute(
+                f"SELECT id, date, date_ts, turns_left, att_id, def_id FROM wars "
+                f"WHERE def_id IN ({placeholders}) OR att_id IN ({placeholders})", ids + ids):
+            war = {'id': str(row['id']), 'turns_left': row['turns_left'], 'date': row['date'],
+                   'date_ts': row['date_ts'], 'att_id': str(row['att_id']), 'def_id': str(row['def_id']),
+                   'attacks': []}
+            wars_by_id[row['id']] = war
+            for nation_id in (war['att_id'], war['def_id']):
+                if nation_id in details:
+                    details[nation_id]['wars'].append(war)
+
+        if wars_by_id:
+            war_ids = list(wars_by_id)
+            for start in range(0, len(war_ids), 500):
+                batch = war_ids[start:start + 500]
+                for row in conn.execute(
+                        f"SELECT id, war_id, def_id, money_stolen, date, date_ts FROM attacks "
+                        f"WHERE war_id IN ({', '.join('?' * len(batch))})", batch):
+                    wars_by_id[row['war_id']]['attacks'].append({
+                        'id': str(row['id']), 'def_id': str(row['def_id']),
+                        'money_stolen': row['money_stolen'], 'date': row['date'], 'date_ts': row['date_ts'],
+                    })
+        return details
+
+    def stats(self):
+        """Return row counts and the time of the last sync."""
+        conn = self._connection()
+        counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ('nations', 'alliances', 'wars', 'attacks')}
+        synced_at = self._get_state('synced_at')
+        counts['synced_age_seconds'] = time.time() - float(synced_at) if synced_at else None
+        return counts
+
+# Shared by every scan in this process; None when NATION_STORE_PATH is empty
+nation_store = NationStore() if NATION_STORE_PATH else None
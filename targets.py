@@ -0,0 +1,80 @@
+from datetime import datetime
+
+NATION_URL = "https://politicsandwar.com/nation/id={id}"
+
+class TargetRecord:
+    """
+    One scored target, as found by a scan.
+
+    Holds only the raw figures in slots; presentation fields (nation URL,
+    daily income, formatted war date, "time ago" string) are derived on
+    access, so cached result sets stay small and cheap to copy. Templates
+    and the CLI read attributes, and to_dict() returns the same keys the
+    scans used to return, so `json.dumps(targets, default=TargetRecord.to_dict)`
+    serializes a result list in one call.
+    """
+
+    __slots__ = ('id', 'name', 'score', 'alliance', 'num_cities', 'beige_turns', 'defensive_wars_count',
+                 'seven_days_stolen', 'one_day_stolen', 'money_stolen_recent_def_war',
+                 'recent_def_war_ts', 'recent_def_war_date', 'scanned_at', 'gni',
+                 'soldiers', 'tanks', 'aircraft', 'ships', 'missiles', 'nukes', 'spies',
+                 'infrastructure', 'supermarket', 'bank', 'shopping_mall', 'stadium', 'subway')
+
+    # Keys of to_dict(), in the order scans have always returned them
+    FIELDS = ('id', 'name', 'score', 'beige_turns', 'alliance', 'money_stolen_recent_def_war',
+              'seven_days_stolen', 'one_day_stolen', 'most_recent_def_war_date', 'last_stolen_time_ago_str',
+              'gni', 'daily_income', 'raw_gni', 'nation_url', 'num_cities', 'soldiers', 'tanks', 'aircraft',
+              'ships', 'missiles', 'nukes', 'spies', 'infrastructure', 'supermarket', 'bank', 'shopping_mall',
+              'stadium', 'subway', 'defensive_wars_count')
+
+    def __init__(self, **fields):
+        """
+        Args:
+            **fields: A value for every slot. `recent_def_war_ts` and
+                `recent_def_war_date` (the API date string) may be None if the
+                nation has no recent defensive war; `scanned_at` is the scan's
+                epoch "now" that "time ago" is measured from.
+        """
+        for name in self.__slots__:
+            setattr(self, name, fields[name])
+
+    # Presentation fields
+
+    @property
+    def nation_url(self):
+        return NATION_URL.format(id=self.id)
+
+    @property
+    def raw_gni(self):
+        return self.gni
+
+    @property
+    def daily_income(self):
+        return self.gni / 365.0 if self.gni else 0
+
+    @property
+    def most_recent_def_war_date(self):
+        if self.recent_def_war_date is None:
+            return 'N/A'
+        # Parsed from the string rather than the epoch, to keep its original UTC offset
+        return datetime.fromisoformat(self.recent_def_war_date).strftime('%Y-%m-%d %H:%M:%S%z')
+
+    @property
+    def last_stolen_time_ago_str(self):
+        if self.recent_def_war_ts is None:
+            return "N/A"
+        hours_ago = int((self.scanned_at - self.recent_def_war_ts) / 3600)
+        days = hours_ago // 24
+        hours = hours_ago % 24
+        if days > 0:
+            return f"{days}d {hours}h ago"
+        return f"{hours_ago}h ago"
+
+    # Serialization
+
+    def to_dict(self):
+        """Return the target as a plain dictionary, presentation fields included."""
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self):
+        return f"TargetRecord(id={self.id!r}, name={self.name!r}, seven_days_stolen={self.seven_days_stolen!r})"
@@ -0,0 +1,11 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules live at the repository root, the stub API server in benchmarks/
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+# config.py requires an API key at import; scans read the stub server, not a local store
+os.environ.setdefault("PNW_API_KEY", "test")
+os.environ.setdefault("NATION_STORE_PATH", "")
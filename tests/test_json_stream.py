@@ -0,0 +1,43 @@
+import json
+import pytest
+from json_stream import JSONArrayStream
+
+PATH = ('data', 'nations', 'data')
+
+def _document(items):
+    return json.dumps({'data': {'nations': {'data': items, 'paginatorInfo': {'hasMorePages': True}}}})
+
+def _chunks(text, size):
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100000])
+def test_items_and_skeleton_at_any_chunk_size(size):
+    items = [{'id': str(i), 'name': 'a "quoted" ] name, {x}', 'score': i * 1.5} for i in range(20)]
+    stream = JSONArrayStream(_chunks(_document(items), size), PATH)
+    assert list(stream) == items
+    assert stream.skeleton() == {'data': {'nations': {'data': [], 'paginatorInfo': {'hasMorePages': True}}}}
+
+def test_empty_array():
+    stream = JSONArrayStream(_chunks(_document([]), 5), PATH)
+    assert list(stream) == []
+    assert stream.skeleton()['data']['nations']['data'] == []
+
+def test_document_without_the_array_yields_nothing():
+    body = json.dumps({'errors': [{'message': 'Invalid API key'}]})
+    stream = JSONArrayStream(_chunks(body, 4), PATH)
+    assert list(stream) == []
+    assert stream.skeleton() == {'errors': [{'message': 'Invalid API key'}]}
+
+def test_truncated_array_raises():
+    body = _document([{'id': '1'}, {'id': '2'}])
+    stream = JSONArrayStream(_chunks(body[:body.index('{"id": "2"') + 5], 3), PATH)
+    with pytest.raises(ValueError):
+        list(stream)
+
+def test_skeleton_before_iteration_and_second_iteration_raise():
+    stream = JSONArrayStream([_document([{'id': '1'}])], PATH)
+    with pytest.raises(ValueError):
+        stream.skeleton()
+    list(stream)
+    with pytest.raises(ValueError):
+        list(stream)
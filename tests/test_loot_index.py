@@ -0,0 +1,88 @@
+import time
+from datetime import datetime, timezone
+from loot_index import LootIndex, LootFeed, DAY
+from scan import _recent_loot
+
+# Feeds are read at the current time, so the wars are dated relative to it
+NOW = int(time.time())
+
+def _date(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+def _war(war_id, def_id, age, att_id='900'):
+    return {'id': str(war_id), 'date': _date(NOW - age), 'def_id': str(def_id), 'att_id': att_id}
+
+def _attack(attack_id, war, money, age, def_id=None):
+    return {'id': str(attack_id), 'war_id': war['id'], 'def_id': def_id or war['def_id'],
+            'money_stolen': money, 'date': _date(NOW - age)}
+
+def _index(wars, attacks):
+    index = LootIndex()
+    index.add_wars(wars, now=NOW)
+    index.add_attacks(attacks)
+    return index
+
+def test_sums_match_nested_wars():
+    wars = [_war(1, 10, 3 * 3600), _war(2, 10, 3 * DAY), _war(3, 11, 7 * DAY + 3600)]
+    attacks = [_attack(1, wars[0], 100, 3000), _attack(2, wars[0], 50, 2000),
+               _attack(3, wars[1], 1000, 3 * DAY - 60), _attack(4, wars[2], 7, 7 * DAY),
+               _attack(5, wars[0], 999, 1000, def_id='900')]  # The defender's own attack steals nothing
+    index = _index(wars, attacks)
+    for def_id in ('10', '11', '12'):
+        nation = {'id': def_id, 'wars': [dict(war, attacks=[attack for attack in attacks if attack['war_id'] == war['id']])
+                                         for war in wars]}
+        expected = _recent_loot(nation, NOW)
+        seven, one, recent = index.lookup(def_id, NOW)
+        assert (seven, one) == expected[:2]
+        if expected[2] is None:
+            assert recent is None
+        else:
+            # (epoch, money stolen) of the most recent defensive war
+            assert (recent[0], recent[2]) == (expected[2][0], expected[2][2])
+
+def test_wars_leave_the_one_day_then_the_seven_day_sums():
+    war = _war(1, 10, 3600)
+    index = _index([war], [_attack(1, war, 500, 1800)])
+    assert index.lookup('10', NOW)[:2] == (500, 500)
+    # Out of the 1-day sum once two whole days have passed
+    assert index.lookup('10', NOW + 2 * DAY - 3600)[:2] == (500, 0)
+    # Gone entirely after eight
+    assert index.lookup('10', NOW + 8 * DAY - 3600) == (0, 0, None)
+    assert index.stats()['wars'] == 0
+    assert index.stats()['defenders'] == 0
+
+def test_wars_outside_the_window_are_skipped():
+    index = _index([_war(1, 10, 8 * DAY)], [])
+    assert index.stats()['wars'] == 0
+
+def test_attacks_before_their_war_are_applied_when_it_arrives():
+    war = _war(1, 10, 3600)
+    index = LootIndex()
+    index.add_attacks([_attack(1, war, 300, 1800)])
+    assert index.stats()['orphan_wars'] == 1
+    index.add_wars([war], now=NOW)
+    assert index.lookup('10', NOW)[:2] == (300, 300)
+    assert index.stats()['orphan_wars'] == 0
+
+def test_orphans_expire_with_the_window():
+    war = _war(1, 10, DAY)
+    index = LootIndex()
+    index.add_attacks([_attack(1, war, 300, DAY)])
+    index.expire(NOW + 6 * DAY)
+    assert index.stats()['orphan_wars'] == 1
+    index.expire(NOW + 7 * DAY)
+    assert index.stats()['orphan_wars'] == 0
+
+def test_feed_rows_build_the_same_sums(tmp_path):
+    wars = [_war(1, 10, 3600), _war(2, 11, 3 * DAY)]
+    attacks = [_attack(1, wars[0], 100, 1800), _attack(2, wars[1], 40, 2 * DAY)]
+    feed = LootFeed(str(tmp_path / 'loot.db'))
+    feed.save_wars(wars)
+    feed.save_attacks(attacks)
+    feed.save_attacks(attacks)  # Saving a row twice keeps one copy
+    index = LootIndex(feed=feed)
+    index._read_feed()
+    expected = _index(wars, attacks)
+    for def_id in ('10', '11'):
+        assert index.lookup(def_id, NOW) == expected.lookup(def_id, NOW)
+    assert (index.wars_max_id, index.attacks_max_id) == (2, 2)
@@ -0,0 +1,45 @@
+import random
+from ranking import TopK
+
+def test_keeps_the_k_smallest_in_sorted_order_with_stable_ties():
+    rng = random.Random(1)
+    items = [(rng.randint(0, 20), index) for index in range(500)]
+    ranker = TopK(10, key=lambda item: item[0])
+    for item in items:
+        ranker.push(item)
+    assert ranker.items() == sorted(items, key=lambda item: item[0])[:10]
+    assert ranker.seen == 500
+    assert len(ranker) == 10
+
+def test_fewer_items_than_k():
+    ranker = TopK(5, key=lambda item: item)
+    for item in (3, 1, 2):
+        assert ranker.push(item)
+    assert ranker.items() == [1, 2, 3]
+    assert not ranker.full()
+    assert ranker.worst_key() is None
+
+def test_push_reports_whether_the_item_was_kept():
+    ranker = TopK(2, key=lambda item: item)
+    assert ranker.push(5)
+    assert ranker.push(7)
+    assert not ranker.push(7)  # A tie with the worst kept item loses to the earlier one
+    assert ranker.push(6)
+    assert ranker.items() == [5, 6]
+
+def test_can_improve_with_tuple_prefix_bounds():
+    ranker = TopK(2, key=lambda item: item)
+    assert ranker.can_improve((9,))
+    ranker.push((1, -50))
+    ranker.push((2, -10))
+    assert ranker.worst_key() == (2, -10)
+    assert ranker.can_improve((1,))
+    # A prefix equal to the worst key's first element sorts before it, so it may still improve
+    assert ranker.can_improve((2,))
+    assert not ranker.can_improve((3,))
+
+def test_zero_k_keeps_nothing():
+    ranker = TopK(0, key=lambda item: item)
+    assert not ranker.push(1)
+    assert not ranker.can_improve((0,))
+    assert ranker.items() == []
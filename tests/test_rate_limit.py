@@ -0,0 +1,86 @@
+import pytest
+from rate_limit import MemoryBackend, SlidingWindowLimiter, RateLimitExceeded
+
+WINDOW = 100
+
+def test_memory_backend_rolls_windows():
+    backend = MemoryBackend()
+    assert backend.incr('a', 5) == (0, 1)
+    assert backend.incr('a', 5) == (0, 2)
+    assert backend.counts('a', 5) == (0, 2)
+    # The next window sees this one's count as the previous one
+    assert backend.counts('a', 6) == (2, 0)
+    assert backend.incr('a', 6) == (2, 1)
+    # Two windows on, nothing counts any more
+    assert backend.counts('a', 8) == (0, 0)
+    assert backend.counts('unknown', 5) == (0, 0)
+
+def test_memory_backend_never_goes_below_zero():
+    backend = MemoryBackend()
+    assert backend.incr('a', 1, -1) == (0, 0)
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_keys=2)
+    backend.incr('a', 1)
+    backend.incr('b', 1)
+    backend.incr('a', 1)
+    backend.incr('c', 1)
+    assert len(backend) == 2
+    assert backend.counts('b', 1) == (0, 0)
+    assert backend.counts('a', 1) == (0, 2)
+
+def test_memory_backend_sweep_drops_keys_that_no_longer_count():
+    backend = MemoryBackend()
+    backend.incr('old', 1)
+    backend.incr('previous', 4)
+    backend.incr('current', 5)
+    backend.sweep(5)
+    assert len(backend) == 2
+    assert backend.counts('previous', 5) == (1, 0)
+
+def _limiter(limit=3):
+    return SlidingWindowLimiter(MemoryBackend(), limit=limit, window=WINDOW, sweep_interval=10 ** 9)
+
+def test_acquire_allows_up_to_the_limit():
+    limiter = _limiter()
+    now = 10 * WINDOW
+    assert [limiter.acquire('a', now) for _ in range(4)] == [10, 10, 10, None]
+    assert not limiter.check('a', now)
+    assert limiter.check('b', now)
+    # A refused request is not counted
+    assert limiter.count('a', now) == 3
+
+def test_previous_window_fades_out():
+    limiter = _limiter()
+    for _ in range(3):
+        limiter.acquire('a', 10 * WINDOW)
+    # A quarter into the next window, three quarters of the previous count still apply
+    assert limiter.count('a', 11 * WINDOW + WINDOW / 4) == pytest.approx(2.25)
+    assert limiter.acquire('a', 11 * WINDOW + WINDOW / 4) == 11
+    assert limiter.acquire('a', 11 * WINDOW + WINDOW / 4) is None
+
+def test_retry_after_is_when_check_passes_again():
+    limiter = _limiter()
+    now = 10 * WINDOW + WINDOW / 2
+    for _ in range(3):
+        limiter.acquire('a', now)
+    wait = limiter.retry_after('a', now)
+    assert wait > 0
+    assert not limiter.check('a', now + wait - 1)
+    assert limiter.check('a', now + wait + 1e-6)
+    assert limiter.retry_after('b', now) == 0
+
+def test_release_takes_back_the_request_from_its_window():
+    limiter = _limiter()
+    now = 10 * WINDOW
+    windows = [limiter.acquire('a', now) for _ in range(3)]
+    # Released after the next window started: the count comes off the window it was made in
+    limiter.release('a', windows[0])
+    assert limiter.backend.counts('a', 11) == (2, 0)
+    assert limiter.acquire('a', now) == 10
+
+def test_rate_limit_exceeded_is_a_value_error():
+    error = RateLimitExceeded("over the limit", 12.5)
+    assert isinstance(error, ValueError)
+    assert error.retry_after == 12.5
+    assert str(error) == "over the limit"
@@ -0,0 +1,47 @@
+import contextlib
+import io
+import pytest
+import pnw_api
+import scan
+from stub_server import StubAPIServer
+
+MODES = ['raid', 'beige']
+
+def test_pool_filters_cover_every_members_war_range():
+    members = [{'score': 1000, 'num_cities': 10}, {'score': 400, 'num_cities': 15}]
+    filters = scan._pool_filters(members, [scan.SCAN_MODES[name] for name in MODES])
+    assert filters['min_score'] == round(400 * scan.MIN_SCORE_RATIO, 2)
+    assert filters['max_score'] == round(1000 * scan.MAX_SCORE_RATIO, 2)
+    assert filters['max_cities'] == 15
+    assert filters['vmode'] is False
+    # Raid targets may have any color, so colors aren't pushed down
+    assert 'color' not in filters
+
+def test_pool_filters_drop_the_city_cap_if_any_member_has_none():
+    members = [{'score': 1000, 'num_cities': 10}, {'score': 400}]
+    assert 'max_cities' not in scan._pool_filters(members, [scan.SCAN_MODES['beige']])
+
+@pytest.fixture(scope='module')
+def stub_api():
+    with StubAPIServer(total_pages=4) as server:
+        url = pnw_api.API_URL
+        pnw_api.API_URL = server.url
+        try:
+            yield server
+        finally:
+            pnw_api.API_URL = url
+
+def test_batch_scan_matches_one_scan_per_member(stub_api):
+    # Members spread over the stub's nations, so their war ranges differ
+    nation_ids = [700, 1200, 1900]
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        pnw_api.nation_cache.invalidate()
+        _, batched = scan.scan_targets_batch("test", nation_ids, MODES, 10, 4, source="api")
+        single = {nation_id: scan.scan_targets("test", nation_id, MODES, 10, 4, source="api")[1]
+                  for nation_id in nation_ids}
+    assert sorted(batched) == sorted(nation_ids)
+    assert sum(len(batched[nation_id]['raid']) for nation_id in nation_ids) > 0
+    for nation_id in nation_ids:
+        for mode in MODES:
+            assert [target.id for target in batched[nation_id][mode]] == \
+                   [target.id for target in single[nation_id][mode]]
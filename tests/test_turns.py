@@ -0,0 +1,29 @@
+import pytest
+import turns
+from config import TURN_INTERVAL
+
+@pytest.fixture(autouse=True)
+def no_offset(monkeypatch):
+    monkeypatch.setattr(turns, 'TURN_OFFSET', 0)
+
+def test_turn_start_on_and_between_boundaries():
+    assert turns.turn_start(10 * TURN_INTERVAL) == 10 * TURN_INTERVAL
+    assert turns.turn_start(10 * TURN_INTERVAL + 1) == 10 * TURN_INTERVAL
+    assert turns.turn_start(11 * TURN_INTERVAL - 1) == 10 * TURN_INTERVAL
+
+def test_turn_start_with_offset(monkeypatch):
+    monkeypatch.setattr(turns, 'TURN_OFFSET', 600)
+    assert turns.turn_start(10 * TURN_INTERVAL + 599) == 9 * TURN_INTERVAL + 600
+    assert turns.turn_start(10 * TURN_INTERVAL + 600) == 10 * TURN_INTERVAL + 600
+
+def test_next_turn_and_seconds_left():
+    now = 10 * TURN_INTERVAL + 100
+    assert turns.next_turn(now) == 11 * TURN_INTERVAL
+    assert turns.seconds_until_next_turn(now) == TURN_INTERVAL - 100
+    # At the boundary a whole turn is left
+    assert turns.seconds_until_next_turn(11 * TURN_INTERVAL) == TURN_INTERVAL
+
+def test_turn_ttl_caps_at_the_next_turn():
+    now = 11 * TURN_INTERVAL - 30
+    assert turns.turn_ttl(7200, now) == 30
+    assert turns.turn_ttl(10, now) == 10
@@ -0,0 +1,37 @@
+import time
+from config import TURN_INTERVAL, TURN_OFFSET
+
+def turn_start(now: float = None):
+    """
+    Return the epoch seconds at which the current game turn started.
+
+    Turns change every `TURN_INTERVAL` seconds on the UTC clock (every even
+    hour by default), shifted by `TURN_OFFSET` seconds.
+
+    Args:
+        now: Epoch seconds to locate the turn of; defaults to the current time.
+    """
+    now = time.time() if now is None else now
+    return now - (now - TURN_OFFSET) % TURN_INTERVAL
+
+def next_turn(now: float = None):
+    """Return the epoch seconds of the next turn change."""
+    return turn_start(now) + TURN_INTERVAL
+
+def seconds_until_next_turn(now: float = None):
+    """Return the seconds left in the current turn."""
+    now = time.time() if now is None else now
+    return next_turn(now) - now
+
+def turn_ttl(ttl: float, now: float = None):
+    """
+    Cap a cache lifetime so the entry expires at the next turn change at the latest.
+
+    Args:
+        ttl: Lifetime in seconds wanted for the entry.
+        now: Epoch seconds the entry is stored at; defaults to the current time.
+
+    Returns:
+        The lifetime in seconds, no later than the next turn change
+    """
+    return min(ttl, seconds_until_next_turn(now))